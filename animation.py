@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+# rotating view animation of matplotlib 3D figure
+#
+#	frames are rendered in process pool. each worker builds the figure once and renders
+#	its frames by changing view angle. encoded frames are streamed into output file
+#	in frame order without temporary files.
+#
+#	formats:
+#		gif  : frames are quantized and LZW encoded in workers, spliced into one file
+#		apng : frames are PNG encoded in workers, spliced into one file
+#		mp4  : raw RGB frames are piped into "ffmpeg" (must be in PATH)
+#
+#	reference: https://www.w3.org/Graphics/GIF/spec-gif89a.txt
+#	reference: https://wiki.mozilla.org/APNG_Specification
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	numpy as np
+import	io
+import	multiprocessing
+import	os
+import	shutil
+import	struct
+import	subprocess
+import	zlib
+
+FORMATS		= { "gif": ".gif", "apng": ".apng", "mp4": ".mp4" }
+PNG_SIGNATURE	= b"\x89PNG\r\n\x1a\n"
+
+_worker	= {}	# figure and settings in each worker process
+
+
+def view_angle( i, n ):
+	# ( azimuth, elevation ) of frame i: 2 turns while elevation goes down and back up
+	elv	= np.cos( (i / n) * 2 * np.pi ) * 0.5 + 0.5
+	return 720 * i / n - 90, 84 * elv + 5
+
+
+def init_worker( build, build_args, size, fmt ):
+	#####
+	##### figure is built once per worker by "build( *build_args )" which returns ( fig, ax )
+	#####
+	import	matplotlib.pyplot as plt
+	from	matplotlib.backends.backend_agg import FigureCanvasAgg
+	
+	if multiprocessing.parent_process() is not None:
+		plt.switch_backend( "Agg" )
+
+	fig, ax	= build( *build_args )
+	fig.set_size_inches( size[ 0 ] / fig.dpi, size[ 1 ] / fig.dpi )
+
+	_worker.update( fig = fig, ax = ax, canvas = FigureCanvasAgg( fig ), size = size, fmt = fmt )
+
+
+def render_frame( task ):
+	i, n		= task
+	w			= _worker
+	azim, elev	= view_angle( i, n )
+
+	w[ "ax" ].view_init( azim = azim, elev = elev )
+	w[ "canvas" ].draw()
+
+	rgb	= np.asarray( w[ "canvas" ].buffer_rgba() )[ :, :, :3 ]
+
+	if w[ "fmt" ] == "mp4":
+		return rgb.tobytes()
+
+	from	PIL import Image
+	
+	buf	= io.BytesIO()
+	if w[ "fmt" ] == "gif":
+		Image.fromarray( rgb ).quantize( 256 ).save( buf, "GIF" )
+	else:
+		Image.fromarray( rgb ).save( buf, "PNG", compress_level = 6 )
+
+	return buf.getvalue()
+
+
+class GifWriter:
+	#####
+	##### animated GIF from single frame GIF files.
+	##### global color table of each file becomes local color table of the frame
+	#####
+	def __init__( self, fp, size, fps, loop = 0 ):
+		self.fp		= fp
+		self.delay	= int( round( 100 / fps ) )		# in 1/100 seconds
+
+		fp.write( b"GIF89a" + struct.pack( "<HHBBB", size[ 0 ], size[ 1 ], 0, 0, 0 ) )
+		fp.write( b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack( "<H", loop ) + b"\x00" )
+
+	def write( self, gif ):
+		flags	= gif[ 10 ]
+		pos		= 13
+		table	= b""
+
+		if flags & 0x80:
+			table	= gif[ pos : pos + 3 * (2 << (flags & 7)) ]
+			pos		+= len( table )
+
+		while gif[ pos ] == 0x21:	# skipping extensions
+			pos	= self.skip_blocks( gif, pos + 2 )
+
+		# image descriptor: separator, left, top, width, height, flags
+		desc	= bytearray( gif[ pos : pos + 10 ] )
+		pos		+= 10
+		if desc[ 9 ] & 0x80:		# local table already
+			n		= 3 * (2 << (desc[ 9 ] & 7))
+			table	= gif[ pos : pos + n ]
+			pos		+= n
+		desc[ 9 ]	= (desc[ 9 ] & 0x40) | ((0x80 | (flags & 7)) if table else 0)
+
+		end	= self.skip_blocks( gif, pos + 1 )	# LZW minimum code size and data sub-blocks
+
+		self.fp.write( b"!\xf9\x04\x04" + struct.pack( "<H", self.delay ) + b"\x00\x00" )	# graphic control: do not dispose
+		self.fp.write( bytes( desc ) + table + gif[ pos : end ] )
+
+	@staticmethod
+	def skip_blocks( data, pos ):
+		while data[ pos ]:
+			pos	+= data[ pos ] + 1
+		return pos + 1
+
+	def close( self ):
+		self.fp.write( b";" )
+
+
+class ApngWriter:
+	#####
+	##### animated PNG from PNG files. IDAT of 2nd frame or later is stored as fdAT
+	#####
+	def __init__( self, fp, size, fps, frames, loop = 0 ):
+		self.fp		= fp
+		self.delay	= ( 1, int( fps ) ) if float( fps ).is_integer() else ( int( round( 100 / fps ) ), 100 )	# numerator, denominator
+		self.seq	= 0
+		self.count	= 0
+
+		fp.write( PNG_SIGNATURE )
+		self.header	= None
+		self.actl	= struct.pack( ">II", frames, loop )
+
+	def chunk( self, cid, data ):
+		self.fp.write( struct.pack( ">I", len( data ) ) + cid + data + struct.pack( ">I", zlib.crc32( cid + data ) ) )
+
+	def write( self, png ):
+		pos		= len( PNG_SIGNATURE )
+		idat	= []
+
+		while pos < len( png ):
+			length,	= struct.unpack( ">I", png[ pos : pos + 4 ] )
+			cid		= png[ pos + 4 : pos + 8 ]
+			data	= png[ pos + 8 : pos + 8 + length ]
+			pos		+= length + 12
+
+			if cid == b"IHDR" and self.header is None:
+				self.header	= data
+				self.chunk( b"IHDR", data )
+				self.chunk( b"acTL", self.actl )
+			elif cid == b"IDAT":
+				idat.append( data )
+
+		w, h	= struct.unpack( ">II", self.header[ :8 ] )
+		self.chunk( b"fcTL", struct.pack( ">IIIIIHHBB", self.seq, w, h, 0, 0, *self.delay, 0, 0 ) )
+		self.seq	+= 1
+
+		for data in idat:
+			if self.count == 0:
+				self.chunk( b"IDAT", data )
+			else:
+				self.chunk( b"fdAT", struct.pack( ">I", self.seq ) + data )
+				self.seq	+= 1
+
+		self.count	+= 1
+
+	def close( self ):
+		self.chunk( b"IEND", b"" )
+
+
+class Mp4Writer:
+	#####
+	##### raw RGB frames piped into ffmpeg (H.264)
+	#####
+	def __init__( self, file_name, size, fps ):
+		ffmpeg	= shutil.which( "ffmpeg" )
+		if ffmpeg is None:
+			raise RuntimeError( "\"ffmpeg\" is needed for MP4 output but not found in PATH" )
+
+		cmd	= [ ffmpeg, "-y", "-loglevel", "error",
+				"-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "{}x{}".format( *size ), "-r", str( fps ), "-i", "-",
+				"-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p", file_name ]
+		self.proc	= subprocess.Popen( cmd, stdin = subprocess.PIPE )
+
+	def write( self, rgb ):
+		self.proc.stdin.write( rgb )
+
+	def close( self ):
+		self.proc.stdin.close()
+		if self.proc.wait():
+			raise RuntimeError( "ffmpeg failed (exit status {})".format( self.proc.returncode ) )
+
+
+def render( file_name, build, build_args, frames = 720, fps = 25, size = ( 1300, 1100 ), fmt = "gif", jobs = 0, progress = None ):
+	#####
+	##### renders rotating view animation into "file_name"
+	##### "jobs" is number of worker processes (0: number of CPUs, 1: in this process)
+	##### "progress( count, frames )" is called for each frame written
+	#####
+	jobs	= jobs if jobs else os.cpu_count() or 1
+	jobs	= min( jobs, frames )
+	tasks	= [ ( i, frames ) for i in range( frames ) ]
+
+	if fmt == "mp4":
+		writer	= Mp4Writer( file_name, size, fps )
+		fp		= None
+	else:
+		fp		= open( file_name, "wb" )
+		writer	= GifWriter( fp, size, fps ) if fmt == "gif" else ApngWriter( fp, size, fps, frames )
+
+	pool	= None
+
+	try:
+		if jobs == 1:
+			init_worker( build, build_args, size, fmt )
+			encoded	= map( render_frame, tasks )
+		else:
+			pool	= multiprocessing.Pool( jobs, initializer = init_worker, initargs = ( build, build_args, size, fmt ) )
+			encoded	= pool.imap( render_frame, tasks, chunksize = 1 )
+
+		for count, frame in enumerate( encoded, 1 ):
+			writer.write( frame )
+			if progress:
+				progress( count, frames )
+
+		writer.close()
+	finally:
+		if jobs == 1 and "fig" in _worker:
+			import	matplotlib.pyplot as plt
+			plt.close( _worker.pop( "fig" ) )
+		if pool:
+			pool.terminate()
+		if fp:
+			fp.close()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+# benchmark for run_coursemap
+#
+#	generates synthetic activity files (.fit and .gpx) and measures the processing time
+#	of FIT decoders and of each stage: file reading, limit_values (attributes), plot and drawing.
+#	plot is drawn by Agg backend without map and geocoding (no network access).
+#	results are appended to JSON lines history file (in cache directory by default) and compared with the previous run
+#	of same settings (color key, readers, sizes etc.).
+#
+#	usage:  benchmark.py [-s 1000 10000 100000 1000000] [--history ~/.cache/run_coursemap/benchmark_history.jsonl]
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.2 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	numpy as np
+import	argparse
+import	datetime
+import	json
+import	os.path
+import	platform
+import	subprocess
+import	sys
+import	tempfile
+import	time
+
+import	matplotlib
+matplotlib.use( "Agg" )
+
+import	coursemap
+import	coursecache
+import	fitpandas
+import	stagetiming
+from	stagetiming import stage
+
+FIT_EPOCH	= 631065600		# timestamp for UTC 00:00 Dec 31 1989
+START_TIME	= 1572813431	# 2019-11-03 20:37:11 UTC
+HISTORY		= os.path.join( coursecache.DEFAULT_DIR, "benchmark_history.jsonl" )
+
+CRC_TABLE	= []
+for i in range( 256 ):
+	c	= i
+	for j in range( 8 ):
+		c	= (c >> 1) ^ 0xA001 if c & 1 else c >> 1
+	CRC_TABLE.append( c )
+
+
+def crc16( data, crc = 0 ):
+	for b in data:
+		crc	= (crc >> 8) ^ CRC_TABLE[ (crc ^ b) & 0xFF ]
+	return crc
+
+
+def synthetic_track( n, seed = 0, lat = 35.6812, long = 139.7671 ):
+	#####
+	##### 1Hz track of wandering course with altitude, heart rate, cadence and power
+	#####
+	rng		= np.random.default_rng( seed )
+	heading	= np.cumsum( rng.normal( 0, 0.05, n ) )
+	speed	= np.clip( 3.0 + np.cumsum( rng.normal( 0, 0.02, n ) ) * 0.1, 1.0, 6.0 )	# m/s
+	step	= speed * 1.0
+
+	north	= np.cumsum( step * np.cos( heading ) )
+	east	= np.cumsum( step * np.sin( heading ) )
+	t		= np.arange( n )
+
+	track	= {
+		"timestamp":	START_TIME + t,
+		"position_lat":	lat  + north / 111320.0,
+		"position_long":	long + east  / (111320.0 * np.cos( np.radians( lat ) )),
+		"altitude":		100 + 50 * np.sin( t / 600.0 ) + rng.normal( 0, 1, n ),
+		"distance":		np.cumsum( step ),
+		"speed":		speed,
+		"heart_rate":	np.clip( 140 + 20 * np.sin( t / 300.0 ) + rng.normal( 0, 3, n ), 60, 200 ).astype( int ),
+		"cadence":		np.clip( 85 + rng.normal( 0, 2, n ), 0, 200 ).astype( int ),
+		"power":		np.clip( 250 + 60 * np.sin( t / 120.0 ) + rng.normal( 0, 20, n ), 0, 2000 ).astype( int ),
+	}
+
+	return track
+
+
+def fit_definition( local, mesg_num, fields ):
+	d	= bytes( [ 0x40 | local, 0, 0 ] ) + mesg_num.to_bytes( 2, "little" ) + bytes( [ len( fields ) ] )
+	for def_num, np_type, base_type in fields:
+		d	+= bytes( [ def_num, np.dtype( np_type ).itemsize, base_type ] )
+	return d
+
+
+def fit_messages( local, fields, values ):
+	#####
+	##### all data messages in one structured array: header byte followed by fields
+	#####
+	dtype	= np.dtype( [ ( "header", "u1" ) ] + [ ( "f{}".format( def_num ), "<" + np_type ) for def_num, np_type, base_type in fields ] )
+	n		= len( values[ 0 ] )
+	arr		= np.zeros( n, dtype = dtype )
+	arr[ "header" ]	= local
+	for ( def_num, np_type, base_type ), v in zip( fields, values ):
+		arr[ "f{}".format( def_num ) ]	= v
+	return arr.tobytes()
+
+
+def write_fit( file_name, track, sport = 1 ):
+	tr	= track
+	n	= len( tr[ "timestamp" ] )
+	sc	= lambda deg: np.round( deg * (2.0 ** 31.0) / 180.0 ).astype( np.int64 )
+
+	record_fields	= [
+		( 253, "u4", 0x86 ),	# timestamp
+		(   0, "i4", 0x85 ),	# position_lat
+		(   1, "i4", 0x85 ),	# position_long
+		(   2, "u2", 0x84 ),	# altitude
+		(   3, "u1", 0x02 ),	# heart_rate
+		(   4, "u1", 0x02 ),	# cadence
+		(   5, "u4", 0x86 ),	# distance
+		(   6, "u2", 0x84 ),	# speed
+		(   7, "u2", 0x84 ),	# power
+	]
+	record_values	= [
+		tr[ "timestamp" ] - FIT_EPOCH,
+		sc( tr[ "position_lat"  ] ),
+		sc( tr[ "position_long" ] ),
+		np.round( (tr[ "altitude" ] + 500) * 5 ),
+		tr[ "heart_rate" ],
+		tr[ "cadence" ],
+		np.round( tr[ "distance" ] * 100 ),
+		np.round( tr[ "speed" ] * 1000 ),
+		tr[ "power" ],
+	]
+
+	session_fields	= [
+		( 253, "u4", 0x86 ),	# timestamp
+		(   2, "u4", 0x86 ),	# start_time
+		(   5, "u1", 0x00 ),	# sport
+		(   8, "u4", 0x86 ),	# total_timer_time
+		(   9, "u4", 0x86 ),	# total_distance
+		(  14, "u2", 0x84 ),	# avg_speed
+		(  29, "i4", 0x85 ),	# nec_lat
+		(  30, "i4", 0x85 ),	# nec_long
+		(  31, "i4", 0x85 ),	# swc_lat
+		(  32, "i4", 0x85 ),	# swc_long
+	]
+	session_values	= [ [ v ] for v in [
+		tr[ "timestamp" ][ -1 ] - FIT_EPOCH,
+		tr[ "timestamp" ][  0 ] - FIT_EPOCH,
+		sport,
+		(tr[ "timestamp" ][ -1 ] - tr[ "timestamp" ][ 0 ]) * 1000,
+		round( tr[ "distance" ][ -1 ] * 100 ),
+		round( tr[ "speed" ].mean() * 1000 ),
+		sc( tr[ "position_lat"  ].max() ),
+		sc( tr[ "position_long" ].max() ),
+		sc( tr[ "position_lat"  ].min() ),
+		sc( tr[ "position_long" ].min() ),
+	] ]
+
+	body	 = fit_definition( 0, 20, record_fields ) + fit_messages( 0, record_fields, record_values )
+	body	+= fit_definition( 1, 18, session_fields ) + fit_messages( 1, session_fields, session_values )
+
+	header	= bytes( [ 14, 0x10 ] ) + (2132).to_bytes( 2, "little" ) + len( body ).to_bytes( 4, "little" ) + b".FIT"
+	header	+= crc16( header ).to_bytes( 2, "little" )
+
+	with open( file_name, "wb" ) as f:
+		f.write( header )
+		f.write( body )
+		f.write( crc16( body, crc16( header ) ).to_bytes( 2, "little" ) )
+
+
+def write_gpx( file_name, track ):
+	tr		= track
+	times	= np.datetime_as_string( tr[ "timestamp" ].astype( "datetime64[s]" ), unit = "s" )
+	
+	head	= ( '<?xml version="1.0" encoding="UTF-8"?>\n'
+				'<gpx version="1.1" creator="benchmark.py" xmlns="http://www.topografix.com/GPX/1/1"'
+				' xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">\n'
+				'<trk><name>synthetic</name><trkseg>\n' )
+	point	= ( '<trkpt lat="{:.7f}" lon="{:.7f}"><ele>{:.1f}</ele><time>{}Z</time><extensions><power>{}</power>'
+				'<gpxtpx:TrackPointExtension><gpxtpx:hr>{}</gpxtpx:hr><gpxtpx:cad>{}</gpxtpx:cad></gpxtpx:TrackPointExtension>'
+				'</extensions></trkpt>\n' )
+	
+	with open( file_name, "w" ) as f:
+		f.write( head )
+		f.writelines( point.format( *v ) for v in zip( tr[ "position_lat" ], tr[ "position_long" ], tr[ "altitude" ], times, tr[ "power" ], tr[ "heart_rate" ], tr[ "cadence" ] ) )
+		f.write( '</trkseg></trk>\n</gpx>\n' )
+
+
+def timeit( func, repeat = 1 ):
+	elapsed	= []
+	for i in range( repeat ):
+		t	= time.perf_counter()
+		func()
+		elapsed.append( time.perf_counter() - t )
+	return min( elapsed )
+
+
+def bench_fit_decoders( file_name, repeat, fitparse_max ):
+	df, session, units	= fitpandas.get_workout( file_name, decoder = "numpy" )
+	n		= len( df )
+	t_np	= timeit( lambda: fitpandas.get_workout( file_name, decoder = "numpy" ), repeat )
+
+	if n <= fitparse_max:
+		t_fp	= timeit( lambda: fitpandas.get_workout( file_name, decoder = "fitparse" ), 1 )
+		ratio	= "{:8.1f}x".format( t_fp / t_np )
+		t_fp	= "{:10.3f}s".format( t_fp )
+	else:
+		t_fp, ratio	= "{:>11}".format( "skipped" ), "{:>9}".format( "---" )
+
+	print( "{:<32}{:>9}{:>10.3f}s{}{}".format( os.path.basename( file_name ), n, t_np, t_fp, ratio ) )
+
+
+def bench_stages( fit_file, gpx_file, opt, repeat, plot = True ):
+	#####
+	##### processing time of each stage (best of "repeat" runs). returns { stage path: { "name", "ms", "calls", "depth" } }
+	##### nested stages marked in the modules (i.e. "limit_values/attributes") are included
+	##### figure and drawing are skipped if "plot" is False
+	#####
+	from	matplotlib.backends.backend_agg import FigureCanvasAgg
+	
+	columns	= coursemap.data_columns( opt )
+	best	= {}
+
+	for i in range( repeat ):
+		with stagetiming.Recorder() as rec:
+			with stage( "get_workout" ):
+				data, s_data, units	= coursemap.read_activity( fit_file, columns )
+			
+			if gpx_file:
+				with stage( "get_course" ):
+					coursemap.read_activity( gpx_file, columns, gpx_reader = opt.gpx_reader )
+			
+			data, lim_val, o	= coursemap.prepare( data, s_data, opt )
+			
+			if plot:
+				with stage( "figure" ):
+					scene	= coursemap.Scene( data, s_data, lim_val, None, "", o )
+					fig, ax	= coursemap.figure( scene )
+				
+				with stage( "draw" ):
+					FigureCanvasAgg( fig ).draw()
+		
+		for name, s in rec.stages.items():
+			if name not in best or s[ "ms" ] < best[ name ][ "ms" ]:
+				best[ name ]	= dict( s )
+		
+		if "total" not in best or rec.total < best[ "total" ][ "ms" ]:
+			best[ "total" ]	= { "name": "total", "ms": rec.total, "calls": 1, "depth": 0 }
+
+	return best
+
+
+def last_history( file_name, settings ):
+	# last record with same "settings" in history file as { ( points, stage ): ms }
+	if not file_name or not os.path.exists( file_name ):
+		return {}
+	
+	with open( file_name ) as f:
+		records	= [ json.loads( l ) for l in f if l.strip() ]
+	
+	for r in reversed( records ):
+		if r.get( "settings" ) == settings:
+			return { ( s[ "points" ], s[ "stage" ] ): s[ "ms" ] for s in r[ "results" ] }
+	
+	return {}
+
+
+def settings( args, opt ):
+	# settings which change the timings. only runs with same settings are compared
+	return {
+		"color_key":		opt.color_key,
+		"map_resolution":	opt.map_resolution,
+		"gpx_reader":		opt.gpx_reader,
+		"max_points":		opt.max_points,
+		"alt_filt":			opt.alt_filt,
+		"curtain":			opt.curtain,
+		"repeat":			args.repeat,
+		"gpx_max":			args.gpx_max,
+		"plot_max":			args.plot_max,
+	}
+
+
+def environment():
+	import	pandas
+	
+	try:
+		commit	= subprocess.run( [ "git", "rev-parse", "--short", "HEAD" ], capture_output = True, text = True, cwd = os.path.dirname( os.path.abspath( __file__ ) ) ).stdout.strip()
+	except OSError:
+		commit	= ""
+
+	return {
+		"date":			datetime.datetime.now().isoformat( timespec = "seconds" ),
+		"commit":		commit,
+		"python":		platform.python_version(),
+		"numpy":		np.__version__,
+		"pandas":		pandas.__version__,
+		"matplotlib":	matplotlib.__version__,
+		"machine":		platform.machine(),
+		"cpus":			os.cpu_count(),
+	}
+
+
+def command_line_handling():
+	parser	= argparse.ArgumentParser( description = "benchmark for run_coursemap" )
+	parser.add_argument( "-s", "--sizes",			help = "number of points in synthetic data",	type = int, nargs = "*", default = [ 1000, 10000, 100000, 1000000 ] )
+	parser.add_argument( "-r", "--repeat",			help = "repeat count (best is taken)",		type = int, default = 3 )
+	parser.add_argument(       "--fitparse_max",	help = "skip fitparse decoder over this size",	type = int, default = 100000 )
+	parser.add_argument(       "--gpx_max",			help = "skip .gpx reading over this size",		type = int, default = 1000000 )
+	parser.add_argument(       "--gpx_reader",		help = ".gpx file reader",		choices = [ "stream", "gpxpy" ], default = "stream" )
+	parser.add_argument(       "--plot_max",		help = "skip plot and drawing over this size",	type = int, default = 1000000 )
+	parser.add_argument( "-k", "--color_key",		help = "color key of plot",		choices = coursemap.COLORKEY.keys(), default = "distance" )
+	parser.add_argument(       "--history",			help = "JSON lines file which results are appended to (\"\" for no history)",	default = HISTORY )
+	parser.add_argument(       "--threshold",		help = "ratio to previous run to be reported as regression",	type = float, default = 1.5 )
+	parser.add_argument(       "--no_decoders",		help = "skip comparison of FIT decoders",		action = "store_true" )
+	return	parser.parse_args()
+
+
+def main():
+	args	= command_line_handling()
+	here	= os.path.dirname( os.path.abspath( __file__ ) )
+
+	opt		= coursemap.Options( color_key = args.color_key, gpx_reader = args.gpx_reader, map_resolution = "off", quiet = True )
+	files	= []
+
+	with tempfile.TemporaryDirectory() as tmp:
+		for n in args.sizes:
+			track	= synthetic_track( n )
+			fit		= os.path.join( tmp, "synthetic_{}.fit".format( n ) )
+			gpx		= os.path.join( tmp, "synthetic_{}.gpx".format( n ) ) if n <= args.gpx_max else None
+			write_fit( fit, track )
+			if gpx:
+				write_gpx( gpx, track )
+			files.append( ( n, fit, gpx ) )
+
+		if not args.no_decoders:
+			print( "{:<32}{:>9}{:>11}{:>11}{:>9}".format( "file", "points", "numpy", "fitparse", "speedup" ) )
+			bench_fit_decoders( os.path.join( here, "plot_test.fit" ), args.repeat, args.fitparse_max )
+			for n, fit, gpx in files:
+				bench_fit_decoders( fit, args.repeat, args.fitparse_max )
+			print()
+
+		#####
+		##### stage timings, compared with previous run in history
+		#####
+		previous	= last_history( args.history, settings( args, opt ) )
+		results		= []
+		regressed	= []
+		
+		print( "{:<28}{:>9}{:>12}{:>12}{:>9}".format( "stage [ms]", "points", "time", "previous", "ratio" ) )
+		
+		for n, fit, gpx in files:
+			for name, s in bench_stages( fit, gpx, opt, args.repeat, plot = n <= args.plot_max ).items():
+				prev	= previous.get( ( n, name ) )
+				ratio	= s[ "ms" ] / prev if prev else None
+				mark	= ""
+				
+				if ratio and args.threshold < ratio and 1.0 < s[ "ms" ] - prev:	# difference less than 1ms is noise
+					mark	= "  <- slower"
+					regressed.append( ( n, name, ratio ) )
+				
+				print( "{:<28}{:>9}{:>12.1f}{:>12}{:>9}{}".format( "  " * s[ "depth" ] + s[ "name" ], n, s[ "ms" ],
+					"{:.1f}".format( prev ) if prev else "---", "{:.2f}x".format( ratio ) if ratio else "---", mark ) )
+				
+				results.append( dict( points = n, stage = name, ms = round( s[ "ms" ], 3 ), calls = s[ "calls" ], depth = s[ "depth" ] ) )
+
+	if args.history:
+		os.makedirs( os.path.dirname( os.path.abspath( args.history ) ), exist_ok = True )
+		with open( args.history, "a" ) as f:
+			f.write( json.dumps( dict( environment(), settings = settings( args, opt ), results = results ) ) + "\n" )
+		print( "\nresults appended to \"{}\"".format( args.history ) )
+
+	if regressed:
+		print( "\n{} stage(s) slower than previous run by more than {}x".format( len( regressed ), args.threshold ) )
+		sys.exit( 1 )
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+# on-disk cache of parsed activity data
+#
+#	keeps normalized DataFrame (one .npy file per column) and session/units (pickle)
+#	in a directory named by hash of the file content.
+#	entries are evicted in least-recently-used order when total size exceeds the limit
+#
+#	an entry is written in temporary directory and published by rename as "<key>/<generation>",
+#	so entries can be shared by processes. when an entry is widened (more columns), new generation is
+#	made and old one is removed later
+#
+#	each entry has sparse index of "distance" and "timestamp" per row group. range of rows
+#	(i.e. --start/--fin) is read from memory mapped columns, so the time depends on the range length.
+#	file hash is memorized with size and modification time of the file.
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.3 17-October-2026   # generations published by atomic rename
+# Version 0.2 17-October-2026   # row group index and range reading
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	numpy as np
+import	pandas as pd
+import	datetime
+import	errno
+import	hashlib
+import	os
+import	pickle
+import	shutil
+import	tempfile
+import	time
+
+CACHE_VERSION	= 3		# 2: laps in session, 3: generations in entry
+DEFAULT_DIR		= os.path.join( os.path.expanduser( "~" ), ".cache", "run_coursemap" )
+DEFAULT_SIZE_MB	= 500
+META_FILE		= "meta.pickle"
+HASH_FILE		= "hashes.pickle"
+HASH_MEMO_MAX	= 1000		# files in hash memo
+STALE_SECONDS	= 60		# older generation of entry is removed after this time from last use
+ROW_GROUP		= 4096
+INDEX_COLUMNS	= [ "distance", "timestamp" ]
+EPOCH			= pd.Timestamp( 0, tz = "UTC" )
+
+
+def file_hash( file_name ):
+	h	= hashlib.blake2b( digest_size = 20 )
+	with open( file_name, "rb" ) as f:
+		for chunk in iter( lambda: f.read( 1 << 20 ), b"" ):
+			h.update( chunk )
+	return h.hexdigest()
+
+
+def content_hash( content ):
+	# same as file_hash() of the file which has "content" (bytes)
+	return hashlib.blake2b( content, digest_size = 20 ).hexdigest()
+
+
+def index_values( v ):
+	# float array for index (UNIX time for timestamps, NaN for missing)
+	if isinstance( v, pd.Series ) and pd.api.types.is_datetime64_any_dtype( v ) or isinstance( v, ( datetime.datetime, np.datetime64 ) ):
+		v	= pd.to_datetime( v, utc = True )
+		return (v - EPOCH) / pd.Timedelta( seconds = 1 )
+	return v.to_numpy( dtype = np.float64, na_value = np.nan ) if isinstance( v, pd.Series ) else float( v )
+
+
+def row_index( data, group = ROW_GROUP ):
+	#####
+	##### sparse index for range reading. for each row group of INDEX_COLUMNS:
+	#####	"max" : maximum value in rows up to the end of group
+	#####	"min" : minimum value in rows from the start of group
+	##### both are monotonic even if the column is not (i.e. GPS noise in distance)
+	#####
+	n		= len( data )
+	starts	= np.arange( 0, n, group )
+	ends	= np.minimum( starts + group, n ) - 1
+	index	= { "group": group, "rows": n }
+
+	for name in INDEX_COLUMNS:
+		if name not in data.columns or n == 0:
+			continue
+		v	= np.asarray( index_values( data[ name ] ), dtype = np.float64 )
+		index[ name ]	= {
+			"max":	np.maximum.accumulate( np.nan_to_num( v, nan = -np.inf ) )[ ends ],
+			"min":	np.minimum.accumulate( np.nan_to_num( v, nan =  np.inf )[ ::-1 ] )[ ::-1 ][ starts ],
+		}
+
+	return index
+
+
+def index_rows( index, name, low, high ):
+	#####
+	##### ( first, end ) of rows which can have value of "name" column in [ low, high ]. None if not indexed
+	#####
+	if not index or name not in index:
+		return None
+
+	g		= index[ "group" ]
+	g0		= np.searchsorted( index[ name ][ "max" ], index_values( low ), "left" )
+	g1		= np.searchsorted( index[ name ][ "min" ], index_values( high ), "right" )
+
+	return int( g0 * g ), int( min( max( g0, g1 ) * g, index[ "rows" ] ) )
+
+
+def dir_size( path ):
+	return sum( os.path.getsize( os.path.join( path, f ) ) for f in os.listdir( path ) )
+
+
+class ActivityCache:
+	def __init__( self, cache_dir = DEFAULT_DIR, size_mb = DEFAULT_SIZE_MB ):
+		self.cache_dir	= cache_dir
+		self.max_bytes	= size_mb * 2 ** 20
+		os.makedirs( cache_dir, exist_ok = True )
+
+	def key( self, file_name, tag = "", digest = None ):
+		# "tag" distinguishes the data made from same file by different ways (i.e. decoder)
+		# "digest" is content_hash() of the file if it is known (i.e. uploaded data in temporary file)
+		return "{}_{}{}".format( digest or self.hash( file_name ), CACHE_VERSION, "_" + tag if tag else "" )
+
+	def hash( self, file_name ):
+		#####
+		##### file hash is calculated again only if size or modification time of the file is changed.
+		##### memo keeps HASH_MEMO_MAX files at most. files which don't exist are removed from memo.
+		##### memo update by other process at same time can be lost, then the hash is just calculated again
+		#####
+		memo_file	= os.path.join( self.cache_dir, HASH_FILE )
+		st			= os.stat( file_name )
+		stamp		= ( st.st_size, st.st_mtime_ns )
+		name		= os.path.abspath( file_name )
+
+		try:
+			with open( memo_file, "rb" ) as f:
+				memo	= pickle.load( f )
+		except ( OSError, EOFError, pickle.UnpicklingError ):
+			memo	= {}
+
+		if name in memo and memo[ name ][ 0 ] == stamp:
+			return memo[ name ][ 1 ]
+
+		h			= file_hash( file_name )
+		memo.pop( name, None )
+		memo		= { k: v for k, v in memo.items() if os.path.exists( k ) }
+		for k in list( memo )[ :len( memo ) - (HASH_MEMO_MAX - 1) ]:	# older ones are removed
+			del memo[ k ]
+		memo[ name ]	= ( stamp, h )
+
+		tmp	= memo_file + ".{}.tmp".format( os.getpid() )
+		try:
+			with open( tmp, "wb" ) as f:
+				pickle.dump( memo, f )
+			os.replace( tmp, memo_file )
+		except OSError:
+			pass
+
+		return h
+
+	def path( self, key ):
+		return os.path.join( self.cache_dir, key )
+
+	def generations( self, key ):
+		# generation numbers of the entry, in ascending order
+		try:
+			return sorted( int( g ) for g in os.listdir( self.path( key ) ) if g.isdigit() )
+		except OSError:
+			return []
+
+	def latest( self, key ):
+		#####
+		##### ( path, meta ) of the newest generation of the entry. ( None, None ) if not found
+		#####
+		for g in reversed( self.generations( key ) ):
+			path	= os.path.join( self.path( key ), str( g ) )
+			try:
+				with open( os.path.join( path, META_FILE ), "rb" ) as f:
+					return path, pickle.load( f )
+			except ( OSError, EOFError, pickle.UnpicklingError ):
+				continue
+		return None, None
+
+	def meta( self, key ):
+		return self.latest( key )[ 1 ]
+
+	def get( self, key, columns = None, mmap = False, seek = None ):
+		#####
+		##### returns ( data, session, units ) or None if the entry doesn't have all of "columns"
+		##### "seek" = ( column, low, high ) limits rows to the row groups which can have the value in range
+		#####
+		path, meta	= self.latest( key )
+		if meta is None:
+			return None
+
+		stored	= meta[ "columns" ]
+		if columns is None:
+			if not meta[ "complete" ]:
+				return None
+			names	= list( stored )
+		else:
+			if not meta[ "complete" ] and not set( columns ) <= set( meta[ "asked" ] ):
+				return None
+			names	= [ c for c in stored if c in columns ]
+
+		data	= {}
+		rows	= index_rows( meta.get( "index" ), *seek ) if seek else None
+
+		try:
+			for name in names:
+				file	= os.path.join( path, stored[ name ] )
+				if rows is None:
+					data[ name ]	= np.load( file, mmap_mode = "r" if mmap else None, allow_pickle = True )
+				else:
+					try:
+						arr	= np.load( file, mmap_mode = "r" )
+					except ValueError:		# object array can not be mapped
+						arr	= np.load( file, allow_pickle = True )
+					data[ name ]	= np.array( arr[ rows[ 0 ]:rows[ 1 ] ] )
+
+			os.utime( os.path.join( path, META_FILE ) )		# for LRU
+		except OSError:		# removed by other process
+			return None
+
+		return pd.DataFrame( data, copy = False ), meta[ "session" ], meta[ "units" ]
+
+	def put( self, key, data, session, units, asked = None ):
+		#####
+		##### entry is made in temporary directory and published by atomic rename as a new generation.
+		##### live generations are not changed, so other processes can read (or map) them while this is stored.
+		##### if other process published same generation first, it is an equivalent entry and taken as success
+		##### "asked" is the columns requested to reader (None for all). it can include ones not in file
+		#####
+		tmp	= tempfile.mkdtemp( dir = self.cache_dir, prefix = ".tmp_" )
+
+		try:
+			stored	= {}
+			for i, name in enumerate( data.columns ):
+				stored[ name ]	= "{}.npy".format( i )
+				np.save( os.path.join( tmp, stored[ name ] ), data[ name ].to_numpy(), allow_pickle = True )
+
+			meta	= { "columns": stored, "asked": asked, "complete": asked is None, "session": session, "units": units, "index": row_index( data ) }
+			with open( os.path.join( tmp, META_FILE ), "wb" ) as f:
+				pickle.dump( meta, f )
+
+			gens	= self.generations( key )
+			os.makedirs( self.path( key ), exist_ok = True )
+			try:
+				os.rename( tmp, os.path.join( self.path( key ), str( gens[ -1 ] + 1 if gens else 1 ) ) )
+			except OSError as e:
+				if e.errno not in [ errno.ENOTEMPTY, errno.EEXIST ]:
+					raise
+		finally:
+			if os.path.isdir( tmp ):
+				shutil.rmtree( tmp, ignore_errors = True )
+
+		self.evict()
+
+	def entries( self ):
+		# [ ( last used time, size, key ) ] of all entries
+		e	= []
+		for key in os.listdir( self.cache_dir ):
+			gens	= self.generations( key )
+			if key.startswith( "." ) or not gens:
+				continue
+			try:
+				path	= self.path( key )
+				used	= max( os.path.getmtime( os.path.join( path, str( g ), META_FILE ) ) for g in gens )
+				e.append( ( used, sum( dir_size( os.path.join( path, str( g ) ) ) for g in gens ), key ) )
+			except OSError:		# being stored or removed by other process
+				continue
+		return e
+
+	def evict( self ):
+		#####
+		##### least recently used entries are removed while total size exceeds the limit.
+		##### older generations which are not used for STALE_SECONDS are removed
+		#####
+		now	= time.time()
+		for key in os.listdir( self.cache_dir ):
+			for g in self.generations( key )[ :-1 ]:
+				path	= os.path.join( self.path( key ), str( g ) )
+				try:
+					if STALE_SECONDS < now - os.path.getmtime( os.path.join( path, META_FILE ) ):
+						shutil.rmtree( path, ignore_errors = True )
+				except OSError:
+					shutil.rmtree( path, ignore_errors = True )
+
+		e		= sorted( self.entries() )
+		total	= sum( size for t, size, key in e )
+
+		while total > self.max_bytes and 1 < len( e ):	# the latest one is kept anyway
+			t, size, key	= e.pop( 0 )
+			shutil.rmtree( self.path( key ), ignore_errors = True )
+			total	-= size
+
+
+def load( file_name, reader, columns = None, tag = "", cache = None, seek = None, digest = None ):
+	#####
+	##### reads data through cache.
+	##### "reader( file_name, columns )" returns ( data, session, units ) when cache missed
+	##### "seek" = ( column, low, high ) reads only the row groups which can have the value in range when cache hit.
+	##### rows out of range can be included, so the data should be filtered by caller
+	##### "digest" is content_hash() of the file if it is known. the file is not hashed then
+	##### returns ( data, session, units, cache_hit )
+	#####
+	if cache is None:
+		return reader( file_name, columns ) + ( False, )
+
+	key		= cache.key( file_name, tag, digest )
+	cached	= cache.get( key, columns, seek = seek )
+
+	if cached is not None:
+		return cached + ( True, )
+
+	meta	= cache.meta( key )
+	if meta is not None and columns is not None:	# widen the entry to keep columns used before
+		columns	= list( dict.fromkeys( list( meta[ "asked" ] or [] ) + list( columns ) ) )
+
+	data, session, units	= reader( file_name, columns )
+	try:
+		cache.put( key, data, session, units, asked = columns )
+	except OSError:
+		pass	# data is returned even if it can not be stored
+
+	return data, session, units, False
@@ -0,0 +1,906 @@
+#!/usr/bin/env python3
+
+# coursemap.py
+#
+# library for plotting 3D course map from .fit or .gpx file.
+# all settings are given by an immutable "Options" object. no global settings are used,
+# so it can be called from threads/processes rendering many requests.
+#
+# usage:
+#	import coursemap
+#	png	= coursemap.render_course( "data.fit", coursemap.Options( azimuth = 60, map_resolution = "mid" ), fmt = "png" )
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026  # separated from run_coursemap.py
+
+# Copyright (c) 2021-2022 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	fitpandas_util as fu
+import	coursecache
+import	smoothing as sm
+from	stagetiming import stage
+import	numpy as np
+import	os.path
+import	collections
+import	dataclasses
+import	io
+import	threading
+import	pandas as pd
+import	re
+
+#	heavy modules are imported where they are used:
+#		fitpandas, gpxpandas	: read_activity()
+#		matplotlib, mplot3d		: figure(), curtain()
+#		staticmaps, tilecache	: get_map(), map_credit()
+#		gazetteer				: info()
+#		timezonefinder, pytz	: timezone_finder(), timezone_at()
+
+
+FOOTNOTE		= "plotted by 'run_coursemap'\nhttps://github.com/teddokano/run_coursemap"
+OSM_CREDIT		= "Maps & data © OpenStreetMap contributors"
+K				= 40075.016686
+OVERSIZE_RATIO	= 1.1
+MAP_RESOLUTION	= { "low": 256, "mid": 512, "high": 1024, "off": "" }
+
+REQUIRED_DATA_COLUMNS	= [ 	
+	"distance", 
+	"altitude", 
+	"position_long", 
+	"position_lat"
+]
+
+COLORKEY	= { "distance": "km", "altitude": "m", "speed": "km/h", "power": "W", "heart_rate": "bpm" }
+
+# choices of options. listed here to check options without importing the modules
+FIT_DECODERS		= [ "numpy", "fitparse" ]	# fitpandas.DECODERS
+GPX_READERS			= [ "stream", "gpxpy" ]		# gpxpandas.READERS
+ANIMATION_FORMATS	= [ "gif", "apng", "mp4" ]	# animation.FORMATS
+ALT_FILTERS			= [ "norm", "avg", "off" ]
+CURTAINS			= [ "collection", "legacy" ]
+LAP_MARKERS			= [ "off", "laps", "summits", "both" ]
+TILE_PROVIDERS		= [ "arcgis-worldimagery", "carto", "carto-nolabels", "carto-dark", "carto-darknolabels", "osm", "stadia-alidade-smooth", "jawg-light", "jawg-dark", "none" ]	# staticmaps.default_tile_providers
+
+TZ_DIGITS	= 2		# coordinates are rounded for timezone memo (0.01 degree = about 1km)
+
+_tz_finder	= None
+_tz_lock	= threading.Lock()
+_tz_memo	= {}
+
+_gazetteers		= {}	# place name file: Gazetteer
+_gazetteer_lock	= threading.Lock()
+
+
+@dataclasses.dataclass( frozen = True )
+class Options:
+	#####
+	##### plot settings. names and defaults are same as command line options of run_coursemap.py (except "quiet")
+	#####
+	input_file:			str		= ""		# shown in plot title
+	z_axis:				str		= "altitude"
+	elevation:			float	= 60
+	azimuth:			float	= -86
+	map_resolution:		str		= "low"
+	fit_decoder:		str		= "numpy"
+	gpx_reader:			str		= "stream"
+	all_columns:		bool	= False
+	no_cache:			bool	= False
+	cache_dir:			str		= coursecache.DEFAULT_DIR
+	cache_size:			float	= coursecache.DEFAULT_SIZE_MB
+	tile_provider:		str		= "osm"
+	tiles:				str		= "online"
+	tile_cache_dir:		str		= None		# None for tilecache defaults
+	tile_ttl:			float	= None
+	tile_cache_size:	float	= None
+	gazetteer:			str		= None
+	map_texture:		int		= 0
+	alt_filt:			str		= "avg"
+	am_size:			int		= 300
+	olr:				int		= 2
+	start:				float	= 0
+	fin:				float	= float( "inf" )
+	thining_factor:		int		= 1
+	max_points:			int		= 0			# 0: no limit
+	lap_markers:		str		= "off"
+	map_alpha:			float	= 0.1
+	curtain:			str		= "collection"
+	curtain_alpha:		float	= 0.1
+	color_key:			str		= "distance"
+	colorbar:			str		= None
+	colorbarV:			str		= None
+	colorbarall:		bool	= False
+	negative_alt:		bool	= False
+	verbose:			bool	= False
+	quiet:				bool	= True
+
+	@classmethod
+	def from_args( cls, args ):
+		# from argparse.Namespace (other attributes are ignored)
+		names	= { f.name for f in dataclasses.fields( cls ) }
+		return cls( **{ k: v for k, v in vars( args ).items() if k in names } )
+
+	def replace( self, **changes ):
+		return dataclasses.replace( self, **changes )
+
+
+Scene	= collections.namedtuple( "Scene", [ "data", "session", "lim_val", "map_arr", "info_text", "options" ] )
+
+
+def warm_up( opt = Options() ):
+	#####
+	##### importing modules and loading data used in rendering before first request (for server)
+	#####
+	import	fitpandas
+	import	gpxpandas
+	from	matplotlib.figure import Figure
+	from	mpl_toolkits.mplot3d import Axes3D
+	
+	if opt.map_resolution != "off":
+		import	staticmaps
+		import	tilecache
+	
+	timezone_finder()
+	
+	if opt.gazetteer:
+		place_index( opt.gazetteer )
+
+	fig	= Figure( figsize = ( 1, 1 ) )
+	fig.add_subplot( 111, projection = "3d" ).text( 0, 0, 0, "warm up" )
+	fig.savefig( io.BytesIO(), format = "png" )
+
+
+def print_v( opt, s ):
+	if opt.verbose:
+		print( s  )
+
+
+def render_course( course, options = Options(), fmt = None, dpi = 600 ):
+	#####
+	##### "course" is file name or ( data, session, units ) given by load_course()
+	##### returns matplotlib Figure if "fmt" is None, or bytes of the image in "fmt" (i.e. "png")
+	#####
+	fig, ax	= figure( make_scene( course, options ) )
+	
+	if fmt is None:
+		return fig
+	
+	buf	= io.BytesIO()
+	fig.savefig( buf, format = fmt, dpi = dpi, bbox_inches = "tight", pad_inches = 0.05 )
+	return buf.getvalue()
+
+
+def make_scene( course, opt ):
+	# everything needed for figure: filtered data, plot range, map texture and info text
+	if isinstance( course, str ):
+		course	= load_course( course, opt )[ :3 ]
+	
+	data, s_data, units	= course
+	data, lim_val, opt	= prepare( data, s_data, opt )
+	map_arr				= get_map( opt.map_resolution, lim_val, opt ) if opt.map_resolution != "off" else None
+	
+	return Scene( data, s_data, lim_val, map_arr, info( s_data, lim_val, opt ), opt )
+
+
+def load_course( file_name, opt, digest = None ):
+	#####
+	##### reads file through cache. returns ( data, session, units, cache_hit )
+	##### "digest" is coursecache.content_hash() of the file if it is known
+	#####
+	cache	= None if opt.no_cache else coursecache.ActivityCache( opt.cache_dir, opt.cache_size )
+	reader	= lambda file_name, columns: read_activity( file_name, columns, opt.fit_decoder, opt.gpx_reader )
+	seek	= ( "distance", opt.start, opt.fin ) if 0 < opt.start or opt.fin < float( "inf" ) else None	# rows are filtered in prepare()
+	
+	with stage( "read" ):
+		tag	= opt.gpx_reader if os.path.splitext( file_name )[ 1 ].lower() == ".gpx" else opt.fit_decoder		# reader made the data
+		return coursecache.load( file_name, reader, columns = data_columns( opt ), tag = tag, cache = cache, seek = seek, digest = digest )
+
+
+def prepare( data, s_data, opt ):
+	#####
+	##### data filtering and plot range calculation. returns ( data, lim_val, opt )
+	##### "opt" is changed if given color key can not be used
+	#####
+	if opt.color_key not in data.columns:
+		print( "WARNING:" )
+		print( "  color key: \"{}\" was specified but not available.".format( opt.color_key ) )
+		print( "  default key \"{}\" had been chosen for plot".format( "distance" ) )
+		print( "  available keying data are.. {}".format( set(COLORKEY.keys()) & set(data.columns) ) )
+		opt	= opt.replace( color_key = "distance" )
+	
+	if opt.z_axis != "altitude":
+		opt	= opt.replace( color_key = opt.z_axis )
+	
+	required	= REQUIRED_DATA_COLUMNS + ([ opt.color_key ] if opt.color_key != "distance" else [])
+	
+	if opt.color_key in [ "speed", "power" ]:
+		data	= data.copy()
+		max	= data[ "speed" ].max()
+		mean	= data[ "speed" ].mean()
+		lim		= mean - (max - mean)
+		data.loc[ data[ "speed" ] < lim, "speed" ] = float( "NaN" )
+
+	data	= data.dropna( subset = required )
+	data	= data[ (data[ "distance" ] >= opt.start) & (data[ "distance" ] <= opt.fin) ]
+	data	= data.reset_index( drop = True )
+
+	with stage( "limit_values" ):
+		lim_val	= fu.limit_values( data, opt )
+	lim_val[ "sport" ]	= s_data[ "sport" ]	# tentative implementation for colorbar drawing
+	lim_val[ "laps" ]	= s_data.get( "laps", [] )
+	
+	return data, lim_val, opt
+
+
+def figure( scene, fig = None ):
+	#####
+	##### draws scene into "fig" (new Figure if None. pyplot figure can be given for screen)
+	#####
+	data, s_data, lv, map_arr, info_text, opt	= scene
+	
+	from	matplotlib.figure import Figure
+	from	mpl_toolkits.mplot3d import Axes3D	# registers "3d" projection
+	
+	if fig is None:
+		fig	= Figure( figsize=( 11, 11 ) )
+	ax	= fig.add_subplot( 111, projection = "3d" )
+
+	if map_arr is not None:
+		with stage( "map surface" ):
+			draw_map( ax, map_arr, lv )
+	
+	with stage( "plot" ):
+		plot( ax, data, lv, opt )
+
+	# ax.set_title( "course plot of " + opt.input_file  )
+	fig.text( 0.2, 0.92, "course plot by \"{}\"\n * curtain color: \"{}\"".format( opt.input_file, opt.color_key ), fontsize = 9, alpha = 0.5, ha = "left", va = "top" )
+	fig.text( 0.8, 0.92, info_text, fontsize = 9, alpha = 0.5, ha = "right", va = "top" )
+	fig.text( 0.8, 0.1, FOOTNOTE + "\n" + (map_credit( opt.tile_provider ) if map_arr is not None else ""), fontsize = 9, alpha = 0.5, ha = "right" )
+	
+	ax.view_init( opt.elevation, opt.azimuth )
+	
+	return fig, ax
+
+
+class ColorScale:
+	def __init__( self, series, smoothing = False, logscale = False ):
+		d	= series.copy()
+
+		if logscale:
+			d	= np.log( d )
+			d.replace( float( "-inf" ), 0, inplace = True )
+
+		if smoothing:
+			WNDW_LEN	= 120
+			self.series	= pd.Series( sm.smooth( d.to_numpy( dtype = np.float64 ), WNDW_LEN, pad = "reflect" ) )
+
+		else:
+			self.series	= d
+
+		self.min	= self.series.min()
+		self.max	= self.series.max()
+		self.fullscale	= self.max - self.min
+		self.series	-= self.min
+		self.series	/= self.fullscale
+
+	def ratio( self, count ):
+		return self.series[ count ]
+
+	def rgba( self, palette, index = None ):
+		# colors of points ( at "index" ) gathered from "palette" in one operation
+		r	= self.series.to_numpy( dtype = np.float64 )
+		if index is not None:
+			r	= r[ index ]
+		return palette[ ((len( palette ) - 1) * np.nan_to_num( r )).astype( np.int64 ) ]
+
+
+def read_activity( file_name, columns, fit_decoder = "numpy", gpx_reader = "stream" ):
+	#####
+	##### reads file and normalizes units: degree for position, km for distance and km/h for speed
+	#####
+	file_suffix	= os.path.splitext( file_name )[ 1 ].lower()
+
+	if ".fit" == file_suffix:
+		import	fitpandas
+		with stage( "parse" ):
+			data, s_data, units	= fitpandas.get_workout( file_name, decoder = fit_decoder, columns = columns )
+		
+	elif ".gpx" == file_suffix:
+		import	gpxpandas
+		with stage( "parse" ):
+			data, s_data, units	= gpxpandas.get_course( file_name, reader = gpx_reader, columns = columns )
+
+	with stage( "unit conversion" ):
+		if ".fit" == file_suffix:
+			data[ "position_lat"  ]	= fu.semicircles2dgree( data[ "position_lat"  ] )
+			data[ "position_long" ]	= fu.semicircles2dgree( data[ "position_long" ] )
+			s_data[ "nec_lat"  ]	= fu.semicircles2dgree( s_data[ "nec_lat"  ] )
+			s_data[ "swc_lat"  ]	= fu.semicircles2dgree( s_data[ "swc_lat"  ] )
+			s_data[ "nec_long" ]	= fu.semicircles2dgree( s_data[ "nec_long" ] )
+			s_data[ "swc_long" ]	= fu.semicircles2dgree( s_data[ "swc_long" ] )
+		
+		data[ "distance" ]	/= 1000.0	# convert from meter to kilometer
+		if "speed" in data.columns:
+			data[ "speed" ]	*= 3.6		# convert from m/s to km/h
+
+		units.update( { k: "deg" for k, u in units.items() if u == "semicircles" } )
+		units.update( { "distance": "km", "speed": "km/h" } )
+
+	return data, s_data, units
+
+
+def data_columns( opt ):
+	# columns to be read from file: required ones + all color keys (to show available keys if given one is not in file)
+	# "speed" is in color keys. it is used for filtering. "timestamp" is for time index of cache and lap markers
+	
+	if opt.all_columns:
+		return None
+	
+	columns	= REQUIRED_DATA_COLUMNS + [ "timestamp" ] + list( COLORKEY ) + [ opt.z_axis ]
+	
+	return list( dict.fromkeys( columns ) )
+
+
+def info( s, lv, opt ):
+	with stage( "timezone" ):
+		dt	= get_localtimef( lv[ "v_cntr_deg" ], lv[ "h_cntr_deg" ], s[ "start_time" ] )
+	sp	= s[ "sport" ]
+	
+	if sp == "running":
+		avg	= "{}/km".format( fu.second2MS( fu.speed2pace( s[ "avg_speed" ] ) ) )
+	else:
+		avg	= "{:.2f}km/h".format( s[ "avg_speed" ] * 3.6 )
+		
+	if opt.map_resolution != "off":
+		with stage( "geocoding" ):
+			g	= place_index( opt.gazetteer ) if opt.gazetteer else None
+			start_place		= fu.get_city_name( lv[ "start_lat"    ], lv[ "start_long"    ], g )
+			farend_place	= fu.get_city_name( lv[ "farthest_lat" ], lv[ "farthest_long" ], g )
+		if start_place == farend_place:
+			place	= start_place
+		else:
+			place	= "{} - {}".format( start_place, farend_place )
+	else:
+		place	= ""
+
+	"""
+	if sp in fu.SYMBOL_CHAR.keys():
+		print( fu.SYMBOL_CHAR[ sp ] )
+		sp	= fu.SYMBOL_CHAR[ sp ] + " " + sp
+	"""
+	
+	str		= "{} for {:.3f}km, {} (avg:{})".format( sp, s[ "total_distance" ] / 1000.0, fu.second2HMS( s[ "total_timer_time" ] ), avg )
+	print_v( opt, "  {}\n  started on {}".format( str, dt ) )
+	
+	return "{}\n{}\n{}".format( str, dt, place )
+
+
+def timezone_finder():
+	# TimezoneFinder is made once and shared (loading its data takes time)
+	global _tz_finder
+	
+	with _tz_lock:
+		if _tz_finder is None:
+			from	timezonefinder import TimezoneFinder
+			_tz_finder	= TimezoneFinder()
+	
+	return _tz_finder
+
+
+def place_index( file_name ):
+	# Gazetteer is loaded once for each place name file and shared
+	with _gazetteer_lock:
+		if file_name not in _gazetteers:
+			import	gazetteer
+			_gazetteers[ file_name ]	= gazetteer.Gazetteer( file_name )
+	
+	return _gazetteers[ file_name ]
+
+
+def preload_timezone_finder():
+	# loading TimezoneFinder in background while file is being parsed
+	thread	= threading.Thread( target = timezone_finder, daemon = True )
+	thread.start()
+	return thread
+
+
+def timezone_at( v, h ):
+	# timezone memoized on rounded coordinates
+	key	= ( round( v, TZ_DIGITS ), round( h, TZ_DIGITS ) )
+	
+	if key not in _tz_memo:
+		import	pytz
+		_tz_memo[ key ]	= pytz.timezone( timezone_finder().timezone_at( lat = key[ 0 ], lng = key[ 1 ] ) )
+	
+	return _tz_memo[ key ]
+
+
+def get_localtimef( v, h, dt ):
+	tz	= timezone_at( v, h )
+
+	if dt.tzinfo:
+		dt.replace( tzinfo = None )
+	else:
+		dt	+= tz.utcoffset( dt )
+		dt	 = tz.localize( dt )
+		
+	return "{}".format( dt.astimezone( tz ) )
+
+
+def get_localtimef_pre( v, h, dt ):
+	tz		= timezone_at( v, h )
+	offset	= tz.utcoffset( dt )
+	seconds	= offset.total_seconds()
+	return "{} (UTC{:0=+3}{:02} {})".format( dt + offset, int( seconds // 3600 ), int((seconds % 3600) // 60), tz )
+
+
+def plot( ax, data, lv, opt ):
+	span	= lv[ "vh_span" ]
+	
+	ds	= data[ "distance" ].tolist()
+	dm_interval	= findinterval( ds[ -1 ] - ds[ 0 ] )	# finding distance marker interval
+
+	print_v( opt, "  distance marker interval {}km".format( dm_interval ) )
+
+	#####
+	##### start plotting
+	#####	
+
+	ax.set_xlim( [ lv[ "west"   ],  lv[ "east"  ] ] )
+	ax.set_ylim( [ lv[ "south"  ],  lv[ "north" ] ] )
+	ax.set_zlim( [ lv[ "bottom" ],  lv[ "top"   ] ] )
+
+	COLORS	= 360
+	COLOR_REVERSE	= [ "altitude", "speed" ]
+	
+	cm	= fu.color_map( COLORS + 1, reverse = opt.color_key in COLOR_REVERSE )
+	
+	smoothing_flag	= True if opt.color_key == "power" else False
+	col_scale	= ColorScale( data[ opt.color_key ], smoothing = smoothing_flag, logscale = False )
+
+	dm_format	= dmformat( dm_interval )
+
+	ys, xs	= fu.km_projection( data[ "position_lat" ].to_numpy(), data[ "position_long" ].to_numpy(), lv )
+#	zs	= data[ opt.z_axis ].tolist()
+
+	if opt.z_axis != "altitude":
+		zs	 = pd.Series( data[ opt.z_axis ] )
+		zs	-= zs.min()
+		zs	/= zs.max()
+		zs	*= (data[ "altitude" ].max() - data[ "altitude" ].min())
+		zs	+= data[ "altitude" ].min()
+		zs	 = zs.to_numpy()
+	else:
+		zs	= data[ "altitude" ].to_numpy()
+
+	m_val	= [ k * dm_interval for k in range( int(ds[ 0 ] / dm_interval + 1), int(ds[ -1 ] / dm_interval) ) ]
+	m_dic	= marker_index( ds, m_val )
+	l_mrk	= lap_markers( ds, data.get( "timestamp" ), data[ "altitude" ].to_numpy(), lv[ "laps" ], opt.lap_markers ) if opt.lap_markers != "off" else []	# placed on "zs"
+	
+	#####
+	##### level of detail: points to be plotted. distance markers, start and finish are always kept
+	#####
+	with stage( "level of detail" ):
+		idx	= level_of_detail( xs, ys, zs, lv, list( m_dic.values() ) + [ i for i, label in l_mrk ], opt.thining_factor, opt.max_points )
+	
+	print_v( opt, "  plotting {} of {} points".format( len( idx ), len( ds ) ) )
+	
+	m_dic	= { v: int( np.searchsorted( idx, i ) ) for v, i in m_dic.items() }	# index in plotted points
+	l_mrk	= [ ( int( np.searchsorted( idx, i ) ), label ) for i, label in l_mrk ]
+	xs		= xs[ idx ].tolist()
+	ys		= ys[ idx ].tolist()
+	zs		= zs[ idx ].tolist()
+	cs		= col_scale.rgba( cm, idx )		# (N, 4) array
+	
+	z_min	= lv[ "bottom" ]
+
+	w	= 0.01
+	r	= 0.8
+
+	if ( opt.colorbar != "off" ):
+		direction	= opt.colorbar
+
+		if ( direction == None ):
+			if ( opt.azimuth != None ):
+				dir	= [ "e", "n", "w", "s" ]
+				pos0	= dir[ int( (opt.azimuth        % 360) / 90 ) ]
+				pos1	= dir[ int( ((opt.azimuth + 90) % 360) / 90 ) ]
+				direction	= "{}{}".format( pos0, pos1 )
+			else:
+				direction	= "se"
+	
+		if opt.colorbarall: direction	= "nsew"
+
+		direction	= re.findall( "[n]|[s]|[e]|[w]", direction )
+
+		for p in direction:
+			with stage( "colorbars" ):
+				colorbar( ax, cm, lv, col_scale.min, col_scale.max, position = p, ratio = r, width = w, color_key = opt.color_key )
+
+	if ( opt.colorbarV != "off" ):
+		vc		= [ "se", "nw", "ne", "sw", "wn", "es", "ws", "en" ]
+		if ( opt.colorbarV not in vc ):
+			corner	= [ vc[ int( (opt.azimuth % 360) / 45 ) ] ]
+		else:
+			corner	= [ opt.colorbarV ]
+	
+		if opt.colorbarall: corner	= [ "ne", "nw", "se", "sw" ]
+
+		for c in corner:
+			with stage( "colorbars" ):
+				colorbar( ax, cm, lv, col_scale.min, col_scale.max, orientation = "vertical", corner = c, ratio = 1, width = w, color_key = opt.color_key )
+
+
+	with stage( "curtain" ):
+		curtain( ax, xs, ys, zs, z_min, cs, opt.curtain_alpha, legacy = opt.curtain == "legacy" )
+
+	if opt.color_key != "distance":
+		for v, i in m_dic.items():
+			cs[ i ]	= [ 0.5, 0.5, 0.5, 1.0 ]
+	
+	for v, i in m_dic.items():
+		marktext( ax, xs[ i ], ys[ i ], zs[ i ], 10, (dm_format % v) + "km", 10, cs[ i ], 0.99, "center" )
+
+	for i, label in l_mrk:
+		marktext( ax, xs[ i ], ys[ i ], zs[ i ], 30, label, 9, [ 0.3, 0.3, 0.3 ], 0.8, "center" )
+
+	if opt.z_axis != "altitude":
+		zs	= data[ "altitude" ].to_numpy()[ idx ].tolist()
+		
+	ax.plot( xs, ys, z_min, color = [ 0, 0, 0 ], alpha = 0.1 )	# course shadow plot on bottom
+	ax.plot( xs, ys, zs,    color = [ 0, 0, 0 ], alpha = 0.2 )	# course plot on trace edge
+
+	marktext( ax, xs[  0 ], ys[  0 ], zs[  0 ], 200, "start", 20, [ 0, 1, 0 ], 0.5, "left" )
+	marktext( ax, xs[ -1 ], ys[ -1 ], zs[ -1 ], 200, "fin",   20, [ 1, 0, 0 ], 0.5, "right" )
+	
+	marktext( ax, lv[ "west"   ], lv[ "v_cntr" ], z_min, 0, "W", 12, [ 0, 0, 0 ], 0.2, "center" )
+	marktext( ax, lv[ "east"   ], lv[ "v_cntr" ], z_min, 0, "E", 12, [ 0, 0, 0 ], 0.2, "center" )
+	marktext( ax, lv[ "h_cntr" ], lv[ "south"  ], z_min, 0, "S", 12, [ 0, 0, 0 ], 0.2, "center" )
+	marktext( ax, lv[ "h_cntr" ], lv[ "north"  ], z_min, 0, "N", 12, [ 0, 0, 0 ], 0.2, "center" )
+	
+	ax.set_xlabel( "[km]\nlongitude (-):west / (+): east"  )
+	ax.set_ylabel( "[km]\nlatiitude (-):south / (+): north" )
+	ax.set_zlabel( "altitude [m]" )
+	ax.grid()
+
+
+def level_of_detail( xs, ys, zs, lv, keep, thining_factor = 1, max_points = 0 ):
+	#####
+	##### sorted indices of points to be plotted. every "thining_factor" point is taken,
+	##### then reduced to "max_points" (0: no limit) by LTTB on plot scale (altitude range as tall as horizontal span).
+	##### points in "keep", first and last are always included
+	#####
+	n		= len( xs )
+	keep	= np.unique( np.array( [ 0, n - 1 ] + list( keep ), dtype = np.int64 ) )
+	idx		= np.arange( 0, n, max( thining_factor, 1 ) )
+	
+	if 0 < max_points < len( idx ) + len( keep ):
+		z_range	= (lv[ "top" ] - lv[ "bottom" ]) or 1
+		points	= np.column_stack( ( xs[ idx ] / lv[ "vh_span" ], ys[ idx ] / lv[ "vh_span" ], (zs[ idx ] - lv[ "bottom" ]) / z_range ) )
+		idx		= idx[ fu.lttb( points, max( max_points - len( keep ), 3 ) ) ]
+	
+	return np.union1d( idx, keep )
+
+
+def curtain( ax, xs, ys, zs, z_min, cs, alpha, legacy = False ):
+	#####
+	##### vertical lines from trace down to the bottom
+	#####
+	if legacy:	# a Line3D artist per point
+		for x, y, z, cc in zip( xs, ys, zs, cs ):
+			ax.plot( [ x, x ], [ y, y ], [ z, z_min ], color = cc, alpha = alpha )
+		return
+	
+	top		= np.column_stack( ( xs, ys, zs ) )
+	bottom	= top.copy()
+	bottom[ :, 2 ]	= z_min
+	
+	segments	= np.stack( ( top, bottom ), axis = 1 )		# (N, 2, 3)
+	from	mpl_toolkits.mplot3d.art3d import Line3DCollection
+	
+	#####
+	##### one collection is depth-sorted as one artist. to keep trace lines, markers and texts above
+	##### the curtain, artists are drawn in zorder: map (0), curtain (0.5), then others (1 or more)
+	#####
+	ax.computed_zorder	= False
+	ax.add_collection3d( Line3DCollection( segments, colors = cs, alpha = alpha, zorder = 0.5 ) )
+
+
+def colorbar( ax, cm, lv, min, max, orientation = "horizontal", corner = "ne", position = "n", width = 0.02, ratio = 0.5, alpha = 0.5, color_key = "distance" ):
+	pos	= { "n": "north", "s": "south", "e": "east", "w": "west" }
+	position	= pos[ position ]
+	
+	n	= 360		# color steps
+	
+	if orientation == "horizontal":
+		if position == "north" or position == "south":
+			span_x		= lv[ "east" ] - lv[ "west" ]
+			start_x		= lv[ "west" ] + span_x * (1 - ratio) * 0.5
+			end_x		= lv[ "east" ] - span_x * (1 - ratio) * 0.5
+			center_x	= lv[ "west" ] + span_x * 0.5
+
+			span_x		= 0
+
+			span_y		= (lv[ "north" ] - lv[ "south" ]) * width
+			start_y		= lv[ position ]
+			center_y	= lv[ position ]
+			end_y		= lv[ position ]
+
+			xs, ys, zs	= np.linspace( start_x,  end_x, n ), lv[ position ], lv[ "bottom" ]
+
+		else:
+			span_y		= lv[ "north" ] - lv[ "south" ]
+			start_y		= lv[ "south" ] + span_y * (1 - ratio) * 0.5
+			end_y		= lv[ "north" ] - span_y * (1 - ratio) * 0.5
+			center_y	= lv[ "south" ] + span_y * 0.5
+
+			span_y		= 0
+
+			span_x		= (lv[ "east" ] - lv[ "west" ]) * width
+			start_x		= lv[ position ]
+			center_x	= lv[ position ]
+			end_x		= lv[ position ]
+
+			xs, ys, zs	= lv[ position ], np.linspace( start_y,  end_y, n ), lv[ "bottom" ]
+		
+		start_z		= lv[ "bottom" ]
+		end_z		= lv[ "bottom" ]
+		center_z	= lv[ "bottom" ]
+	else:
+		span_z		= lv[ "top"    ] - lv[ "bottom"  ]
+		start_z		= lv[ "bottom" ] + span_z * (1 - ratio) * 0.5
+		end_z		= lv[ "top"    ] - span_z * (1 - ratio) * 0.5
+		center_z	= lv[ "bottom" ] + span_z * 0.5
+
+		xc	= "east"  if "e" in corner else "west"
+		yc	= "north" if "n" in corner else "south"
+
+		span_x		= (lv[ "east"  ] - lv[ "west"  ]) * width
+		span_y		= (lv[ "north" ] - lv[ "south" ]) * width
+
+		span_x		*= 1 if xc == "east"  else -1
+		span_y		*= 1 if yc == "north" else -1
+
+		xs, ys, zs	= lv[ xc ], lv[ yc ], np.linspace( start_z,  end_z, n )
+
+		start_x		= lv[ xc ]
+		center_x	= lv[ xc ]
+		end_x		= lv[ xc ]
+		start_y		= lv[ yc ]
+		end_y		= lv[ yc ]
+		center_y	= lv[ yc ]
+
+	if position == "south" or position == "west":
+		span_x	*= -1
+		span_y	*= -1
+
+	#####
+	##### a short line for each color step, drawn as one collection
+	#####
+	start	= np.column_stack( np.broadcast_arrays( xs, ys, zs, np.zeros( n ) )[ :3 ] )
+	end		= start + [ span_x, span_y, 0 ]
+	
+	from	mpl_toolkits.mplot3d.art3d import Line3DCollection
+	ax.add_collection3d( Line3DCollection( np.stack( ( start, end ), axis = 1 ), colors = cm[ :n ], alpha = alpha ) )
+
+	if lv["sport"] == "running" and color_key == "speed":
+		lbl	= "pace"
+		min	= "{}/km".format( fu.second2MS( fu.speed2pace( min / 3.6 ) ) )
+		max	= "{}/km".format( fu.second2MS( fu.speed2pace( max / 3.6 ) ) )
+	else:
+		lbl	= color_key
+		min	= "{:.1f}{}".format( min, COLORKEY[ color_key ] )
+		max	= "{:.1f}{}".format( max, COLORKEY[ color_key ] )
+
+	size	= 9
+	color	= [ 0, 0, 0 ]
+	pos		= "center"
+	marktext( ax, start_x,  start_y,  start_z,  0, min, size, color, alpha, pos )
+	marktext( ax, end_x,    end_y,    end_z,    0, max, size, color, alpha, pos )
+	marktext( ax, center_x, center_y, center_z, 0, lbl, size, color, alpha, pos )
+
+
+def findinterval( x ):
+	e	= np.floor(np.log10( x ) )
+	m	= x / (10 ** e)
+
+	if ( m <= 2 ):
+		r	= 1
+	elif ( m <= 5 ):
+		r	= 2
+	else:
+		r	= 5
+	
+	r	*= (10 ** (e-1))
+	
+	return ( int( r ) if 1 <= r else float( r ) )	# interval can be less than 1km for short course
+
+
+def dmformat( di ):
+	e	= 0 - np.floor( np.log10( di ) )
+	if ( 0 < e ):
+		f	= "%." + "{:.0f}".format( 0 - np.floor( np.log10( di ) ) ) + "f"
+	else:
+		f	= "%.0f"
+	return ( f )
+
+
+def marktext( ax, x, y, z, dotsize, text, textsize, color, av, align ):
+	ax.scatter(	x, y, z, s = dotsize,	color = color,	alpha = av )
+	ax.text(	x, y, z, text,			color = color,	alpha = av, size = textsize, ha = align, va = "bottom" )
+
+
+def get_map( size_idx, lv, opt ):
+
+	# finding zoom level
+	# reference: https://wiki.openstreetmap.org/wiki/Zoom_levels
+	# reference: https://wiki.openstreetmap.org/wiki/Tiles
+	
+	ZOOM_SCALE		= [ 360,
+		180,	90,		45,		22.5, 	11.25, 	
+		5.625, 	2.813,	1.406,	0.703,	0.352,	
+		0.176,	0.088,	0.044,	0.022,	0.011,	
+		0.005,	0.003,	0.001,	0.0005, 0.00025
+	]
+	TILE_SIZE		= 256.0
+
+	size	= MAP_RESOLUTION[ size_idx ]
+	span	= lv[ "vh_span" ] * TILE_SIZE / size
+
+	for zoom_level in range( 1, len( ZOOM_SCALE) + 1 ):
+		if (span / lv[ "Ch" ]) > ZOOM_SCALE[ zoom_level ]:
+			break
+			
+	zoom_level	-= 1
+	
+	map_span_by_size	= (K * lv[ "Rcv" ]) / (2 ** zoom_level) * (size / TILE_SIZE)
+	size	= int( np.ceil( size * (lv[ "vh_span" ] / map_span_by_size) ) )
+
+	print_v( opt, "  reruested max map size = {} pixels (equals to {:.3f}km span)".format( MAP_RESOLUTION[ size_idx ], map_span_by_size ) )
+	if not opt.quiet:	print( "  zoom_level = {}, map size = {} pixels".format( zoom_level, size ) )
+	
+	import	staticmaps
+	import	tilecache
+	
+	downloader	= tilecache.CachedTileDownloader( tilecache.tile_source( opt.tiles ), opt.tile_cache_dir, opt.tile_ttl, opt.tile_cache_size )
+	
+	context	= staticmaps.Context()
+	context.set_tile_provider( staticmaps.default_tile_providers[ opt.tile_provider ] )	
+	context.set_tile_downloader( downloader )
+	context.set_zoom( zoom_level )	
+	context.set_center( staticmaps.create_latlng( *fu.deg_projection( lv[ "v_cntr" ], lv[ "h_cntr" ], lv ) ) )
+	with stage( "map fetch" ):
+		image = context.render_cairo( size, size )
+	
+	downloader.evict()
+	print_v( opt, "  map tiles: {} from cache, {} fetched from \"{}\"".format( downloader.hit, downloader.miss, opt.tiles ) )
+
+	# image.write_to_png("_map_img.png")
+	
+	with stage( "map texture" ):
+		arr	= map_texture( image.get_data(), image.get_stride(), size, opt.map_alpha )
+	
+		if opt.map_texture and opt.map_texture < size:
+			arr		= downsample( arr, opt.map_texture )
+			size	= opt.map_texture
+			print_v( opt, "  map texture downsampled to {} x {}".format( size, size ) )
+
+	return	arr
+
+
+def draw_map( axis, arr, lv ):
+	size	= len( arr )
+
+	surface_x	= np.linspace( lv[ "west"  ],  lv[ "east"  ],  size )[ :, None ]
+	surface_y	= np.linspace( lv[ "south" ],  lv[ "north" ] , size )
+
+	stride	= 1
+	axis.plot_surface( surface_x, surface_y, np.atleast_2d( lv[ "bottom" ] ), rstride = stride, cstride = stride, facecolors = arr, shade = False, zorder = 0 )
+
+
+def map_credit( tile_provider = "osm" ):
+	if tile_provider == "osm":
+		return OSM_CREDIT
+	
+	import	staticmaps
+	return staticmaps.default_tile_providers[ tile_provider ].attribution() or ""
+
+
+def map_texture( buf, stride, size, alpha ):
+	#####
+	##### Cairo ARGB32 (BGRA in memory) buffer to RGBA texture for plot_surface
+	##### image is rotated to match surface axes: texture[ i ][ j ] = image[ size - 1 - j ][ i ]
+	#####
+	img	= np.frombuffer( buf, dtype = np.uint8 ).reshape( size, stride )[ :, : size * 4 ].reshape( size, size, 4 )	# no copy
+	img	= np.rot90( img, -1 )
+	
+	arr	= np.empty( ( size, size, 4 ), dtype = np.float16 )
+	arr[ :, :, :3 ]	= img[ :, :, 2::-1 ] / 255.0
+	arr[ :, :,  3 ]	= alpha
+	
+	return arr
+
+
+def downsample( arr, n ):
+	# averaging texture into n x n blocks
+	edges	= np.linspace( 0, len( arr ), n + 1 ).astype( int )[ :-1 ]
+	counts	= np.diff( np.append( edges, len( arr ) ) )
+	
+	a	= np.add.reduceat( arr.astype( np.float32 ), edges, axis = 0 )
+	a	= np.add.reduceat( a, edges, axis = 1 )
+	a	/= (counts[ :, None ] * counts[ None, : ])[ :, :, None ]
+	
+	return a.astype( np.float16 )
+
+
+def marker_index( data, marker_list ):
+	# { marker value: index of nearest point }
+	return dict( zip( marker_list, nearest_index( data, marker_list ).tolist() ) )
+
+
+def nearest_index( data, values ):
+	#####
+	##### indices of nearest points for all values by binary search on cumulative distance
+	#####
+	d	= np.maximum.accumulate( np.asarray( data, dtype = np.float64 ) )	# monotonic even if distance has noise
+	v	= np.asarray( values, dtype = np.float64 )
+	
+	if len( d ) < 2:
+		return np.zeros( len( v ), dtype = np.int64 )
+	
+	i	= np.clip( np.searchsorted( d, v ), 1, len( d ) - 1 )
+	i	-= (v - d[ i - 1 ]) <= (d[ i ] - v)		# left one if it is nearer (or same)
+	
+	return i
+
+
+def lap_ends( ds, ts, laps ):
+	#####
+	##### ( index of last point, lap is in data range, lap ends before end of data ) of each lap.
+	##### lap end is found by lap end time ("timestamp") on record timestamps "ts".
+	##### by cumulative "total_distance" on distance "ds" if times are not given (it can drift on auto-paused laps)
+	#####
+	ends	= [ l.get( "timestamp" ) for l in laps ]
+	
+	if ts is not None and all( e is not None for e in ends ):
+		t		= np.maximum.accumulate( np.nan_to_num( np.asarray( coursecache.index_values( ts ), dtype = np.float64 ), nan = -np.inf ) )
+		ends	= np.array( [ coursecache.index_values( e ) for e in ends ] )
+		starts	= np.array( [ coursecache.index_values( l[ "start_time" ] ) if l.get( "start_time" ) is not None else e for l, e in zip( laps, np.append( -np.inf, ends[ :-1 ] ) ) ] )
+		i_end	= np.clip( np.searchsorted( t, ends, "right" ) - 1, 0, len( t ) - 1 )
+		return i_end, (t[ 0 ] <= ends) & (starts <= t[ -1 ]), ends < t[ -1 ]
+	
+	ends	= np.cumsum( [ l.get( "total_distance", 0 ) or 0 for l in laps ] ) / 1000.0	# in km
+	starts	= ends - np.array( [ l.get( "total_distance", 0 ) or 0 for l in laps ] ) / 1000.0
+	return nearest_index( ds, ends ), (ds[ 0 ] <= ends) & (starts <= ds[ -1 ]), ends < ds[ -1 ]
+
+
+def lap_markers( ds, ts, altitude, laps, kind = "both" ):
+	#####
+	##### [ ( index, label ) ] of lap/split ends and highest point in each lap from FIT lap messages
+	##### "kind": "laps", "summits" or "both". lap by auto-lap (distance, time, position) is shown as split
+	##### summit is found on "altitude" even if other data is used for z-axis
+	#####
+	AUTO	= [ "distance", "time", "position_start", "position_lap", "position_waypoint", "position_marked" ]
+	
+	if not laps:
+		return []
+	
+	i_end, inside, before_end	= lap_ends( ds, ts, laps )
+	markers	= []
+	start	= 0
+	
+	for n, ( lap, i ) in enumerate( zip( laps, i_end ), 1 ):
+		time	= fu.second2MS( lap[ "total_timer_time" ] ) if lap.get( "total_timer_time" ) is not None else ""
+		
+		alt	= altitude[ start : i + 1 ]
+		if inside[ n - 1 ] and kind in [ "summits", "both" ] and start < i and np.isfinite( alt ).any():
+			top	= start + int( np.nanargmax( alt ) )
+			markers.append( ( top, "▲{:.0f}m".format( altitude[ top ] ) ) )
+		
+		if inside[ n - 1 ] and kind in [ "laps", "both" ] and n < len( laps ) and before_end[ n - 1 ]:
+			markers.append( ( int( i ), "{} {}".format( "split" if lap.get( "lap_trigger" ) in AUTO else "lap {}".format( n ), time ) ) )
+		
+		start	= i
+	
+	return markers
+	
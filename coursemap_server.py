@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+
+# coursemap_server.py
+#
+# headless render server of course map.
+# .fit/.gpx file is posted and PNG image is returned. rendering is done by pre-warmed worker
+# processes (modules imported, timezone data and fonts loaded before first request).
+#
+# usage:  coursemap_server.py [--port 8080 | --socket /tmp/coursemap.sock] [-w 4]
+#
+#	POST /render?azimuth=60&map_resolution=mid&dpi=150	body: content of .fit or .gpx file
+#		query: fields of coursemap.Options (view settings), "fmt" (png/svg/pdf), "dpi" and "name" (shown in title)
+#		       numerical values are clamped into LIMITS, values of CHOICES are checked
+#		response: image. timings are in "Server-Timing" and "X-Coursemap-*" headers
+#	GET  /health
+#		response: JSON of worker and queue status
+#
+#	client example:
+#		curl --data-binary @plot_test.fit -o plot.png "http://localhost:8080/render?azimuth=60"
+#		curl --unix-socket /tmp/coursemap.sock --data-binary @plot_test.fit -o plot.png "http://localhost/render"
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	coursemap
+import	coursecache
+import	argparse
+import	dataclasses
+import	http.server
+import	io
+import	json
+import	multiprocessing
+import	os
+import	queue
+import	socketserver
+import	sys
+import	tempfile
+import	threading
+import	time
+import	urllib.parse
+
+FORMATS		= { "png": "image/png", "svg": "image/svg+xml", "pdf": "application/pdf" }
+MAX_DPI		= 600
+
+# options which can not be given by request (server side settings)
+SERVER_OPTIONS	= [ "input_file", "cache_dir", "cache_size", "no_cache", "tiles", "tile_cache_dir", "tile_ttl", "tile_cache_size", "gazetteer", "verbose", "quiet" ]
+
+# allowed values of options given by request
+CHOICES		= {
+	"color_key":		coursemap.COLORKEY,
+	"z_axis":			coursemap.COLORKEY,
+	"map_resolution":	coursemap.MAP_RESOLUTION,
+	"fit_decoder":		coursemap.FIT_DECODERS,
+	"gpx_reader":		coursemap.GPX_READERS,
+	"alt_filt":			coursemap.ALT_FILTERS,
+	"curtain":			coursemap.CURTAINS,
+	"lap_markers":		coursemap.LAP_MARKERS,
+	"tile_provider":	coursemap.TILE_PROVIDERS,
+}
+
+# ( min, max ) of numerical options given by request. values are clamped into the range
+LIMITS		= {
+	"elevation":		( -90, 90 ),
+	"azimuth":			( -3600, 3600 ),
+	"map_texture":		( 0, 2048 ),
+	"am_size":			( 10, 2000 ),		# altitude map is am_size^2 cells
+	"olr":				( 0, 20 ),
+	"start":			( 0, float( "inf" ) ),
+	"fin":				( 0, float( "inf" ) ),
+	"thining_factor":	( 1, 10000 ),
+	"max_points":		( 0, 1000000 ),
+	"map_alpha":		( 0, 1 ),
+	"curtain_alpha":	( 0, 1 ),
+}
+
+_base_options	= None		# Options in worker process
+
+
+class RequestError( Exception ):
+	def __init__( self, status, message ):
+		super().__init__( message )
+		self.status	= status
+
+
+def init_worker( base_options ):
+	#####
+	##### warming up worker: timezone data, fonts and 3D axes are loaded before first request
+	#####
+	global _base_options
+	_base_options	= base_options
+
+	coursemap.warm_up( base_options )
+
+
+def worker_main( conn, base_options ):
+	#####
+	##### worker process: renders jobs from "conn" one by one. result is ( True, ( image, timings ) ) or ( False, error message )
+	#####
+	init_worker( base_options )
+	conn.send( "ready" )
+	
+	parent	= multiprocessing.parent_process()
+	
+	while parent.is_alive():	# stops if server is killed
+		if not conn.poll( 1 ):
+			continue
+		try:
+			job	= conn.recv()
+		except EOFError:
+			break
+		
+		try:
+			result	= ( True, render_job( *job ) )
+		except Exception as e:
+			result	= ( False, "{}: {}".format( type( e ).__name__, e ) )
+		conn.send( result )
+
+
+def render_job( content, suffix, changes, fmt, dpi ):
+	#####
+	##### renders posted file in worker. returns ( image, timings in ms ) or raises Exception
+	#####
+	t	= [ time.perf_counter() ]
+	opt	= _base_options.replace( **changes )
+
+	with tempfile.TemporaryDirectory() as tmp:
+		file_name	= os.path.join( tmp, "upload" + suffix )
+		with open( file_name, "wb" ) as f:
+			f.write( content )
+
+		course	= coursemap.load_course( file_name, opt, coursecache.content_hash( content ) )[ :3 ]	# temporary file is not put in hash memo
+		t.append( time.perf_counter() )
+
+	scene	= coursemap.make_scene( course, opt )
+	t.append( time.perf_counter() )
+
+	fig, ax	= coursemap.figure( scene )
+	buf		= io.BytesIO()
+	fig.savefig( buf, format = fmt, dpi = dpi, bbox_inches = "tight", pad_inches = 0.05 )
+	t.append( time.perf_counter() )
+
+	names	= [ "parse", "prepare", "render" ]
+	return buf.getvalue(), { n: (t[ i + 1 ] - t[ i ]) * 1000 for i, n in enumerate( names ) }
+
+
+def file_suffix( content ):
+	# .fit file has ".FIT" in header, .gpx is XML
+	if content[ 8:12 ] == b".FIT":
+		return ".fit"
+	if content.lstrip()[ :1 ] == b"<":
+		return ".gpx"
+	raise RequestError( 415, "posted data is not .fit or .gpx file" )
+
+
+def option_changes( query ):
+	#####
+	##### query parameters to Options fields with types. returns ( changes, fmt, dpi )
+	#####
+	fields	= { f.name: f for f in dataclasses.fields( coursemap.Options ) }
+	changes	= {}
+	fmt		= "png"
+	dpi		= 100
+
+	for key, values in urllib.parse.parse_qs( query, keep_blank_values = True ).items():
+		v	= values[ -1 ]
+		try:
+			if key == "fmt":
+				if v not in FORMATS:
+					raise ValueError( "one of {}".format( list( FORMATS ) ) )
+				fmt	= v
+			elif key == "dpi":
+				dpi	= float( v )
+				if not 0 < dpi <= MAX_DPI:
+					raise ValueError( "1 to {}".format( MAX_DPI ) )
+			elif key == "name":
+				changes[ "input_file" ]	= v
+			elif key in fields and key not in SERVER_OPTIONS:
+				kind	= fields[ key ].type
+				if kind == bool:
+					changes[ key ]	= v.lower() in [ "", "1", "true", "yes", "on" ]
+				elif kind in [ int, float ]:
+					x	= float( v )
+					if x != x or (abs( x ) == float( "inf" ) and key != "fin"):		# only "fin" can be "inf"
+						raise ValueError( "not a finite number" )
+					low, high		= LIMITS.get( key, ( -float( "inf" ), float( "inf" ) ) )
+					changes[ key ]	= kind( min( max( x, low ), high ) )
+				else:
+					changes[ key ]	= v
+			else:
+				raise ValueError( "unknown parameter" )
+		except ValueError as e:
+			raise RequestError( 400, "bad parameter \"{}={}\": {}".format( key, v, e ) )
+
+	for key, choices in CHOICES.items():
+		if key in changes and changes[ key ] not in choices:
+			raise RequestError( 400, "bad parameter \"{}\": one of {}".format( key, list( choices ) ) )
+
+	if "colorbar" in changes and changes[ "colorbar" ] != "off" and not (set( changes[ "colorbar" ] ) <= set( "nsew" ) and len( changes[ "colorbar" ] ) <= 4):
+		raise RequestError( 400, "bad parameter \"colorbar\": \"off\" or up to 4 of \"n\", \"s\", \"e\" and \"w\"" )
+
+	return changes, fmt, dpi
+
+
+class Worker:
+	#####
+	##### worker process and its connection. "ready" after warming up
+	#####
+	def __init__( self, base_options ):
+		self.conn, child	= multiprocessing.Pipe()
+		self.process	= multiprocessing.Process( target = worker_main, args = ( child, base_options ), daemon = True )
+		self.process.start()
+		child.close()
+		self.ready		= False
+
+	def wait_ready( self ):
+		# warming up time is not counted in render timeout
+		if not self.ready:
+			self.conn.recv()
+			self.ready	= True
+
+	def kill( self ):
+		self.process.kill()
+		self.process.join()
+		self.conn.close()
+
+
+class RenderService:
+	#####
+	##### worker processes with concurrency limit and bounded waiting queue.
+	##### a worker is taken from "idle" for a job. worker of timed out job is killed and replaced
+	##### (a job can not be cancelled), so at most "workers" renders run at a time
+	#####
+	def __init__( self, base_options, workers, queue_size, timeout ):
+		self.base_options	= base_options
+		self.idle		= queue.Queue()
+		for i in range( workers ):
+			self.idle.put( Worker( base_options ) )
+		self.workers	= workers
+		self.queue_size	= queue_size
+		self.timeout	= timeout
+		self.lock		= threading.Lock()
+		self.pending	= 0
+		self.served		= 0
+		self.failed		= 0
+		self.restarted	= 0
+
+	def restart_worker( self, worker ):
+		worker.kill()
+		with self.lock:
+			self.restarted	+= 1
+		return Worker( self.base_options )
+
+	def status( self ):
+		with self.lock:
+			return { "workers": self.workers, "queue_size": self.queue_size, "pending": self.pending, "served": self.served, "failed": self.failed, "restarted": self.restarted }
+
+	def render( self, content, query ):
+		# returns ( image, content type, timings in ms )
+		t0	= time.perf_counter()
+		changes, fmt, dpi	= option_changes( query )
+		suffix	= file_suffix( content )
+
+		with self.lock:
+			if self.workers + self.queue_size <= self.pending:
+				raise RequestError( 503, "server busy" )
+			self.pending	+= 1
+
+		try:
+			worker	= self.idle.get()
+			try:
+				worker.wait_ready()
+				t1	= time.perf_counter()
+				worker.conn.send( ( content, suffix, changes, fmt, dpi ) )
+				if not worker.conn.poll( self.timeout ):
+					worker	= self.restart_worker( worker )
+					raise RequestError( 504, "rendering timed out" )
+				ok, result	= worker.conn.recv()
+			except ( EOFError, OSError ):
+				worker	= self.restart_worker( worker )
+				raise RequestError( 500, "worker process stopped" )
+			finally:
+				self.idle.put( worker )
+			
+			if not ok:
+				raise RequestError( 422, "rendering failed: {}".format( result ) )
+			image, timings	= result
+		except RequestError:
+			with self.lock:
+				self.failed	+= 1
+			raise
+		finally:
+			with self.lock:
+				self.pending	-= 1
+
+		with self.lock:
+			self.served	+= 1
+
+		timings	= dict( queue = (t1 - t0) * 1000, **timings )
+		timings[ "total" ]	= (time.perf_counter() - t0) * 1000
+
+		return image, FORMATS[ fmt ], timings
+
+	def close( self ):
+		while not self.idle.empty():
+			self.idle.get().kill()
+
+
+class Handler( http.server.BaseHTTPRequestHandler ):
+	service		= None
+	max_upload	= 0
+	quiet		= False
+
+	def do_GET( self ):
+		if urllib.parse.urlsplit( self.path ).path != "/health":
+			return self.send_error_text( 404, "not found" )
+		self.send_body( 200, "application/json", json.dumps( self.service.status() ).encode() )
+
+	def do_POST( self ):
+		url	= urllib.parse.urlsplit( self.path )
+		if url.path != "/render":
+			return self.send_error_text( 404, "not found" )
+
+		length	= int( self.headers.get( "Content-Length", 0 ) )
+		if not length:
+			return self.send_error_text( 411, "file content is needed" )
+		if self.max_upload < length:
+			return self.send_error_text( 413, "file too large" )
+
+		content	= self.rfile.read( length )
+
+		try:
+			image, content_type, timings	= self.service.render( content, url.query )
+		except RequestError as e:
+			return self.send_error_text( e.status, str( e ), retry = e.status == 503 )
+
+		headers	= { "Server-Timing": ", ".join( "{};dur={:.1f}".format( k, v ) for k, v in timings.items() ) }
+		headers.update( { "X-Coursemap-{}-ms".format( k.capitalize() ): "{:.1f}".format( v ) for k, v in timings.items() } )
+		self.send_body( 200, content_type, image, headers )
+
+	def send_error_text( self, status, message, retry = False ):
+		self.send_body( status, "text/plain; charset=utf-8", (message + "\n").encode(), { "Retry-After": "1" } if retry else {} )
+
+	def send_body( self, status, content_type, body, headers = {} ):
+		self.send_response( status )
+		self.send_header( "Content-Type", content_type )
+		self.send_header( "Content-Length", str( len( body ) ) )
+		for k, v in headers.items():
+			self.send_header( k, v )
+		self.end_headers()
+		self.wfile.write( body )
+
+	def address_string( self ):
+		# client address of Unix domain socket is not a tuple
+		return self.client_address[ 0 ] if isinstance( self.client_address, tuple ) else "unix"
+
+	def log_message( self, format, *args ):
+		if not self.quiet:
+			super().log_message( format, *args )
+
+
+class ThreadingUnixHTTPServer( socketserver.ThreadingMixIn, socketserver.UnixStreamServer ):
+	daemon_threads	= True
+
+
+def command_line_handling():
+	parser	= argparse.ArgumentParser( description = "headless render server of course map" )
+	parser.add_argument(       "--host",			help = "host address",						default = "127.0.0.1" )
+	parser.add_argument(       "--port",			help = "port number",						type = int, default = 8080 )
+	parser.add_argument(       "--socket",			help = "Unix domain socket path (instead of TCP port)" )
+	parser.add_argument( "-w", "--workers",			help = "worker processes (concurrent renders), 0: number of CPUs",	type = int, default = 0 )
+	parser.add_argument(       "--queue",			help = "requests waiting for worker (more will be refused)",	type = int, default = 16 )
+	parser.add_argument(       "--timeout",			help = "render timeout in seconds",		type = float, default = 120 )
+	parser.add_argument(       "--max_upload",		help = "maximum file size in MB",		type = float, default = 50 )
+	parser.add_argument(       "--map_resolution",	help = "default map resolution",		choices = coursemap.MAP_RESOLUTION.keys(), default = "low" )
+	parser.add_argument(       "--tiles",			help = "map tile source: \"online\" or local directory or .mbtiles file", default = "online" )
+	parser.add_argument(       "--gazetteer",		help = "place name file for offline reverse geocoding" )
+	parser.add_argument(       "--cache_dir",		help = "cache directory",				default = coursemap.Options.cache_dir )
+	parser.add_argument(       "--no_cache", "--no-cache",	help = "parse file without cache",	action = "store_true" )
+	parser.add_argument( "-q", "--quiet",			help = "no access log",					action = "store_true" )
+	return	parser.parse_args()
+
+
+def main():
+	args	= command_line_handling()
+	workers	= args.workers if args.workers else os.cpu_count() or 1
+	base	= coursemap.Options( map_resolution = args.map_resolution, tiles = args.tiles, gazetteer = args.gazetteer, cache_dir = args.cache_dir, no_cache = args.no_cache )
+
+	Handler.service		= RenderService( base, workers, args.queue, args.timeout )
+	Handler.max_upload	= int( args.max_upload * 2 ** 20 )
+	Handler.quiet		= args.quiet
+
+	if args.socket:
+		if os.path.exists( args.socket ):
+			os.remove( args.socket )
+		server	= ThreadingUnixHTTPServer( args.socket, Handler )
+		where	= args.socket
+	else:
+		server	= http.server.ThreadingHTTPServer( ( args.host, args.port ), Handler )
+		where	= "http://{}:{}".format( args.host, args.port )
+
+	print( "coursemap server on {} with {} workers".format( where, workers ), file = sys.stderr )
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		Handler.service.close()
+		if args.socket and os.path.exists( args.socket ):
+			os.remove( args.socket )
+
+
+if __name__ == "__main__":
+	main()
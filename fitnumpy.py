@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+
+# .fit file decoder into NumPy arrays
+#
+#	reads definition/data messages of .fit file and gathers the data messages
+#	straight into NumPy structured arrays (one typed column per field).
+#	no Python object is made per field or per record.
+#	message/field profile (names, scale, offset, units and enums) is borrowed from fitparse
+#
+#	reference: https://developer.garmin.com/fit/protocol/
+#	reference: https://github.com/dtcooper/python-fitparse
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	numpy as np
+import	pandas as pd
+from	fitparse.profile import MESSAGE_TYPES
+
+UTC_REFERENCE	= 631065600		# timestamp for UTC 00:00 Dec 31 1989
+DATETIME_MIN	= 0x10000000	# smaller "date_time" values are relative time (system time)
+
+LAP_FIELDS		= [ "timestamp", "start_time", "total_distance", "total_timer_time", "lap_trigger" ]
+
+TIMESTAMP_FIELD	= 253
+FIELD_DESCRIPTION	= 206
+
+BASE_TYPES	= {	# base type number: ( name, numpy type, invalid value )
+	0x00: ( "enum",		"u1", 0xFF ),
+	0x01: ( "sint8",	"i1", 0x7F ),
+	0x02: ( "uint8",	"u1", 0xFF ),
+	0x03: ( "sint16",	"i2", 0x7FFF ),
+	0x04: ( "uint16",	"u2", 0xFFFF ),
+	0x05: ( "sint32",	"i4", 0x7FFFFFFF ),
+	0x06: ( "uint32",	"u4", 0xFFFFFFFF ),
+	0x07: ( "string",	"S1", None ),
+	0x08: ( "float32",	"f4", None ),
+	0x09: ( "float64",	"f8", None ),
+	0x0A: ( "uint8z",	"u1", 0x00 ),
+	0x0B: ( "uint16z",	"u2", 0x0000 ),
+	0x0C: ( "uint32z",	"u4", 0x00000000 ),
+	0x0D: ( "byte",		"u1", 0xFF ),
+	0x0E: ( "sint64",	"i8", 0x7FFFFFFFFFFFFFFF ),
+	0x0F: ( "uint64",	"u8", 0xFFFFFFFFFFFFFFFF ),
+	0x10: ( "uint64z",	"u8", 0x0000000000000000 ),
+}
+BASE_TYPE_BYTE	= 0x0D
+BASE_TYPE_STRING	= 0x07
+
+
+class Definition:
+	# a definition message and positions of the data messages which follow it
+
+	def __init__( self, buf, pos, developer_data ):
+		self.byteorder	= "big" if buf[ pos + 1 ] else "little"
+		self.mesg_num	= int.from_bytes( buf[ pos + 2 : pos + 4 ], self.byteorder )
+		num_fields		= buf[ pos + 4 ]
+
+		p	= pos + 5
+		self.fields	= [ tuple( buf[ p + i * 3 : p + i * 3 + 3 ] ) for i in range( num_fields ) ]	# ( def_num, size, base type )
+		p	+= num_fields * 3
+
+		self.dev_fields	= []	# ( def_num, size, dev_data_index )
+		if developer_data:
+			num_dev_fields	= buf[ p ]
+			self.dev_fields	= [ tuple( buf[ p + 1 + i * 3 : p + 1 + i * 3 + 3 ] ) for i in range( num_dev_fields ) ]
+			p	+= 1 + num_dev_fields * 3
+
+		self.def_size	= p - pos
+		self.size		= sum( f[ 1 ] for f in self.fields + self.dev_fields )
+
+		self.ts_offset	= None
+		offset	= 0
+		for def_num, size, base_type in self.fields:
+			if def_num == TIMESTAMP_FIELD and size == 4:
+				self.ts_offset	= offset
+			offset	+= size
+
+		self.positions	= []	# where the data messages (next to the header byte) are
+		self.sequence	= []	# message order in file
+		self.timestamp	= []	# timestamp given by compressed timestamp header, -1 if not compressed
+
+
+def scan( buf, mesg_nums ):
+	#####
+	##### walks through the file and collects positions of the data messages for "mesg_nums"
+	##### returns definitions in order of appearance. "field_description" messages are always collected
+	#####
+
+	wanted		= set( mesg_nums ) | { FIELD_DESCRIPTION }
+	definitions	= []
+
+	ts	= 0
+	seq	= 0
+	pos	= 0
+	size	= len( buf )
+
+	if size < 12:
+		raise ValueError( "invalid .fit file header (file is only {} bytes)".format( size ) )
+
+	while pos + 12 <= size:		# loop for chained fit files
+		header_size	= buf[ pos ]
+		if header_size not in ( 12, 14 ) or buf[ pos + 8 : pos + 12 ] != b".FIT":
+			raise ValueError( "invalid .fit file header at byte {}".format( pos ) )
+
+		data_size	= int.from_bytes( buf[ pos + 4 : pos + 8 ], "little" )
+		pos	+= header_size
+		end	 = pos + data_size
+		if size < end:
+			raise ValueError( "invalid .fit file size: header says {} data bytes but only {} remain".format( data_size, size - pos ) )
+		local	= {}
+
+		while pos < end:
+			h	= buf[ pos ]
+
+			if h & 0x80:		# compressed timestamp header
+				d		= local[ (h >> 5) & 0x3 ]
+				offset	= h & 0x1F
+				if offset < (ts & 0x1F):
+					ts	+= 0x20
+				ts	= (ts & ~0x1F) + offset
+				compressed	= True
+
+			elif h & 0x40:		# definition message
+				d	= Definition( buf, pos + 1, h & 0x20 )
+				local[ h & 0xF ]	= d
+				if d.mesg_num in wanted:
+					definitions.append( d )
+				pos	+= 1 + d.def_size
+				continue
+
+			else:
+				d	= local[ h & 0xF ]
+				compressed	= False
+
+			if d.ts_offset is not None:
+				p	= pos + 1 + d.ts_offset
+				t	= int.from_bytes( buf[ p : p + 4 ], d.byteorder )
+				if t != 0xFFFFFFFF:
+					ts	= t
+
+			if d.mesg_num in wanted:
+				d.positions.append( pos + 1 )
+				d.sequence.append( seq )
+				d.timestamp.append( ts if compressed else -1 )
+
+			seq	+= 1
+			pos	+= 1 + d.size
+
+		pos	= end + 2	# skip CRC
+
+	return definitions
+
+
+def raw_array( buf_arr, d, index ):
+	#####
+	##### gathers data messages of a definition into a (n, len( index )) byte array in one fancy-indexing
+	##### "index" gives byte offsets to be taken in the message
+	#####
+	positions	= np.array( d.positions, dtype = np.int64 )
+	return buf_arr[ positions[ :, None ] + index ]
+
+
+def field_names( field ):
+	#####
+	##### names which can be given by the field: itself, sub-fields and components
+	#####
+	if field is None:
+		return set()
+
+	names	= set()
+	for f in [ field ] + list( field.subfields or [] ):
+		names.add( f.name )
+		names	|= { c.name for c in f.components or [] }
+	return names
+
+
+def layout( d, mesg_type, dev_fields, columns ):
+	#####
+	##### offsets of the fields in message. fields not needed for "columns" are dropped
+	##### returns [ ( def_num, offset, size, base_type, field ) ], [ ( name, offset, size, base_type, units ) ]
+	#####
+	fields		= []
+	dev_layout	= []
+
+	offset	= 0
+	for def_num, size, base_type in d.fields:
+		field	= mesg_type.fields.get( def_num ) if mesg_type else None
+		fields.append( ( def_num, offset, size, base_type, field ) )
+		offset	+= size
+
+	for def_num, size, dev_index in d.dev_fields:
+		desc	= dev_fields.get( ( dev_index, def_num ) )
+		if desc:
+			name, base_type, units	= desc
+		else:
+			name, base_type, units	= "unknown_dev_{}_{}".format( dev_index, def_num ), BASE_TYPE_BYTE, None
+		dev_layout.append( ( name, offset, size, base_type, units ) )
+		offset	+= size
+
+	if columns is None:
+		return fields, dev_layout
+
+	columns	= set( columns )
+	needed	= set()
+	for def_num, offset, size, base_type, field in fields:
+		if field_names( field ) & columns or "unknown_{}".format( def_num ) in columns:
+			needed.add( def_num )
+			for sf in (field.subfields or []) if field else []:	# reference fields to resolve sub-fields
+				needed	|= { ref.def_num for ref in sf.ref_fields }
+
+	fields		= [ f for f in fields if f[ 0 ] in needed ]
+	dev_layout	= [ f for f in dev_layout if f[ 0 ] in columns ]
+
+	return fields, dev_layout
+
+
+def field_array( raw, offset, size, base_type, byteorder ):
+	#####
+	##### slices a field out of raw message array and gives it the typed view
+	#####
+	name, np_type, invalid	= BASE_TYPES.get( base_type & 0x1F, BASE_TYPES[ BASE_TYPE_BYTE ] )
+	item_size	= np.dtype( np_type ).itemsize
+
+	if size % item_size:
+		base_type	= BASE_TYPE_BYTE
+		name, np_type, invalid	= BASE_TYPES[ base_type ]
+		item_size	= 1
+
+	if base_type & 0x1F == BASE_TYPE_STRING:
+		col	= np.ascontiguousarray( raw[ :, offset : offset + size ] ).view( "S{}".format( size ) )[ :, 0 ]
+		return col, base_type & 0x1F
+
+	dt	= np.dtype( np_type ).newbyteorder( "<" if byteorder == "little" else ">" )
+	col	= np.ascontiguousarray( raw[ :, offset : offset + size ] ).view( dt )
+
+	if size == item_size:
+		col	= col[ :, 0 ]
+
+	return col, base_type & 0x1F
+
+
+def valid_mask( col, base_type ):
+	name, np_type, invalid	= BASE_TYPES[ base_type ]
+
+	if np_type[ 0 ] == "f":
+		return ~np.isnan( col )
+	return col != invalid
+
+
+def render_type( values, valid, field ):
+	#####
+	##### applies profile type to raw integers: enum names, date_time, bool
+	#####
+	ftype	= field.type
+	tname	= ftype.name
+
+	if tname in [ "date_time", "local_date_time" ]:
+		v	= values[ valid ]
+		if tname == "local_date_time" or (len( v ) and v.min() >= DATETIME_MIN):
+			t	= (values.astype( np.int64 ) + UTC_REFERENCE).astype( "datetime64[s]" ).astype( "datetime64[us]" )
+			return t, True
+		return values, False
+
+	if tname == "bool":
+		return values.astype( bool ), False
+
+	enum	= getattr( ftype, "values", None )
+	if enum:
+		uniq, inv	= np.unique( values, return_inverse = True )
+		names		= np.array( [ enum.get( int( u ), int( u ) ) for u in uniq ], dtype = object )
+		return names[ inv.reshape( values.shape ) ], False
+
+	return values, False
+
+
+def scale_offset( values, item ):
+	if item.scale:
+		values	= values.astype( np.float64 ) / item.scale
+	if item.offset:
+		values	= values - item.offset
+	return values
+
+
+def put( cols, name, units, values, valid, present ):
+	#####
+	##### stores a column. if the name is already there, the rows given by "present" are overwritten
+	#####
+	if name in cols:
+		v, ok, pr, u	= cols[ name ]
+		if values.dtype != v.dtype:
+			values	= values.astype( object )
+			v		= v.astype( object )
+		values	= np.where( present, values, v )
+		valid	= np.where( present, valid,  ok )
+		present	= present | pr
+		units	= units or u
+
+	cols[ name ]	= ( values, valid, present, units )
+
+
+def components( cols, mesg_type, field, values, valid, present ):
+	#####
+	##### expands component fields (i.e. "speed" -> "enhanced_speed") with array operations
+	#####
+	if values.ndim == 2:	# byte array: unpack as little endian integer
+		packed	= np.zeros( len( values ), dtype = np.uint64 )
+		for i in range( values.shape[ 1 ] ):
+			packed	|= values[ :, i ].astype( np.uint64 ) << np.uint64( 8 * i )
+		values	= packed
+
+	if values.dtype.kind not in "iu":
+		return
+
+	values	= values.astype( np.uint64 )
+
+	for c in field.components:
+		cmp_field	= mesg_type.fields.get( c.def_num )
+		if cmp_field is None:
+			continue
+
+		v	= (values >> np.uint64( c.bit_offset )) & np.uint64( (1 << c.bits) - 1 )
+		v	= v.astype( np.int64 )
+
+		if c.accumulate:	# unwrapping rollover counter
+			acc		= v[ valid ]
+			wrap	= np.concatenate( ( [ 0 ], np.cumsum( acc[ 1: ] < acc[ :-1 ] ) ) )
+			v[ valid ]	= acc + wrap * (1 << c.bits)
+
+		v		= scale_offset( v, c )
+		v, dt	= render_type( v, valid, cmp_field ) if v.dtype.kind in "iu" else ( v, False )
+		put( cols, cmp_field.name, None if dt else cmp_field.units, v, valid.copy(), present.copy() )
+
+
+def element_tuples( col, valid, item ):
+	# multiple values in a field are given as tuple like fitparse does
+	v	= scale_offset( col, item ) if item else col
+	out	= np.empty( len( col ), dtype = object )
+	out[ : ]	= [ tuple( x if ok else None for x, ok in zip( r, m ) ) for r, m in zip( v.tolist(), valid.tolist() ) ]
+	return out
+
+
+def decode_strings( col ):
+	out	= np.empty( len( col ), dtype = object )
+	out[ : ]	= [ s.split( b"\0" )[ 0 ].decode( "utf-8", "ignore" ) or None for s in col.tolist() ]
+	return out
+
+
+def columns_of( buf_arr, d, dev_fields = {}, columns = None ):
+	#####
+	##### converts data messages of a definition into columns
+	##### only fields needed for "columns" are taken from file (all fields if None)
+	##### returns { name: ( values, valid, present, units ) }
+	#####
+	n			= len( d.positions )
+	mesg_type	= MESSAGE_TYPES.get( d.mesg_num )
+	cols		= {}
+	all_rows	= np.ones( n, dtype = bool )
+	rawcols		= {}
+
+	fields, dev_layout	= layout( d, mesg_type, dev_fields, columns )
+	ranges	= [ np.arange( offset, offset + size ) for def_num, offset, size, base_type, field in fields ]
+	ranges	+= [ np.arange( offset, offset + size ) for name, offset, size, base_type, units in dev_layout ]
+	raw		= raw_array( buf_arr, d, np.concatenate( ranges ) if ranges else np.zeros( 0, dtype = np.int64 ) )
+
+	offset	= 0		# offset in "raw", packed by dropping fields
+	for def_num, o, size, base_type, field in fields:
+		rawcols[ def_num ]	= field_array( raw, offset, size, base_type, d.byteorder ) + ( field, )
+		offset	+= size
+
+	for def_num, ( col, base_type, field ) in rawcols.items():
+
+		if base_type == BASE_TYPE_STRING:
+			values	= decode_strings( col )
+			valid	= np.array( [ v is not None for v in values ], dtype = bool )
+			put( cols, field.name if field else "unknown_{}".format( def_num ), field.units if field else None, values, valid, all_rows )
+			continue
+
+		if base_type == BASE_TYPE_BYTE:
+			c2		= col if col.ndim == 2 else col[ :, None ]
+			valid	= ~np.all( c2 == 0xFF, axis = 1 )
+			values	= element_tuples( c2, np.ones( c2.shape, dtype = bool ), None )
+			if field and field.components:
+				components( cols, mesg_type, field, c2, valid, all_rows )
+			put( cols, field.name if field else "unknown_{}".format( def_num ), field.units if field else None, values, valid, all_rows )
+			continue
+
+		if col.ndim == 2:
+			ok		= valid_mask( col, base_type )
+			values	= element_tuples( col, ok, field )
+			put( cols, field.name if field else "unknown_{}".format( def_num ), field.units if field else None, values, all_rows, all_rows )
+			continue
+
+		valid	= valid_mask( col, base_type )
+
+		if field is None:
+			put( cols, "unknown_{}".format( def_num ), None, col.astype( np.float64 if col.dtype.kind == "f" else np.int64 ), valid, all_rows )
+			continue
+
+		#####
+		##### sub-field resolution: rows which match to reference field values are given the sub-field
+		#####
+		targets	= []
+		rest	= all_rows.copy()
+		for sf in field.subfields or []:
+			mask	= np.zeros( n, dtype = bool )
+			for ref in sf.ref_fields:
+				if ref.def_num in rawcols:
+					mask	|= rawcols[ ref.def_num ][ 0 ] == ref.raw_value
+			mask	&= rest
+			if mask.any():
+				targets.append( ( sf, mask ) )
+				rest	&= ~mask
+		targets.append( ( field, rest ) )
+
+		for f, rows in targets:
+			if not rows.any():
+				continue
+
+			if f.components:
+				components( cols, mesg_type, f, col, valid & rows, rows )
+
+			values	= col.astype( np.float64 if col.dtype.kind == "f" else np.int64 )
+			values, dt	= render_type( values, valid, f )
+			values	= scale_offset( values, f ) if values.dtype.kind in "iuf" else values
+			put( cols, f.name, None if dt else f.units, values, valid & rows, rows )
+
+	#####
+	##### developer fields: typed by "field_description" messages
+	#####
+	for name, o, size, base_type, units in dev_layout:
+		col, base_type	= field_array( raw, offset, size, base_type, d.byteorder )
+		offset	+= size
+
+		if base_type == BASE_TYPE_STRING:
+			values	= decode_strings( col )
+			valid	= np.array( [ v is not None for v in values ], dtype = bool )
+		elif col.ndim == 2 or base_type == BASE_TYPE_BYTE:
+			c2		= col if col.ndim == 2 else col[ :, None ]
+			values	= element_tuples( c2, valid_mask( c2, base_type ), None )
+			valid	= all_rows
+		else:
+			valid	= valid_mask( col, base_type )
+			values	= col.astype( np.float64 if col.dtype.kind == "f" else np.int64 )
+
+		put( cols, name, units, values, valid, all_rows )
+
+	#####
+	##### timestamp from compressed timestamp header
+	#####
+	ts	= np.array( d.timestamp, dtype = np.int64 )
+	compressed	= ts >= 0
+	if compressed.any() and (columns is None or "timestamp" in columns):
+		t	= (ts + UTC_REFERENCE).astype( "datetime64[s]" ).astype( "datetime64[us]" )
+		put( cols, "timestamp", None, t, compressed, compressed )
+
+	if columns is not None:		# drop the fields which were decoded only to make requested ones
+		cols	= { k: v for k, v in cols.items() if k in columns }
+
+	return cols
+
+
+def developer_fields( buf_arr, definitions ):
+	dev_fields	= {}
+
+	for d in definitions:
+		if d.mesg_num != FIELD_DESCRIPTION or not d.positions:
+			continue
+		for r in rows_of( columns_of( buf_arr, d ), len( d.positions ) ):
+			key	= ( r.get( "developer_data_index" ), r.get( "field_definition_number" ) )
+			name	= r.get( "field_name" ) or "unnamed_dev_field_{}".format( key[ 1 ] )
+			dev_fields[ key ]	= ( name, r.get( "fit_base_type_id" ) or BASE_TYPE_BYTE, r.get( "units" ) )
+
+	return dev_fields
+
+
+def python_value( v ):
+	if isinstance( v, pd.Timestamp ):
+		return v.to_pydatetime()
+	if isinstance( v, np.datetime64 ):
+		return v.astype( "datetime64[us]" ).item()
+	if isinstance( v, np.generic ):
+		return v.item()
+	return v
+
+
+def rows_of( cols, n ):
+	#####
+	##### message as dict like fitparse does: field which is defined but invalid is given as None
+	#####
+	rows	= [ {} for i in range( n ) ]
+	for name, ( values, valid, present, units ) in cols.items():
+		for r, v, ok, pr in zip( rows, values, valid, present ):
+			if pr:
+				r[ name ]	= python_value( v ) if ok else None
+	return rows
+
+
+def read( file_name, mesg_names, columns = {} ):
+	#####
+	##### reads file and returns { mesg_name: [ ( sequence, columns ), .. ] }
+	##### "columns" can limit the fields to be decoded for each message: { mesg_name: [ field names ] }
+	#####
+	with open( file_name, "rb" ) as f:
+		buf	= f.read()
+
+	nums		= { m.name: n for n, m in MESSAGE_TYPES.items() }
+	mesg_nums	= [ nums[ name ] for name in mesg_names ]
+	definitions	= scan( buf, mesg_nums )
+	buf_arr		= np.frombuffer( buf, dtype = np.uint8 )
+	dev_fields	= developer_fields( buf_arr, definitions )
+
+	messages	= { name: [] for name in mesg_names }
+	for d in definitions:
+		if d.mesg_num not in mesg_nums or not d.positions:
+			continue
+		name	= MESSAGE_TYPES[ d.mesg_num ].name
+		messages[ name ].append( ( np.array( d.sequence, dtype = np.int64 ), columns_of( buf_arr, d, dev_fields, columns.get( name ) ) ) )
+
+	return messages
+
+
+def frame( blocks ):
+	#####
+	##### concatenates the blocks (data messages of each definition) into a DataFrame in file order
+	#####
+	names	= []
+	for seq, cols in blocks:
+		names	+= [ k for k in cols.keys() if k not in names ]
+
+	known	= sorted( k for k in names if not k.startswith( "unknown_" ) )
+	unknown	= sorted( ( k for k in names if k.startswith( "unknown_" ) ), key = lambda k: [ int( x ) if x.isdigit() else x for x in k.split( "_" ) ] )
+
+	if not blocks:
+		return pd.DataFrame(), {}
+
+	order	= np.argsort( np.concatenate( [ seq for seq, cols in blocks ] ), kind = "stable" )
+	data	= {}
+	units	= {}
+
+	for name in known + unknown:
+		sample	= next( cols[ name ][ 0 ] for seq, cols in blocks if name in cols )
+		vs, oks	= [], []
+		for seq, cols in blocks:
+			if name in cols:
+				v, ok, pr, u	= cols[ name ]
+				if u:
+					units[ name ]	= u
+			else:
+				v	= np.zeros( len( seq ), dtype = sample.dtype )
+				ok	= np.zeros( len( seq ), dtype = bool )
+			vs.append( v )
+			oks.append( ok )
+
+		v	= np.concatenate( vs )[ order ] if len( vs ) > 1 else vs[ 0 ][ order ]
+		ok	= np.concatenate( oks )[ order ] if len( oks ) > 1 else oks[ 0 ][ order ]
+
+		if not ok.all():
+			if v.dtype.kind in "iub":
+				v	= v.astype( np.float64 )
+			else:
+				v	= v.copy()
+			if v.dtype.kind == "f":
+				v[ ~ok ]	= np.nan
+			elif v.dtype.kind == "M":
+				v[ ~ok ]	= np.datetime64( "NaT" )
+			else:
+				v[ ~ok ]	= None
+
+		data[ name ]	= v
+
+	return pd.DataFrame( data ), units
+
+
+def messages_dict( blocks ):
+	#####
+	##### all messages merged in one dict, later message overwrites
+	#####
+	merged	= {}
+	units	= {}
+
+	for seq, cols in sorted( blocks, key = lambda b: b[ 0 ][ 0 ] if len( b[ 0 ] ) else 0 ):
+		for r in rows_of( cols, len( seq ) ):
+			merged.update( r )
+		for name, ( values, valid, present, u ) in cols.items():
+			if u:
+				units[ name ]	= u
+
+	return merged, units
+
+
+def get_workout( file_name, columns = None ):
+	# lap messages are given in session[ "laps" ] as list of dict
+	messages	= read( file_name, [ "record", "session", "lap" ], { "record": columns, "lap": LAP_FIELDS } )
+
+	workout, units	= frame( messages[ "record" ] )
+	session, s_units	= messages_dict( messages[ "session" ] )
+	units.update( s_units )
+
+	laps, l_units	= frame( messages[ "lap" ] )
+	session[ "laps" ]	= [ { k: python_value( v ) for k, v in r.items() if v == v } for r in laps.to_dict( "records" ) ]	# "v == v": not NaN
+
+	return workout, session, units
@@ -6,6 +6,7 @@
 #	reference: http://johannesjacob.com/2019/03/13/analyze-your-cycling-data-python/
 #
 # Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.5 17-October-2026   # NumPy decoder (fitnumpy) added
 # Version 0.4.3 27-February-2021
 
 # Copyright (c) 2021 Tedd OKANO
@@ -13,10 +14,19 @@
 # https://opensource.org/licenses/mit-license.php
 
 import	pandas as pd
-import	fitparse
+import	fitnumpy
 
+DECODERS	= [ "numpy", "fitparse" ]
 
-def get_workout( file_name ):
+
+def get_workout( file_name, decoder = "numpy", columns = None ):
+	# "columns" limits the "record" fields to be kept in DataFrame (all fields if None)
+
+	if decoder == "numpy":
+		return fitnumpy.get_workout( file_name, columns = columns )
+	
+	import	fitparse	# imported only for this decoder
+	
 	workout	= []
 	units	= {}
 	
@@ -25,6 +35,8 @@ def get_workout( file_name ):
 	for record in fitfile.get_messages( "record" ):
 		r	= {}
 		for record_data in record:
+			if columns is not None and record_data.name not in columns:
+				continue
 			r[ record_data.name ]	= record_data.value
 			if record_data.units:
 				units[ record_data.name ]	= record_data.units
@@ -38,6 +50,8 @@ def get_workout( file_name ):
 			if session_data.units:
 				units[ session_data.name ]	= session_data.units
 	
+	session[ "laps" ]	= [ { d.name: d.value for d in lap if d.name in fitnumpy.LAP_FIELDS and d.value is not None } for lap in fitfile.get_messages( "lap" ) ]
+	
 	return pd.DataFrame( workout ), session, units
 
 import	sys
@@ -47,7 +61,7 @@ def main():
 		print( "error: no files given" )
 		sys.exit( 1 )
 		
-	df, session, units	= get_workout( sys.argv[ 1 ] )
+	df, session, units	= get_workout( sys.argv[ 1 ], decoder = sys.argv[ 2 ] if len( sys.argv ) > 2 else "numpy" )
 	
 	output_filename	= "_df_" + "_".join( sys.argv ) + ".csv"
 	df.to_csv( output_filename )
@@ -2,6 +2,7 @@
 
 # utility routines for fitpandas
 # Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.8 17-October-2026
 # Version 0.7 16-March-2021
 
 # Copyright (c) 2021 Tedd OKANO
@@ -9,13 +10,22 @@
 # https://opensource.org/licenses/mit-license.php
 
 import	numpy as np
+import	functools
+import	os
+import	json
+from	stagetiming import stage
+import	smoothing
 from datetime import timedelta
-from geopy.geocoders import Nominatim
-from geopy.distance import great_circle
 
 K				= 40075.016686
 OVERSIZE_RATIO	= 1.1
 
+GEOCODE_CACHE	= os.path.join( os.path.expanduser( "~" ), ".cache", "run_coursemap", "geocode.json" )
+GEOCODE_DIGITS	= 4		# coordinates are rounded for geocoding memo (0.0001 degree = about 11m)
+
+_geocode_memo	= None
+_geolocator		= None
+
 CHAR_BICYCLIST	= chr( 0x1F6B4 )
 CHAR_RUNNER		= chr( 0x1F3C3 )
 CHAR_PEDESTRIAN	= chr( 0x1F6B6 )
@@ -75,7 +85,8 @@ def second2HMS( s ):
     
 
 def limit_values( data, args ):	
-	limit_values	= attributes( data )
+	with stage( "attributes" ):
+		limit_values	= attributes( data )
 
 	if not args.negative_alt:
 		bottom	= limit_values[ "bottom" ]
@@ -99,40 +110,8 @@ def limit_values( data, args ):
 		##### spacial filtering
 		#####
 		
-		am_size	= 300	# altitude map grid resolution
-		olr		= 2		# overlapping range
-		span_d	= limit_values[ "span_deg" ]
-		s_deg	= limit_values[ "s_deg" ]
-		w_deg	= limit_values[ "w_deg" ]
-		Rcv		= limit_values[ "Rcv" ]
-
-		altmap	= [ [ [] for j in range( am_size + olr * 2 ) ] for i in range( am_size + olr * 2 ) ]
-		
-		for i in range( len( data ) ):
-			lat, long, alt	= data.iloc[ i ][ "position_lat" ], data.iloc[ i ][ "position_long" ], data.iloc[ i ][ "altitude" ]
-			y	= int( (lat  - s_deg) * Rcv / span_d * (am_size - 1) )
-			x	= int( (long - w_deg)       / span_d * (am_size - 1) )	
-			for p in range( olr * 2 + 1 ):	
-				for q in range( olr * 2 + 1 ):	
-					altmap[ x + p ][ y + q ].append( alt )
-			
-		for p in range( am_size ):
-			for q in range( am_size ):
-				x	= p + olr
-				y	= q + olr
-				if altmap[ x ][ y ] != 0:
-					t	= altmap[ x ][ y ]
-					if 0 == len( t ):
-						altmap[ x ][ y ]	= None
-					else:
-						altmap[ x ][ y ]	= sum( t )/len( t )
-
-		z	= []
-		for i in range( len( data ) ):
-			lat, long	= data.iloc[ i ][ "position_lat" ], data.iloc[ i ][ "position_long" ]
-			y	= int( (lat  - s_deg) * Rcv / span_d * (am_size - 1) ) + olr
-			x	= int( (long - w_deg)       / span_d * (am_size - 1) ) + olr
-			z.append( altmap[ x ][ y ] )
+		with stage( "spatial_average" ):
+			z	= spatial_average( data[ "position_lat" ].to_numpy(), data[ "position_long" ].to_numpy(), data[ "altitude" ].to_numpy(), limit_values, args.am_size, args.olr )
 	else:
 		z	= data[ "altitude" ]
 	
@@ -149,13 +128,45 @@ def limit_values( data, args ):
 	return limit_values
 
 
+def spatial_average( lat, long, alt, lv, am_size = 300, olr = 2 ):
+	#####
+	##### altitude of each point is replaced by average of points in neighbor grid cells
+	##### altitude map: "am_size" x "am_size" grid over the course, overlapping range: +/-"olr" cells
+	#####
+	span_d	= lv[ "span_deg" ]
+	
+	y	= ((lat  - lv[ "s_deg" ]) * lv[ "Rcv" ] / span_d * (am_size - 1)).astype( np.int64 )
+	x	= ((long - lv[ "w_deg" ])               / span_d * (am_size - 1)).astype( np.int64 )
+	
+	#####
+	##### sum and count in each cell, then summing up neighbors by summed-area table
+	#####
+	size	= am_size + olr * 2 + 1
+	cell	= (x + olr + 1) * size + (y + olr + 1)
+	s_map	= np.bincount( cell, weights = alt, minlength = size * size ).reshape( size, size )
+	n_map	= np.bincount( cell,                minlength = size * size ).reshape( size, size )
+	
+	s_map	= s_map.cumsum( axis = 0 ).cumsum( axis = 1 )
+	n_map	= n_map.cumsum( axis = 0 ).cumsum( axis = 1 )
+	
+	x0, x1	= x, x + olr * 2 + 1
+	y0, y1	= y, y + olr * 2 + 1
+	
+	s	= s_map[ x1, y1 ] - s_map[ x0, y1 ] - s_map[ x1, y0 ] + s_map[ x0, y0 ]
+	n	= n_map[ x1, y1 ] - n_map[ x0, y1 ] - n_map[ x1, y0 ] + n_map[ x0, y0 ]
+	
+	return s / n
+
+
 def attributes( data ):	
-	stat	= data.describe()
+	lat		= data[ "position_lat"  ].to_numpy()
+	long	= data[ "position_long" ].to_numpy()
+	alt		= data[ "altitude"      ].to_numpy()
 	
-	s_deg, n_deg	= stat[ "position_lat"  ][ "min" ], stat[ "position_lat"  ][ "max" ]
-	w_deg, e_deg	= stat[ "position_long" ][ "min" ], stat[ "position_long" ][ "max" ]
-	v_start_deg	= data.iloc[ 0 ][ "position_lat"  ]
-	h_start_deg	= data.iloc[ 0 ][ "position_long" ]
+	s_deg, n_deg	= lat.min(),  lat.max()
+	w_deg, e_deg	= long.min(), long.max()
+	v_start_deg	= lat[  0 ]
+	h_start_deg	= long[ 0 ]
  
 	v_span_deg	= n_deg - s_deg
 	h_span_deg	= e_deg - w_deg
@@ -195,60 +206,143 @@ def attributes( data ):
 		"south"		:	v_cntr - vh_span_half,
 		"east"		:	h_cntr + vh_span_half,
 		"west"		:	h_cntr - vh_span_half,
-		"bottom"	:	stat[ "altitude" ][ "min" ],
-		"top"		:	stat[ "altitude" ][ "max" ],
+		"bottom"	:	alt.min(),
+		"top"		:	alt.max(),
 		"v_cntr"	:	v_cntr,
 		"h_cntr"	:	h_cntr,
 		"vh_span" 	:	vh_span,
 		"Rcv"		:	Rcv,
 		"Cv"		:	Cv,
 		"Ch"		:	Ch,
-		"start"		:	data.iloc[  0 ][ "distance" ],
-		"fin"		:	data.iloc[ -1 ][ "distance" ]
+		"start"		:	data[ "distance" ].iat[  0 ],
+		"fin"		:	data[ "distance" ].iat[ -1 ],
+		"start_lat"	:	v_start_deg,
+		"start_long":	h_start_deg
 	}
 	
-	data[ "lat_km"  ]	= data[ "position_lat"  ].apply( lambda y: Cv * (y - data[ "position_lat"  ][ 0 ]) )
-	data[ "long_km" ]	= data[ "position_long" ].apply( lambda x: Ch * (x - data[ "position_long" ][ 0 ]) )
-	data[ "DIST"    ]	= data.apply( lambda x: ( ( x[ "lat_km" ] ** 2 ) + ( x[ "long_km" ] ** 2 ) ) ** 0.5, axis = 1 )
-
-#	print( data[ "lat_km"  ] )
-#	print( data[ "long_km"  ] )
+	lat_km, long_km		= km_projection( lat, long, attr )
+	data[ "lat_km"  ]	= lat_km
+	data[ "long_km" ]	= long_km
+	data[ "DIST"    ]	= np.hypot( lat_km, long_km )
 
-	# data.apply( lambda x: print( "{}, {}".format( x[ "distance" ], x[ "DIST" ] ) ), axis = 1 )
-	i	= data[ "DIST" ].idxmax()
-	attr[ "farthest_lat"  ]	= data[ "position_lat"  ][ i ]
-	attr[ "farthest_long" ]	= data[ "position_long" ][ i ]
-	attr[ "start_lat"     ]	= data.iloc[  0 ][ "position_lat"  ]
-	attr[ "start_long"    ]	= data.iloc[  0 ][ "position_long" ]
+	i	= np.argmax( data[ "DIST" ].to_numpy() )
+	attr[ "farthest_lat"  ]	= lat[  i ]
+	attr[ "farthest_long" ]	= long[ i ]
 
 	return attr
 
 
+def lttb( points, n ):
+	#####
+	##### Largest-Triangle-Three-Buckets downsampling: indices of "n" points keeping the shape of line
+	##### "points" is (N, 3) array. points are divided into n - 2 buckets and the point making largest
+	##### triangle with averages of previous and next buckets is selected. first and last points are always kept
+	##### (original LTTB uses the point selected in previous bucket. average is used here to process all buckets at once)
+	#####
+	#####	reference: https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+	#####
+	N	= len( points )
+	if N <= n or n < 3:
+		return np.arange( N )
+	
+	edges	= np.linspace( 1, N - 1, n - 1 ).astype( np.int64 )	# n - 2 buckets between first and last. none is empty as N > n
+	starts	= edges[ :-1 ]
+	counts	= np.diff( edges )
+	bucket	= np.repeat( np.arange( n - 2 ), counts )				# bucket of points[ 1 : N - 1 ]
+	inner	= points[ 1 : N - 1 ]
+	
+	mean	= np.add.reduceat( inner, starts - 1, axis = 0 ) / counts[ :, None ]
+	a		= np.vstack( ( points[ :1 ], mean[ :-1 ] ) )			# previous bucket (first point for first bucket)
+	c		= np.vstack( ( mean[ 1: ], points[ -1: ] ) )			# next bucket (last point for last bucket)
+	
+	area	= np.linalg.norm( np.cross( inner - a[ bucket ], (c - a)[ bucket ] ), axis = 1 )
+	area	= np.nan_to_num( area, nan = -1.0 )
+	
+	#####
+	##### first point of largest area in each bucket
+	#####
+	largest	= np.flatnonzero( area == np.maximum.reduceat( area, starts - 1 )[ bucket ] )
+	first	= largest[ np.unique( bucket[ largest ], return_index = True )[ 1 ] ]
+	
+	return np.concatenate( ( [ 0 ], first + 1, [ N - 1 ] ) )
+
+
+def km_projection( lat, long, lv ):
+	#####
+	##### degree to km on plot plane. origin is the start point 
+	##### "lv" is the dict given by attributes()
+	#####
+	return lv[ "Cv" ] * (lat - lv[ "start_lat" ]), lv[ "Ch" ] * (long - lv[ "start_long" ])
+
+
+def deg_projection( lat_km, long_km, lv ):
+	#####
+	##### km on plot plane to degree (inverse of km_projection())
+	#####
+	return lat_km / lv[ "Cv" ] + lv[ "start_lat" ], long_km / lv[ "Ch" ] + lv[ "start_long" ]
+
+
 def p2p_distance( lat0, long0, lat1, long1 ):
+	from geopy.distance import great_circle
 	return ( great_circle( (lat0, long0), (lat1, long1) ).meters )
 
 
 def filtering( z, len ):
-	len_half	= len // 2
-	coeff		= [ 0.5 * (np.cos( x ) + 1.0) for x in np.linspace( -np.pi, np.pi, len) ]	
-	coeff		= [ x / sum( coeff ) for x in coeff ]
-
-	z	= np.append( np.full( len_half, z[  0 ] ), z )
-	z	= np.append( z, np.full( len_half, z[ -1 ] ) )
-	z	= np.convolve( z, coeff, mode = 'same' )[ len_half : -len_half ]
-	
-	return z
+	# Hann window filter, edges are padded by end values
+	return smoothing.smooth( z, len, pad = "edge" )
 
 
-def city_name_list( data ):
+def city_name_list( data, gazetteer = None ):
 	d	= data[:: len( data.index ) // 5 ]
 	
-	cities	= d.apply( lambda x: get_city_name( x[ "position_lat" ], x[ "position_long" ] ), axis = 1 )
+	cities	= d.apply( lambda x: get_city_name( x[ "position_lat" ], x[ "position_long" ], gazetteer ), axis = 1 )
 	
 	return cities
 
 
-def get_city_name( lat, long ):
+def get_city_name( lat, long, gazetteer = None ):
+	#####
+	##### offline: nearest place in "gazetteer" (gazetteer.Gazetteer)
+	##### online:  Nominatim reverse geocoding. results are kept in GEOCODE_CACHE file
+	#####
+	if gazetteer is not None:
+		return gazetteer.nearest( lat, long )
+	
+	memo	= geocode_memo()
+	key		= "{:.{}f},{:.{}f}".format( lat, GEOCODE_DIGITS, long, GEOCODE_DIGITS )
+	
+	if key not in memo:
+		memo[ key ]	= get_city_name_online( lat, long )
+		save_geocode_memo()
+	
+	return memo[ key ]
+
+
+def geocode_memo():
+	global _geocode_memo
+	
+	if _geocode_memo is None:
+		try:
+			with open( GEOCODE_CACHE, encoding = "utf-8" ) as f:
+				_geocode_memo	= json.load( f )
+		except ( OSError, ValueError ):
+			_geocode_memo	= {}
+	
+	return _geocode_memo
+
+
+def save_geocode_memo():
+	try:
+		os.makedirs( os.path.dirname( GEOCODE_CACHE ), exist_ok = True )
+		tmp	= GEOCODE_CACHE + ".tmp"
+		with open( tmp, "w", encoding = "utf-8" ) as f:
+			json.dump( _geocode_memo, f, ensure_ascii = False )
+		os.replace( tmp, GEOCODE_CACHE )
+	except OSError:
+		pass	# memo is just for speed
+
+
+def get_city_name_online( lat, long ):
 	ctv	= [
 		[ "tourism", "islet", "borough" ],	# "quarter" had been removed
 		[ "island", "suburb", "village", "town", "city" ]
@@ -275,19 +369,30 @@ def get_city_name( lat, long ):
 
 	
 def reverse_geocoding( lat, long ):
-	geolocator = Nominatim(user_agent="run_coursemap.py")
-	return geolocator.reverse( "{}, {}".format( lat, long ), language = "en" )
+	global _geolocator
+	
+	if _geolocator is None:
+		from geopy.geocoders import Nominatim		# imported only when online geocoding is needed
+		_geolocator	= Nominatim(user_agent="run_coursemap.py")
+	return _geolocator.reverse( "{}, {}".format( lat, long ), language = "en" )
 
 
-def color_map( length ):
+@functools.lru_cache( maxsize = None )
+def color_map( length, reverse = False ):
+	#####
+	##### palette of blue-green-red as ("length", 4) RGBA array. cached and read-only
+	#####
 	cycle	= np.pi
 	n	= np.linspace( 0, cycle, length )
 	
-	cm	= []
-	for i in n:
-		r	= (np.cos( i + cycle ) * 0.5 + 0.5) ** 2
-		g	= (np.sin( i )) ** 2
-		b	= (np.cos( i ) * 0.5 + 0.5) ** 2
-		cm.append( [ r, g, b ] )
+	cm	= np.empty( ( length, 4 ) )
+	cm[ :, 0 ]	= (np.cos( n + cycle ) * 0.5 + 0.5) ** 2
+	cm[ :, 1 ]	= (np.sin( n )) ** 2
+	cm[ :, 2 ]	= (np.cos( n ) * 0.5 + 0.5) ** 2
+	cm[ :, 3 ]	= 1.0
+	
+	if reverse:
+		cm	= cm[ ::-1 ].copy()
 	
+	cm.flags.writeable	= False
 	return cm
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# offline reverse geocoding by local place name file
+#
+#	place name file:
+#		GeoNames dump (i.e. "cities1000.txt"), tab separated: id, name, asciiname, alternatenames, latitude, longitude, ...
+#		or simple tab/comma separated file: name, latitude, longitude
+#	grid index is built on first use and saved next to the file as "<file>.npz"
+#
+#	reference: https://download.geonames.org/export/dump/
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	numpy as np
+import	os
+import	sys
+
+CELL_DEG	= 0.5	# grid cell size in degree
+INDEX_VERSION	= 1
+
+
+def read_places( file_name ):
+	names, lats, longs	= [], [], []
+
+	with open( file_name, encoding = "utf-8" ) as f:
+		for line in f:
+			line	= line.rstrip( "\n" )
+			if not line or line.startswith( "#" ):
+				continue
+
+			c	= line.split( "\t" )
+			if len( c ) < 3:
+				c	= line.split( "," )
+
+			try:
+				if 6 <= len( c ):		# GeoNames
+					name, lat, long	= c[ 1 ], float( c[ 4 ] ), float( c[ 5 ] )
+				else:
+					name, lat, long	= c[ 0 ], float( c[ 1 ] ), float( c[ 2 ] )
+			except ( ValueError, IndexError ):
+				continue	# header line or broken line
+
+			names.append( name )
+			lats.append( lat )
+			longs.append( long )
+
+	return names, np.array( lats ), np.array( longs )
+
+
+class Gazetteer:
+	def __init__( self, file_name, cell = CELL_DEG ):
+		self.cell	= cell
+		self.cols	= int( np.ceil( 360 / cell ) )
+		self.rows	= int( np.ceil( 180 / cell ) ) + 1
+		index		= file_name + ".npz"
+
+		if os.path.isfile( index ) and os.path.getmtime( file_name ) <= os.path.getmtime( index ):
+			with np.load( index ) as z:
+				if int( z[ "version" ] ) == INDEX_VERSION and float( z[ "cell" ] ) == cell:
+					self.load( z )
+					return
+
+		self.build( *read_places( file_name ) )
+		try:
+			np.savez( index, version = INDEX_VERSION, cell = cell, keys = self.keys, lat = self.lat, long = self.long, names = self.names )
+		except OSError:
+			pass	# index is just for speed
+
+	def load( self, z ):
+		self.keys			= z[ "keys" ]
+		self.lat, self.long	= z[ "lat" ], z[ "long" ]
+		self.names			= z[ "names" ]
+
+	def cell_of( self, lat, long ):
+		return np.floor( (lat + 90) / self.cell ).astype( np.int64 ), np.floor( (long + 180) / self.cell ).astype( np.int64 ) % self.cols
+
+	def build( self, names, lat, long ):
+		#####
+		##### places sorted by grid cell key ( row * cols + column ).
+		##### cells in a row are contiguous in this order, so a row of a search square is a slice
+		#####
+		cy, cx	= self.cell_of( lat, long )
+		key		= cy * self.cols + cx
+		order	= np.argsort( key, kind = "stable" )
+
+		self.keys	= key[ order ]
+		self.lat	= lat[ order ]
+		self.long	= long[ order ]
+		self.names	= np.array( names, dtype = str )[ order ] if names else np.zeros( 0, dtype = str )
+
+	def candidates( self, cy, cx, r ):
+		# indices of places in the cells of square ( cy +/- r, cx +/- r )
+		y	= np.arange( max( cy - r, 0 ), min( cy + r, self.rows - 1 ) + 1 )
+		x0, x1	= cx - r, cx + r
+
+		if self.cols <= x1 - x0 + 1:		# whole rows
+			lo, hi	= [ y * self.cols ], [ y * self.cols + self.cols - 1 ]
+		elif x0 < 0 or self.cols <= x1:		# wrapping around at 180 degree
+			lo	= [ y * self.cols + x0 % self.cols, y * self.cols ]
+			hi	= [ y * self.cols + self.cols - 1,  y * self.cols + x1 % self.cols ]
+		else:
+			lo, hi	= [ y * self.cols + x0 ], [ y * self.cols + x1 ]
+
+		start	= np.searchsorted( self.keys, np.concatenate( lo ), side = "left"  )
+		end		= np.searchsorted( self.keys, np.concatenate( hi ), side = "right" )
+
+		return np.concatenate( [ np.arange( s, e ) for s, e in zip( start, end ) if s < e ] or [ np.zeros( 0, dtype = np.int64 ) ] )
+
+	def nearest( self, lat, long ):
+		#####
+		##### name of the nearest place. search square is doubled until no nearer place can be outside
+		#####
+		if not len( self.keys ):
+			return ""
+
+		cy, cx	= self.cell_of( lat, long )
+		scale	= max( np.cos( np.radians( lat ) ), 1e-6 )
+		r		= 0
+
+		while True:
+			idx	= self.candidates( cy, cx, r )
+			if len( idx ):
+				dlong	= (self.long[ idx ] - long + 180) % 360 - 180
+				d		= (self.lat[ idx ] - lat) ** 2 + (dlong * scale) ** 2
+				i		= np.argmin( d )
+
+				if d[ i ] <= (r * self.cell * scale) ** 2 or len( idx ) == len( self.keys ):
+					return str( self.names[ idx[ i ] ] )
+
+			r	= r * 2 if r else 1
+
+
+def main():
+	if len( sys.argv ) < 4:
+		print( "usage: gazetteer.py place_name_file latitude longitude" )
+		sys.exit( 1 )
+
+	g	= Gazetteer( sys.argv[ 1 ] )
+	print( g.nearest( float( sys.argv[ 2 ] ), float( sys.argv[ 3 ] ) ) )
+
+
+if __name__ == "__main__":
+	main()
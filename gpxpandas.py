@@ -1,53 +1,153 @@
 #!/usr/bin/env python3
 
-# .gpx file read interface based on fitparse
+# .gpx file read interface
+#
+#	points of all tracks and segments are read in one pass into arrays.
+#	distance and speed are calculated by vectorized haversine formula.
+#	heart rate, cadence, power and temperature are read from extensions (i.e. Garmin TrackPointExtension)
+#
+#	readers:
+#		stream : streaming XML parser (gpxstream) with bounded memory
+#		gpxpy  : document is loaded into gpxpy object model
 #
 #	reference: https://ocefpaf.github.io/python4oceanographers/blog/2014/08/18/gpx/
+#	reference: https://www.topografix.com/GPX/1/1/
 #
 # Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.3 17-October-2026   # streaming reader (gpxstream) added
+# Version 0.2 17-October-2026
 # Version 0.1 27-February-2021
 
 import	pandas as pd
-import	gpxpy
-import	gpxpy.gpx
+import	datetime
+import	gpxstream
+from	gpxstream import EXTENSIONS, extension_values
 
 import	numpy as np
 
+READERS			= [ "stream", "gpxpy" ]
+EARTH_RADIUS	= 6371008.8		# mean radius in meter
+
+
+def get_course( file_name, reader = "stream", columns = None ):
+	# "columns" limits the columns to be kept in DataFrame (all columns if None)
+
+	ext_names	= [ k for k, c in EXTENSIONS.items() if columns is None or c in columns ]
+
+	if reader == "stream":
+		cols, seg	= gpxstream.read_points( file_name, ext_names )
+		return course_frame( cols, seg, columns )
+
+	import	gpxpy
+
+	with open( file_name, "r" ) as f:
+		gpx	= gpxpy.parse( f )
+
+	lat, long, ele, time, seg	= [], [], [], [], []
+	ext			= { k: [] for k in ext_names }
+
+	for track in gpx.tracks:
+		for segment in track.segments:
+			seg.append( len( lat ) )
+			for p in segment.points:
+				lat.append( p.latitude )
+				long.append( p.longitude )
+				ele.append( p.elevation )
+				time.append( utc( p.time ).timestamp() if p.time else np.nan )
+
+				if ext_names:
+					values	= extension_values( p.extensions )
+					for k in ext_names:
+						ext[ k ].append( values.get( k, np.nan ) )
+
+	cols	= {
+		"position_lat":		np.array( lat,  dtype = np.float64 ),
+		"position_long":	np.array( long, dtype = np.float64 ),
+		"altitude":			np.array( ele,  dtype = np.float64 ),	# None to NaN
+		"time":				np.array( time, dtype = np.float64 ),
+	}
+	cols.update( { EXTENSIONS[ k ]: np.array( v, dtype = np.float64 ) for k, v in ext.items() } )
+
+	return course_frame( cols, np.array( seg, dtype = np.int64 ), columns )
+
+
+def utc( t ):
+	# time without timezone is taken as UTC (as gpxstream.unix_time())
+	return t if t.tzinfo else t.replace( tzinfo = datetime.timezone.utc )
 
-def get_course( file_name ):
-	gpx_file = open( file_name, "r" )
-	gpx = gpxpy.parse( gpx_file )
 
-	course_list = []
-		
-	gpx		= gpxpy.parse( open( file_name ) )
-	track	= gpx.tracks[0]
-	segment = track.segments[0]
-	dist	= 0
+def haversine( lat0, long0, lat1, long1 ):
+	# distance in meter between points (arrays in degree)
+	lat0, long0, lat1, long1	= map( np.radians, ( lat0, long0, lat1, long1 ) )
+	a	= np.sin( (lat1 - lat0) / 2 ) ** 2 + np.cos( lat0 ) * np.cos( lat1 ) * np.sin( (long1 - long0) / 2 ) ** 2
+	return 2 * EARTH_RADIUS * np.arcsin( np.sqrt( a ) )
 
-	for point_idx, point in enumerate( segment.points ):
-		speed	 = segment.get_speed( point_idx )
-		dist	+= speed
-		course_list.append( [ point.latitude, point.longitude, point.elevation, point.time, speed, dist] )
 
-	columns = [ "position_lat", "position_long", "altitude", "timestamp", "speed", "distance" ]
-	course	= pd.DataFrame( course_list, columns = columns )
-	stat	= course.describe()
-	
+def course_frame( cols, seg_start, columns = None ):
+	#####
+	##### DataFrame and session from column arrays. "cols" has "position_lat", "position_long", "altitude",
+	##### "time" (UNIX time, NaN if not given) and extension columns. "seg_start" is index of first point of each segment.
+	##### distance is not added between segments (gap of recording)
+	#####
+	lat, long	= cols[ "position_lat" ], cols[ "position_long" ]
+	n			= len( lat )
+
+	if n == 0:
+		raise ValueError( "no track points in .gpx file" )
+
+	first			= np.zeros( n, dtype = bool )
+	first[ seg_start[ seg_start < n ] ]	= True
+	first[ 0 ]		= True
+
+	step			= np.zeros( n )
+	step[ 1: ]		= haversine( lat[ :-1 ], long[ :-1 ], lat[ 1: ], long[ 1: ] )
+	step[ first ]	= 0
+	step			= np.nan_to_num( step )
+	dist			= np.cumsum( step )
+
+	#####
+	##### speed by central difference in each segment (one-sided at the ends of segment)
+	#####
+	t		= cols[ "time" ]
+	i		= np.arange( n )
+	last	= np.append( first[ 1: ], True )
+	prev	= np.where( first, i, i - 1 )
+	next	= np.where( last,  i, i + 1 )
+	dt		= t[ next ] - t[ prev ]
+
+	with np.errstate( invalid = "ignore", divide = "ignore" ):
+		speed	= np.where( 0 < dt, (dist[ next ] - dist[ prev ]) / dt, np.nan )
+
+	course	= pd.DataFrame( {
+		"position_lat":		lat,
+		"position_long":	long,
+		"altitude":			cols[ "altitude" ],
+		"timestamp":		pd.to_datetime( t, unit = "s", utc = True ),
+		"speed":			speed,
+		"distance":			dist,
+	} )
+
+	for c, v in cols.items():
+		if c not in course.columns and c != "time" and not np.isnan( v ).all():
+			course[ c ]	= v
+
+	ts		= course[ "timestamp" ].dropna()
+
 	session	= {}
-	session[ "nec_lat"   ] 	= stat[ "position_lat"  ][ "max" ]
-	session[ "swc_lat"   ]	= stat[ "position_lat"  ][ "min" ]
-	session[ "nec_long"  ]	= stat[ "position_long" ][ "max" ]
-	session[ "swc_long"  ]	= stat[ "position_long" ][ "min" ]
-	session[ "start_time" ]	= course.iloc[ 0 ][ "timestamp" ]
-	session[ "total_timer_time" ]	= course.iloc[ -1 ][ "timestamp" ] - course.iloc[ 0 ][ "timestamp" ]
-	session[ "total_distance" ]	= course.iloc[ -1 ][ "distance" ]
+	session[ "nec_lat"   ] 	= np.nanmax( lat )
+	session[ "swc_lat"   ]	= np.nanmin( lat )
+	session[ "nec_long"  ]	= np.nanmax( long )
+	session[ "swc_long"  ]	= np.nanmin( long )
+	session[ "start_time" ]	= ts.iloc[ 0 ] if len( ts ) else None
+	session[ "total_timer_time" ]	= ts.iloc[ -1 ] - ts.iloc[ 0 ] if len( ts ) else pd.Timedelta( 0 )
+	session[ "total_distance" ]	= dist[ -1 ]
 	session[ "sport" ]		= "NA (\".gpx\" data)"
-	session[ "avg_speed" ]	=  stat[ "speed" ][ "mean" ]
+	session[ "avg_speed" ]	= np.nanmean( speed ) if np.isfinite( speed ).any() else np.nan
 
 	units	= {}
 
-	print( course )
+	if columns is not None:
+		course	= course[ [ c for c in course.columns if c in columns ] ]
 
 	return course, session, units
 
@@ -58,20 +158,21 @@ def main():
 	if len( sys.argv ) < 2:
 		print( "error: no files given" )
 		sys.exit( 1 )
-		
+
 	file_name	= sys.argv[ 1 ]
+	reader		= sys.argv[ 2 ] if 2 < len( sys.argv ) else "stream"
+
+	df, session, units	= get_course( file_name, reader )
 
-	df, session, units	= get_gpx( file_name )
 
-	
 	output_filename	= "_df_" + "_".join( sys.argv ) + ".csv"
 	df.to_csv( output_filename )
 	print( '\n---- data written into file: "{}"'.format( output_filename ) )
-	
+
 	print( "\n---- list of 'session' and 'units' data" )
 	for k in sorted( set( [*session] + [*units] ) ):
 		print( "{:<30}{:>30}{:>15}".format( k, str( session.get( k, "---" ) ), str( units.get( k, "---" ) ) ) )
-		
+
 	print( "\n---- 'DataFrame' data" )
 	print( df )
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# streaming .gpx reader
+#
+#	track points are read by incremental XML parsing (iterparse). elements are discarded just after
+#	reading and values are stored into preallocated column arrays, so memory is bounded by the arrays
+#	(about 40 bytes/point) regardless of XML document size.
+#	time strings are converted to UNIX time in batches.
+#
+#	reference: https://www.topografix.com/GPX/1/1/
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	numpy as np
+import	pandas as pd
+import	xml.etree.ElementTree as ET
+
+# local name of extension element: column name
+EXTENSIONS	= { "hr": "heart_rate", "cad": "cadence", "power": "power", "atemp": "temperature" }
+
+EPOCH		= pd.Timestamp( 0, tz = "UTC" )
+
+
+class Columns:
+	#####
+	##### float64 column arrays. capacity is doubled when full
+	#####
+	def __init__( self, names, capacity = 4096 ):
+		self.names	= names
+		self.arr	= { k: np.empty( capacity ) for k in names }
+		self.n		= 0
+
+	def append( self, name, start, values ):
+		a	= self.arr[ name ]
+		end	= start + len( values )
+		if len( a ) < end:
+			self.arr	= { k: np.resize( v, max( end, len( v ) * 2 ) ) for k, v in self.arr.items() }
+		self.arr[ name ][ start:end ]	= values
+
+	def result( self ):
+		return { k: v[ :self.n ] for k, v in self.arr.items() }
+
+
+class LocalNames( dict ):
+	# "{namespace}name" to "name", memorized
+	def __missing__( self, tag ):
+		self[ tag ]	= tag.rsplit( "}", 1 )[ -1 ]
+		return self[ tag ]
+
+
+local_name	= LocalNames()
+
+
+def extension_values( extensions ):
+	# { local name: value } of known elements in extensions
+	values	= {}
+	for element in extensions:
+		for e in element.iter():
+			name	= local_name[ e.tag ]
+			if name in EXTENSIONS and e.text:
+				try:
+					values[ name ]	= float( e.text )
+				except ValueError:
+					pass
+	return values
+
+
+def unix_time( strings ):
+	# ISO 8601 time strings (None if not given) to UNIX time in float (NaN if not given)
+	# time without timezone is taken as UTC ("utc = True" localizes it to UTC, not to local time)
+	t	= pd.to_datetime( pd.Series( strings, dtype = object ), utc = True, format = "ISO8601" )
+	return ((t - EPOCH) / pd.Timedelta( seconds = 1 )).to_numpy( dtype = np.float64, na_value = np.nan )
+
+
+def read_points( file_name, ext_names = EXTENSIONS.keys(), batch = 4096 ):
+	#####
+	##### returns ( columns, segment_start ) as gpxpandas.course_frame() takes
+	##### "ext_names" is local names of extension elements to be read
+	#####
+	ext_names	= list( ext_names )
+	cols		= Columns( [ "position_lat", "position_long", "altitude", "time" ] + [ EXTENSIONS[ k ] for k in ext_names ], batch )
+	seg_start	= []
+	stack		= []
+	rows		= []	# ( lat, long, ele, extension values.. ) of current batch
+	times		= []
+
+	def flush():
+		if not rows:
+			return
+		start	= cols.n
+		values	= np.array( rows, dtype = np.float64 ).reshape( len( rows ), -1 )
+		for i, name in enumerate( [ "position_lat", "position_long", "altitude" ] + [ EXTENSIONS[ k ] for k in ext_names ] ):
+			cols.append( name, start, values[ :, i ] )
+		cols.append( "time", start, unix_time( times ) )
+		cols.n	+= len( rows )
+		rows.clear()
+		times.clear()
+
+	for event, e in ET.iterparse( file_name, events = ( "start", "end" ) ):
+		if event == "start":
+			stack.append( e )
+			if local_name[ e.tag ] == "trkseg":
+				seg_start.append( cols.n + len( rows ) )
+			continue
+
+		stack.pop()
+		tag	= local_name[ e.tag ]
+
+		if tag == "trkpt":
+			ele, time, ext	= np.nan, None, {}
+			for c in e:
+				name	= local_name[ c.tag ]
+				if name == "ele" and c.text:
+					ele		= float( c.text )
+				elif name == "time" and c.text:
+					time	= c.text.strip()
+				elif name == "extensions" and ext_names:
+					ext		= extension_values( c )
+
+			rows.append( [ float( e.get( "lat" ) ), float( e.get( "lon" ) ), ele ] + [ ext.get( k, np.nan ) for k in ext_names ] )
+			times.append( time )
+
+			if batch <= len( rows ):
+				flush()
+
+		if tag == "trkpt" or len( stack ) == 1:		# track points and children of <gpx> are discarded after reading
+			stack[ -1 ].remove( e )
+
+	flush()
+
+	return cols.result(), np.array( seg_start, dtype = np.int64 )
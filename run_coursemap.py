@@ -6,8 +6,21 @@
 # plotting 3D course from .fit or .gpx file
 # 
 # usage:  run_coursemap.py data.fit
+#         run_coursemap.py -o -j 4 --report report.csv data_dir/ "*.gpx"    (batch)
 #
 # Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.41 17-October-2026  # colorbars drawn as one line collection
+# Version 0.40 17-October-2026  # lap, split and summit markers by "--lap_markers"
+# Version 0.35 17-October-2026  # streaming .gpx reader
+# Version 0.34 17-October-2026  # shape preserving reduction of plotted points by "--max_points"
+# Version 0.32 17-October-2026  # stage timings and profiling options
+# Version 0.31 17-October-2026  # lazy imports and automatic "Agg" backend for fast startup
+# Version 0.30 17-October-2026  # plotting moved into "coursemap" library. this is command line interface of it
+# Version 0.29 17-October-2026  # batch mode
+# Version 0.28 17-October-2026  # animation rendered in parallel processes
+# Version 0.27 17-October-2026  # map tile cache and offline tile sources
+# Version 0.26 17-October-2026  # parsed data cache
+# Version 0.25 17-October-2026  # .fit file decoding by NumPy
 # Version 0.24 04-January-2022   # z-axis data can be changed
 # Version 0.23 25-December-2021  # colorbar option switch added / "heart_rate" added for color_key
 # Version 0.22 24-December-2021  # color bar added
@@ -19,88 +32,74 @@
 # Released under the MIT license
 # https://opensource.org/licenses/mit-license.php
 
-import	fitpandas
-import	gpxpandas
-import	fitpandas_util as fu
-import	staticmaps
-import	matplotlib.pyplot as plt
-import	numpy as np
-import	os.path
 import	sys
-import	argparse
-import	datetime
-from	mpl_toolkits.mplot3d import Axes3D
-import	pytz
-from 	timezonefinder import TimezoneFinder
-import	subprocess
-import	pickle
-import	pandas as pd
-import	re
-
 import	time
 
+if any( a.startswith( "--startup" ) for a in sys.argv ):	# installed before other imports to measure them
+	import	startupprofile
+	startupprofile.install()
 
-FOOTNOTE		= "plotted by 'run_coursemap'\nhttps://github.com/teddokano/run_coursemap"
-OSM_CREDIT		= "Maps & data © OpenStreetMap contributors"
-K				= 40075.016686
-OVERSIZE_RATIO	= 1.1
-MAP_RESOLUTION	= { "low": 256, "mid": 512, "high": 1024, "off": "" }
-
-REQUIRED_DATA_COLUMNS	= [ 	
-	"distance", 
-	"altitude", 
-	"position_long", 
-	"position_lat"
-]
-
-COLORKEY	= { "distance": "km", "altitude": "m", "speed": "km/h", "power": "W", "heart_rate": "bpm" }
-
+import	coursemap
+from	coursemap import COLORKEY, MAP_RESOLUTION
+import	coursecache
+import	os.path
+import	argparse
+import	collections
+import	contextlib
+import	csv
+import	glob
+import	io
+import	multiprocessing
+import	pickle
+import	stagetiming
+from	stagetiming import stage
+import	cProfile
+import	pstats
+import	tracemalloc
 
-class ColorScale:
-	def __init__( self, series, smoothing = False, logscale = False ):
-		d	= series.copy()
+#	matplotlib.pyplot is imported after backend selection (in main())
+#	file readers, staticmaps and animation are imported where they are used
 
-		if logscale:
-			d	= np.log( d )
-			d.replace( float( "-inf" ), 0, inplace = True )
 
-		if smoothing:
-			WNDW_LEN	= 120
-			WINDOW		= [ 0.5 * (np.cos( z ) + 1.0)	for z in np.linspace( -np.pi, np.pi, WNDW_LEN) ]
-			WINDOW		= [ x / sum( WINDOW ) for x in WINDOW ]
 
-			s	= []
-			
-			padding	= [ 0 for x in range( len( WINDOW ) // 2 ) ]
-			s.extend( padding )
-			
-			s.extend( smooth( d, WINDOW ) )
-			
-			padding	= [ s[ -1 ] for x in range( len( WINDOW ) // 2 ) ]
-			s.extend( padding )
-			
-			self.series	= pd.Series( s )
-
-		else:
-			self.series	= d
+def main():
+	#####
+	##### processing with stage timings (and profilers if asked). screen output is done after that
+	#####
+	rec		= stagetiming.Recorder()
+	prof	= cProfile.Profile() if args.profile else None
+	
+	if args.tracemalloc:
+		tracemalloc.start()
+	
+	with rec:
+		if prof:	prof.enable()
+		try:
+			plt	= process()
+		finally:
+			if prof:	prof.disable()
+	
+	output_timings( rec, prof )
+	
+	if plt:
+		if not args.quiet: print( "output to screen..." )
+		plt.show()
 
-		self.min	= self.series.min()
-		self.max	= self.series.max()
-		self.fullscale	= self.max - self.min
-		self.series	-= self.min
-		self.series	/= self.fullscale
 
-	def ratio( self, count ):
-		return self.series[ count ]
+def process():
+	# returns pyplot module if the figure should be shown on screen
 
+	if args.startup_profile:
+		startupprofile.set_output( args.startup_profile )
+		startupprofile.mark( "main started" )
 
-def main():
 	file_name, file_ext = os.path.splitext( args.input_file )
 
 	print_v( "\"{}\" started".format( sys.argv[ 0 ] )  )
 	
 	file_suffix	= file_ext.lower()
 	output_filename	= "_".join( sys.argv )
+	opt				= coursemap.Options.from_args( args )
 
 	if args.verbose:	show_given_parameters( output_filename )
 
@@ -109,63 +108,27 @@ def main():
 	#####
 	if not args.quiet: print( "reading file: \"{}\"".format( args.input_file )  )
 
-	if ".fit" == file_suffix:
-		data, s_data, units	= fitpandas.get_workout( args.input_file )
-		
-		data[ "position_lat"  ]	= data[ "position_lat"  ].apply( fu.semicircles2dgree )
-		data[ "position_long" ]	= data[ "position_long" ].apply( fu.semicircles2dgree )
-		s_data[ "nec_lat"  ]	= fu.semicircles2dgree( s_data[ "nec_lat"  ] )
-		s_data[ "swc_lat"  ]	= fu.semicircles2dgree( s_data[ "swc_lat"  ] )
-		s_data[ "nec_long" ]	= fu.semicircles2dgree( s_data[ "nec_long" ] )
-		s_data[ "swc_long" ]	= fu.semicircles2dgree( s_data[ "swc_long" ] )
-		
-	elif ".gpx" == file_suffix:
-		data, s_data, units	= gpxpandas.get_course( args.input_file )
+	if not args.screen_off or args.output_to_file or args.gifanm:
+		coursemap.preload_timezone_finder()	# it will be used in info()
 
-	print_v( "available data {}".format( data.columns.to_list() ) )
+	data, s_data, units, hit	= coursemap.load_course( args.input_file, opt )
 
-	data[ "distance" ]	/= 1000.0	# convert from meter to kilometer
-	data[ "speed" ]		*= 3.6		# convert from m/s to km/h
+	print_v( "  data {} cache".format( "loaded from" if hit else "parsed without" if args.no_cache else "parsed. not found in" ) )
+	print_v( "available data {}".format( data.columns.to_list() ) )
 
 	#####
 	##### plot range calculation
 	#####
 	if not args.quiet: print( "calculating plot range..." )
 	
-	if args.color_key not in data.columns:
-		print( "WARNING:" )
-		print( "  color key: \"{}\" was specified but not available.".format( args.color_key ) )
-		print( "  default key \"{}\" had been chosen for plot".format( "distance" ) )
-		print( "  available keying data are.. {}".format( set(COLORKEY.keys()) & set(data.columns) ) )
-		args.color_key	= "distance"
-	
-	if args.z_axis != "altitude":
-		args.color_key	= args.z_axis
+	with stage( "prepare" ):
+		data, lim_val, opt	= coursemap.prepare( data, s_data, opt )
 	
-	if args.color_key != "distance":
-		REQUIRED_DATA_COLUMNS.append( args.color_key )
-	if args.color_key in [ "speed", "power" ]:
-		max	= data[ "speed" ].max()
-		mean	= data[ "speed" ].mean()
-		lim		= mean - (max - mean)
-		data.loc[ data[ "speed" ] < lim, "speed" ] = float( "NaN" )
-
-	data	= data.dropna( subset = REQUIRED_DATA_COLUMNS )
-	data	= data[ (data[ "distance" ] >= args.start) & (data[ "distance" ] <= args.fin) ]
-	data.reset_index( inplace = True, drop = True )	
-
-	lim_val	= fu.limit_values( data, args )
-	lim_val[ "sport" ]	= s_data[ "sport" ]	# tentative implementation for colorbar drawing
+	stagetiming.note( points = len( data ) )
 	
-	if args.screen_off and not args.output_to_file:
+	if args.screen_off and not args.output_to_file and not args.gifanm:
 		print( "no plot processed since \"--screen_off\" option given without \"-o\" (output to file)" )
-		return	# do nothing and quit
-
-	#####
-	##### plot settings
-	#####
-	fig	= plt.figure( figsize=( 11, 11 ) )
-	ax	= fig.add_subplot( 111, projection = "3d" )
+		return	None	# do nothing and quit
 
 	if not args.quiet:
 		print( "plot values:" )
@@ -178,22 +141,27 @@ def main():
 		print( "  course distance    : {:7.3f}km".format( data.iloc[ -1 ][ "distance" ] - data.iloc[ 0 ][ "distance" ])  )
 
 	#####
-	##### getting/drawing map
+	##### getting map
 	#####
+	map_arr	= None
 	if args.map_resolution != "off":
-		if not args.quiet: print( "getting map data and draw..." )
-		map_arr	= get_map( ax, args.map_resolution, lim_val )
+		if not args.quiet: print( "getting map data..." )
+		with stage( "map" ):
+			map_arr	= coursemap.get_map( args.map_resolution, lim_val, opt )
 	
 	#####
 	##### 3D course plot
 	#####
 	if not args.quiet: print( "3D prot in progress..." )
-	plot( ax, data, lim_val )
-
-	# ax.set_title( "course plot of " + args.input_file  )
-	fig.text( 0.2, 0.92, "course plot by \"{}\"\n * curtain color: \"{}\"".format( args.input_file, args.color_key ), fontsize = 9, alpha = 0.5, ha = "left", va = "top" )
-	fig.text( 0.8, 0.92, info( s_data, lim_val ), fontsize = 9, alpha = 0.5, ha = "right", va = "top" )
-	fig.text( 0.8, 0.1, FOOTNOTE + "\n" + (OSM_CREDIT if args.map_resolution != "off" else ""), fontsize = 9, alpha = 0.5, ha = "right" )
+	plt		= pyplot()
+	
+	with stage( "info" ):
+		info_text	= coursemap.info( s_data, lim_val, opt )
+	
+	scene	= coursemap.Scene( data, s_data, lim_val, map_arr, info_text, opt )
+	
+	with stage( "figure" ):
+		fig, ax	= coursemap.figure( scene, plt.figure( figsize=( 11, 11 ) ) )
 	
 	#####
 	##### output to file | screen
@@ -201,391 +169,110 @@ def main():
 
 	if args.pickle_output:
 		if not args.quiet: print( "output pickle data..." )
-		with open( output_filename + ".pickle", 'wb') as ofs:
+		with stage( "pickle" ), open( output_filename + ".pickle", 'wb') as ofs:
 			pickle.dump( fig, ofs )
 
 	if args.gifanm:
-		if not args.quiet: print( "making GIF animation..." )
-		make_gif_mp( "-".join( sys.argv ), fig ) # <-- to make GIF animation. enabling this will take time to process
-
-	ax.view_init( args.elevation, args.azimuth )
+		if not args.quiet: print( "making {} animation...".format( args.anm_format.upper() ) )
+		with stage( "animation" ):
+			make_animation( "-".join( sys.argv ), scene )
 
 	if args.output_to_file:
 		if not args.quiet: print( "output to .png file..." )
-		plt.savefig( output_filename + ".png", dpi=600, bbox_inches="tight", pad_inches=0.05 )
+		with stage( "savefig" ):
+			fig.savefig( output_filename + ".png", dpi=600, bbox_inches="tight", pad_inches=0.05 )
 
-	if not args.screen_off:
-		if not args.quiet: print( "output to screen..." )
-		plt.show()
+	if args.startup_profile:
+		startupprofile.mark( "figure ready" )
 
-
-def info( s, lv ):
-	dt	= get_localtimef( lv[ "v_cntr_deg" ], lv[ "h_cntr_deg" ], s[ "start_time" ] )
-	sp	= s[ "sport" ]
-	
-	if sp == "running":
-		avg	= "{}/km".format( fu.second2MS( fu.speed2pace( s[ "avg_speed" ] ) ) )
-	else:
-		avg	= "{:.2f}km/h".format( s[ "avg_speed" ] * 3.6 )
-		
-	if args.map_resolution != "off":
-		start_place		= fu.get_city_name( lv[ "start_lat"    ], lv[ "start_long"    ] )
-		farend_place	= fu.get_city_name( lv[ "farthest_lat" ], lv[ "farthest_long" ] )
-		if start_place == farend_place:
-			place	= start_place
+	if not args.screen_off:
+		if not screen_available():
+			print( "no screen available. use \"-o\" option to save the plot into file" )
 		else:
-			place	= "{} - {}".format( start_place, farend_place )
-	else:
-		place	= ""
-
-	"""
-	if sp in fu.SYMBOL_CHAR.keys():
-		print( fu.SYMBOL_CHAR[ sp ] )
-		sp	= fu.SYMBOL_CHAR[ sp ] + " " + sp
-	"""
+			return plt
 	
-	str		= "{} for {:.3f}km, {} (avg:{})".format( sp, s[ "total_distance" ] / 1000.0, fu.second2HMS( s[ "total_timer_time" ] ), avg )
-	print_v( "  {}\n  started on {}".format( str, dt ) )
-	
-	return "{}\n{}\n{}".format( str, dt, place )
-
+	return	None
 
-def get_localtimef( v, h, dt ):
-	tf	= TimezoneFinder()
-	tz	= pytz.timezone( tf.timezone_at( lat = v, lng = h ) )
 
-	if dt.tzinfo:
-		dt.replace( tzinfo = None )
-	else:
-		dt	+= tz.utcoffset( dt )
-		dt	 = tz.localize( dt )
+def output_timings( rec, prof ):
+	if args.verbose:
+		print( "\n".join( rec.report() ) )
+	
+	if args.timings:
+		rec.info.update( argv = sys.argv, input_file = args.input_file )
+		rec.dump( args.timings )
+		if not args.quiet: print( "timings saved: \"{}\"".format( args.timings ) )
+	
+	if prof:
+		prof.dump_stats( args.profile )
+		if not args.quiet: print( "profile saved: \"{}\" (read it by pstats or snakeviz)".format( args.profile ) )
+		if args.verbose:
+			pstats.Stats( prof ).sort_stats( "cumulative" ).print_stats( 25 )
+	
+	if args.tracemalloc:
+		snapshot		= tracemalloc.take_snapshot()
+		current, peak	= tracemalloc.get_traced_memory()
+		tracemalloc.stop()
 		
-	return "{}".format( dt.astimezone( tz ) )
-
+		print( "memory allocation: peak {:.1f}MB, current {:.1f}MB".format( peak / 2 ** 20, current / 2 ** 20 ) )
+		for s in snapshot.statistics( "lineno" )[ :args.tracemalloc ]:
+			print( "  {}".format( s ) )
 
-def get_localtimef_pre( v, h, dt ):
-	tf		= TimezoneFinder()
-	tz		= pytz.timezone( tf.timezone_at( lat = v, lng = h ) )
-	offset	= tz.utcoffset( dt )
-	seconds	= offset.total_seconds()
-	return "{} (UTC{:0=+3}{:02} {})".format( dt + offset, int( seconds // 3600 ), int((seconds % 3600) // 60), tz )
 
+def screen_available():
+	if os.environ.get( "MPLBACKEND" ):
+		return True		# user's choice
+	if sys.platform.startswith( "linux" ) or "bsd" in sys.platform:
+		return bool( os.environ.get( "DISPLAY" ) or os.environ.get( "WAYLAND_DISPLAY" ) )
+	return True
 
-def plot( ax, data, lv ):
-	span	= lv[ "vh_span" ]
-	
-	if args.thining_factor < 1:	args.thining_factor	= 1   
-	data	= data[ ::args.thining_factor ]
-
-	ds	= data[ "distance" ].tolist()
-	dm_interval	= findinterval( ds[ -1 ] - ds[ 0 ] )	# finding distance marker interval
-
-	print_v( "  distance marker interval {}km".format( dm_interval ) )
 
+def pyplot():
 	#####
-	##### start plotting
-	#####	
-
-	ax.set_xlim( [ lv[ "west"   ],  lv[ "east"  ] ] )
-	ax.set_ylim( [ lv[ "south"  ],  lv[ "north" ] ] )
-	ax.set_zlim( [ lv[ "bottom" ],  lv[ "top"   ] ] )
-
-	COLORS	= 360
-	COLOR_REVERSE	= [ "altitude", "speed" ]
-	
-	cm	= fu.color_map( COLORS + 1 )
-	
-	if args.color_key in COLOR_REVERSE:
-		cm.reverse()
-	
-	smoothing_flag	= True if args.color_key == "power" else False
-	col_scale	= ColorScale( data[ args.color_key ], smoothing = smoothing_flag, logscale = False )
-
-	dm_format	= dmformat( dm_interval )
-
-	xs	= data[ "long_km"  ].tolist()
-	ys	= data[ "lat_km"   ].tolist()
-#	zs	= data[ args.z_axis ].tolist()
-
-	if args.z_axis != "altitude":
-		zs	 = pd.Series( data[ args.z_axis ] )
-		zs	-= zs.min()
-		zs	/= zs.max()
-		zs	*= (data[ "altitude" ].max() - data[ "altitude" ].min())
-		zs	+= data[ "altitude" ].min()
-		zs	 = zs.tolist()
-	else:
-		zs	= data[ "altitude" ].tolist()
-
-	cs	= [ cm[ int(COLORS * col_scale.ratio( i ) ) ] for i in range( len( zs ) ) ]
-
-	m_val	= range( int(ds[ 0 ] / dm_interval + 1) * dm_interval, int(ds[ -1 ] / dm_interval) * dm_interval, dm_interval )
-	m_dic	= marker_index( ds, m_val )
-	
-	z_min	= lv[ "bottom" ]
-
-	w	= 0.01
-	r	= 0.8
-
-	if ( args.colorbar != "off" ):
-		direction	= args.colorbar
-
-		if ( direction == None ):
-			if ( args.azimuth != None ):
-				dir	= [ "e", "n", "w", "s" ]
-				pos0	= dir[ int( (args.azimuth        % 360) / 90 ) ]
-				pos1	= dir[ int( ((args.azimuth + 90) % 360) / 90 ) ]
-				direction	= "{}{}".format( pos0, pos1 )
-			else:
-				direction	= "se"
-	
-		if args.colorbarall: direction	= "nsew"
-
-		direction	= re.findall( "[n]|[s]|[e]|[w]", direction )
-
-		for p in direction:
-			colorbar( ax, cm, lv, col_scale.min, col_scale.max, position = p, ratio = r, width = w )
-
-	if ( args.colorbarV != "off" ):
-		vc		= [ "se", "nw", "ne", "sw", "wn", "es", "ws", "en" ]
-		if ( args.colorbarV not in vc ):
-			corner	= [ vc[ int( (args.azimuth % 360) / 45 ) ] ]
-		else:
-			corner	= [ args.colorbarV ]
-	
-		if args.colorbarall: corner	= [ "ne", "nw", "se", "sw" ]
-
-		for c in corner:
-			colorbar( ax, cm, lv, col_scale.min, col_scale.max, orientation = "vertical", corner = c, ratio = 1, width = w )
-
-
-#	t = time.time()
-
-	for x, y, z, cc in zip( xs, ys, zs, cs ):
-		ax.plot( [ x, x ], [ y, y ], [ z, z_min ], color = cc, alpha = args.curtain_alpha )
-
-#	print( "elapsed time {}".format( time.time() - t ) )
-
-	if args.color_key != "distance":
-		for v, i in m_dic.items():
-			cs[ i ]	= [ 0.5, 0.5, 0.5 ]
-	
-	for v, i in m_dic.items():
-		marktext( ax, xs[ i ], ys[ i ], zs[ i ], 10, (dm_format % v) + "km", 10, cs[ i ], 0.99, "center" )
-
-	if args.z_axis != "altitude":
-		zs	= data[ "altitude" ].tolist()
-		
-	ax.plot( xs, ys, z_min, color = [ 0, 0, 0 ], alpha = 0.1 )	# course shadow plot on bottom
-	ax.plot( xs, ys, zs,    color = [ 0, 0, 0 ], alpha = 0.2 )	# course plot on trace edge
-
-	marktext( ax, xs[  0 ], ys[  0 ], zs[  0 ], 200, "start", 20, [ 0, 1, 0 ], 0.5, "left" )
-	marktext( ax, xs[ -1 ], ys[ -1 ], zs[ -1 ], 200, "fin",   20, [ 1, 0, 0 ], 0.5, "right" )
-	
-	marktext( ax, lv[ "west"   ], lv[ "v_cntr" ], z_min, 0, "W", 12, [ 0, 0, 0 ], 0.2, "center" )
-	marktext( ax, lv[ "east"   ], lv[ "v_cntr" ], z_min, 0, "E", 12, [ 0, 0, 0 ], 0.2, "center" )
-	marktext( ax, lv[ "h_cntr" ], lv[ "south"  ], z_min, 0, "S", 12, [ 0, 0, 0 ], 0.2, "center" )
-	marktext( ax, lv[ "h_cntr" ], lv[ "north"  ], z_min, 0, "N", 12, [ 0, 0, 0 ], 0.2, "center" )
-	
-	ax.set_xlabel( "[km]\nlongitude (-):west / (+): east"  )
-	ax.set_ylabel( "[km]\nlatiitude (-):south / (+): north" )
-	ax.set_zlabel( "altitude [m]" )
-	ax.grid()
-
-
-def colorbar( ax, cm, lv, min, max, orientation = "horizontal", corner = "ne", position = "n", width = 0.02, ratio = 0.5, alpha = 0.5 ):
-	pos	= { "n": "north", "s": "south", "e": "east", "w": "west" }
-	position	= pos[ position ]
-	
-	d	= pd.DataFrame()
-	d[ "i" ]	= range( 360 )
-	
-	if orientation == "horizontal":
-		if position == "north" or position == "south":
-			span_x		= lv[ "east" ] - lv[ "west" ]
-			start_x		= lv[ "west" ] + span_x * (1 - ratio) * 0.5
-			end_x		= lv[ "east" ] - span_x * (1 - ratio) * 0.5
-			center_x	= lv[ "west" ] + span_x * 0.5
-
-			span_x		= 0
-
-			span_y		= (lv[ "north" ] - lv[ "south" ]) * width
-			start_y		= lv[ position ]
-			center_y	= lv[ position ]
-			end_y		= lv[ position ]
-
-			d[ "x" ]	= np.linspace( start_x,  end_x, 360 )
-			d[ "y" ]	= lv[ position ]
-			d[ "z" ]	= lv[ "bottom" ]
-
-		else:
-			span_y		= lv[ "north" ] - lv[ "south" ]
-			start_y		= lv[ "south" ] + span_y * (1 - ratio) * 0.5
-			end_y		= lv[ "north" ] - span_y * (1 - ratio) * 0.5
-			center_y	= lv[ "south" ] + span_y * 0.5
-
-			span_y		= 0
-
-			span_x		= (lv[ "east" ] - lv[ "west" ]) * width
-			start_x		= lv[ position ]
-			center_x	= lv[ position ]
-			end_x		= lv[ position ]
-
-			d[ "x" ]	= lv[ position ]
-			d[ "y" ]	= np.linspace( start_y,  end_y, 360 )
-			d[ "z" ]	= lv[ "bottom" ]
-		
-		start_z		= lv[ "bottom" ]
-		end_z		= lv[ "bottom" ]
-		center_z	= lv[ "bottom" ]
-	else:
-		span_z		= lv[ "top"    ] - lv[ "bottom"  ]
-		start_z		= lv[ "bottom" ] + span_z * (1 - ratio) * 0.5
-		end_z		= lv[ "top"    ] - span_z * (1 - ratio) * 0.5
-		center_z	= lv[ "bottom" ] + span_z * 0.5
-
-		xc	= "east"  if "e" in corner else "west"
-		yc	= "north" if "n" in corner else "south"
-
-		span_x		= (lv[ "east"  ] - lv[ "west"  ]) * width
-		span_y		= (lv[ "north" ] - lv[ "south" ]) * width
-
-		span_x		*= 1 if xc == "east"  else -1
-		span_y		*= 1 if yc == "north" else -1
-
-		d[ "x" ]	= lv[ xc ]
-		d[ "y" ]	= lv[ yc ]
-		d[ "z" ]	= np.linspace( start_z,  end_z, 360 )
-
-		start_x		= lv[ xc ]
-		center_x	= lv[ xc ]
-		end_x		= lv[ xc ]
-		start_y		= lv[ yc ]
-		end_y		= lv[ yc ]
-		center_y	= lv[ yc ]
-
-	if position == "south" or position == "west":
-		span_x	*= -1
-		span_y	*= -1
-
-	for i, x, y, z in zip( d[ "i" ], d[ "x" ].to_list(), d[ "y" ].to_list(), d[ "z" ].to_list() ):
-		ax.plot( [ x, x  + span_x ], [ y, y + span_y ], [ z, z ], color = cm[ i ], alpha = alpha )
-
-	if lv["sport"] == "running" and args.color_key == "speed":
-		lbl	= "pace"
-		min	= "{}/km".format( fu.second2MS( fu.speed2pace( min / 3.6 ) ) )
-		max	= "{}/km".format( fu.second2MS( fu.speed2pace( max / 3.6 ) ) )
-	else:
-		lbl	= args.color_key
-		min	= "{:.1f}{}".format( min, COLORKEY[ args.color_key ] )
-		max	= "{:.1f}{}".format( max, COLORKEY[ args.color_key ] )
-
-	size	= 9
-	color	= [ 0, 0, 0 ]
-	pos		= "center"
-	marktext( ax, start_x,  start_y,  start_z,  0, min, size, color, alpha, pos )
-	marktext( ax, end_x,    end_y,    end_z,    0, max, size, color, alpha, pos )
-	marktext( ax, center_x, center_y, center_z, 0, lbl, size, color, alpha, pos )
-
-
-def findinterval( x ):
-	e	= np.floor(np.log10( x ) )
-	m	= x / (10 ** e)
-
-	if ( m <= 2 ):
-		r	= 1
-	elif ( m <= 5 ):
-		r	= 2
-	else:
-		r	= 5
-	
-	r	*= (10 ** (e-1))
-	
-	return ( int( r ) )
-
-
-def dmformat( di ):
-	e	= 0 - np.floor( np.log10( di ) )
-	if ( 0 < e ):
-		f	= "%." + "{:.0f}".format( 0 - np.floor( np.log10( di ) ) ) + "f"
-	else:
-		f	= "%.0f"
-	return ( f )
-
-
-def marktext( ax, x, y, z, dotsize, text, textsize, color, av, align ):
-	ax.scatter(	x, y, z, s = dotsize,	color = color,	alpha = av )
-	ax.text(	x, y, z, text,			color = color,	alpha = av, size = textsize, ha = align, va = "bottom" )
-
-
-def get_map( axis, size_idx, lv ):
-
-	# finding zoom level
-	# reference: https://wiki.openstreetmap.org/wiki/Zoom_levels
-	# reference: https://wiki.openstreetmap.org/wiki/Tiles
-	
-	ZOOM_SCALE		= [ 360,
-		180,	90,		45,		22.5, 	11.25, 	
-		5.625, 	2.813,	1.406,	0.703,	0.352,	
-		0.176,	0.088,	0.044,	0.022,	0.011,	
-		0.005,	0.003,	0.001,	0.0005, 0.00025
-	]
-	TILE_SIZE		= 256.0
-
-	size	= MAP_RESOLUTION[ size_idx ]
-	span	= lv[ "vh_span" ] * TILE_SIZE / size
-
-	for zoom_level in range( 1, len( ZOOM_SCALE) + 1 ):
-		if (span / lv[ "Ch" ]) > ZOOM_SCALE[ zoom_level ]:
-			break
-			
-	zoom_level	-= 1
-	
-	map_span_by_size	= (K * lv[ "Rcv" ]) / (2 ** zoom_level) * (size / TILE_SIZE)
-	size	= int( np.ceil( size * (lv[ "vh_span" ] / map_span_by_size) ) )
-
-	print_v( "  reruested max map size = {} pixels (equals to {:.3f}km span)".format( MAP_RESOLUTION[ size_idx ], map_span_by_size ) )
-	if not args.quiet:	print( "  zoom_level = {}, map size = {} pixels".format( zoom_level, size ) )
-	
-	context	= staticmaps.Context()
-	context.set_tile_provider( staticmaps.tile_provider_OSM )	
-	context.set_zoom( zoom_level )	
-	context.set_center( staticmaps.create_latlng( lv[ "v_cntr_deg" ], lv[ "h_cntr_deg" ] ) )
-	image = context.render_cairo( size, size )
-
-	# image.write_to_png("_map_img.png")
+	##### non-interactive "Agg" backend is used when screen is not used or not available
+	#####
+	import	matplotlib
 	
-	buf = image.get_data()
-
-	arri	= np.ndarray( shape=( size, size, 4 ), dtype = np.uint8, buffer = buf ).astype(np.uint8)
-	ar		= np.array( arri / 255.0, dtype = np.float16 )
-	arr		= np.ndarray( shape=( size, size, 4 ), dtype = np.float16 )
+	if args.screen_off or not screen_available():
+		matplotlib.use( "Agg" )
 	
-	for x in range( size ):
-		for y in range( size ):
-			arr[ y ][ (size - 1) - x ]	= [ ar[ x ][ y ][ 2 ], ar[ x ][ y ][ 1 ], ar[ x ][ y ][ 0 ], args.map_alpha ]
+	import	matplotlib.pyplot as plt
+	return plt
 
-	surface_x	= [ [x] for x in np.linspace( lv[ "west"  ],  lv[ "east"  ],  size ) ]
-	surface_y	= [  y  for y in np.linspace( lv[ "south" ],  lv[ "north" ] , size ) ]
-
-	stride	= 1
-	axis.plot_surface( surface_x, surface_y, np.atleast_2d( lv[ "bottom" ] ), rstride = stride, cstride = stride, facecolors = arr, shade = False )
-
-	return	arr
 
 def command_line_handling():
 	parser	= argparse.ArgumentParser( description = "plots 3D course map in from .fit file" )
 	qv_grp	= parser.add_mutually_exclusive_group()
-	parser.add_argument( "input_file",				help = "input file (.fit or .gpx format)" )
+	parser.add_argument( "input_file",				help = "input file (.fit or .gpx format). multiple files, directories or wildcards for batch", nargs = "+" )
+	parser.add_argument( "-j", "--jobs",			help = "worker processes for batch, 0: number of CPUs",	type = int, default = 0 )
+	parser.add_argument(       "--report",			help = "batch report file (.csv)" )
 	parser.add_argument( "-z", "--z_axis",			help = "z_axis data", 	choices = COLORKEY.keys(), default = "altitude" )
 	parser.add_argument( "-e", "--elevation",		help = "view setting: elevation", 			type = float, default =  60 )
 	parser.add_argument( "-a", "--azimuth",			help = "view setting: azimuth", 			type = float, default = -86 )
 	parser.add_argument( "-m", "--map_resolution",	help = "map resolution",		choices = [ "low", "mid", "high", "off" ], default = "low" )
-	parser.add_argument( "-f", "--alt_filt",		help = "altitude filtering",	choices = [ "norm", "avg", "off" ], default = "avg" )
+	parser.add_argument(       "--fit_decoder",		help = ".fit file decoder",		choices = coursemap.FIT_DECODERS, default = "numpy" )
+	parser.add_argument(       "--gpx_reader",		help = ".gpx file reader",		choices = coursemap.GPX_READERS, default = "stream" )
+	parser.add_argument(       "--all_columns",		help = "read all data fields in file",	action = "store_true" )
+	parser.add_argument(       "--no_cache", "--no-cache",	help = "parse file without cache",	action = "store_true" )
+	parser.add_argument(       "--cache_dir",		help = "cache directory", 					default = coursecache.DEFAULT_DIR )
+	parser.add_argument(       "--cache_size",		help = "cache size limit in MB", 			type = float, default = coursecache.DEFAULT_SIZE_MB )
+	parser.add_argument(       "--tile_provider",	help = "map tile provider",		choices = coursemap.TILE_PROVIDERS, default = "osm" )
+	parser.add_argument(       "--tiles",			help = "map tile source: \"online\" or local directory (<z>/<x>/<y>.png) or .mbtiles file for offline", default = "online" )
+	parser.add_argument(       "--tile_cache_dir",	help = "map tile cache directory (default: ~/.cache/run_coursemap/tiles)" )
+	parser.add_argument(       "--tile_ttl",		help = "map tile expiration in days (default: 30)",	type = float )
+	parser.add_argument(       "--tile_cache_size",	help = "map tile cache size limit in MB (default: 200)",	type = float )
+	parser.add_argument(       "--gazetteer",		help = "place name file for offline reverse geocoding (GeoNames format or \"name, lat, long\")" )
+	parser.add_argument(       "--map_texture",		help = "map texture size (facets per side) for downsampling, 0: as map resolution",	type = int, default = 0 )
+	parser.add_argument( "-f", "--alt_filt",		help = "altitude filtering",	choices = coursemap.ALT_FILTERS, default = "avg" )
+	parser.add_argument(       "--am_size",			help = "altitude map grid resolution for \"avg\" filter",	type = int, default = 300 )
+	parser.add_argument(       "--olr",				help = "overlapping range (grids) for \"avg\" filter",	type = int, default =   2 )
 	parser.add_argument(       "--start",			help = "set start point", 					type = float, default =   0 )
 	parser.add_argument(       "--fin",				help = "set finish point", 					type = float, default = float("inf") )
 	parser.add_argument( "-t", "--thining_factor",	help = "data point thining out ratio",		type = int,   default =   1 )
+	parser.add_argument(       "--lap_markers",		help = "marks from lap messages of .fit file: lap/split ends and highest point of each lap",	choices = coursemap.LAP_MARKERS, default = "off" )
+	parser.add_argument(       "--max_points", "--max-points",	help = "maximum number of plotted points (shape preserving reduction), 0: no limit",	type = int, default = coursemap.Options.max_points )
 	parser.add_argument( "-b", "--map_alpha",		help = "view setting: map alpha on base", 	type = float, default = 0.1 )
+	parser.add_argument(       "--curtain",			help = "curtain rendering: a collection or an artist per point",	choices = coursemap.CURTAINS, default = "collection" )
 	parser.add_argument( "-c", "--curtain_alpha",	help = "view setting: curtain alpha", 		type = float, default = 0.1 )
 	parser.add_argument( "-k", "--color_key",		help = "color keying data", 	choices = COLORKEY.keys(), default = "distance" )
 	parser.add_argument(       "--colorbar",		help = "horizontal colorbar position", type=ascii )
@@ -595,9 +282,18 @@ def command_line_handling():
 	parser.add_argument( "-o", "--output_to_file",	help = "output to file = ON",		action = "store_true" )
 	parser.add_argument( "-p", "--pickle_output",	help = "output to .pickle = ON",	action = "store_true" )
 	parser.add_argument( 	   "--screen_off",		help = "output to screen = OFF",	action = "store_true" )
-	parser.add_argument( 	   "--gifanm",			help = "make GIF animation",		action = "store_true" )
+	parser.add_argument( 	   "--gifanm",			help = "make rotating view animation",		action = "store_true" )
+	parser.add_argument( 	   "--anm_format",		help = "animation file format",		choices = coursemap.ANIMATION_FORMATS, default = "gif" )
+	parser.add_argument( 	   "--frames",			help = "number of animation frames",	type = int, default = 720 )
+	parser.add_argument( 	   "--fps",				help = "animation frame rate",		type = float, default = 25 )
+	parser.add_argument( 	   "--anm_size",		help = "animation resolution in pixels (WIDTHxHEIGHT)",	default = "1300x1100" )
+	parser.add_argument( 	   "--anm_jobs",		help = "worker processes for animation rendering, 0: number of CPUs",	type = int, default = 0 )
 	qv_grp.add_argument( "-v", "--verbose", 		help = "verbose mode",				action = "store_true" )
 	qv_grp.add_argument( "-q", "--quiet", 			help = "quiet mode",				action = "store_true" )
+	parser.add_argument(       "--timings",			help = "save processing time of each stage in JSON file",	metavar = "FILE" )
+	parser.add_argument(       "--profile",			help = "save cProfile statistics in FILE",	metavar = "FILE" )
+	parser.add_argument(       "--tracemalloc",		help = "show peak memory and N top allocations",	type = int, nargs = "?", const = 10, metavar = "N" )
+	parser.add_argument(       "--startup_profile", "--startup-profile",	help = "report import times at exit. JSON lines is appended to FILE if given",	nargs = "?", const = "-", metavar = "FILE" )
 	
 	return	parser.parse_args()
 
@@ -615,14 +311,19 @@ def show_given_parameters( output_filename ):
 		
 	print( "setting:" )
 	print( "  input file        = \"{}\"˚".format( args.input_file ) )
+	print( "  .fit decoder      = {}".format( args.fit_decoder ) )
+	print( "  .gpx reader       = {}".format( args.gpx_reader ) )
 	print( "  elevation         = {:4}˚".format( args.elevation ) )
 	print( "  azimuth           = {:4}˚".format( args.azimuth ) )
 	print( "  map_resolution    = {}".format( map_setting ) )
+	print( "  map tiles         = {} from \"{}\"".format( args.tile_provider, args.tiles ) )
 	print( "  altitude filter   = {}".format( args.alt_filt ) )
+	print( "  altitude map grid = {} (overlapping range = {})".format( args.am_size, args.olr ) )
 	print( "  negative alt en   = {}".format( args.negative_alt ) )
 	print( "  plot start        = {:4.1f}km".format( args.start ) )
 	print( "  plot finish       = {}".format( finish_setting ) )
 	print( "  thining out ratio = {}".format( args.thining_factor ) )
+	print( "  max points        = {}".format( args.max_points if args.max_points else "no limit" ) )
 	print( "  alpha for map     = {}".format( args.map_alpha ) )
 	print( "  alpha for curtain = {}".format( args.curtain_alpha ) )
 	print( "  verbose/quiet     = {}/{}".format( args.verbose, args.quiet ) )
@@ -630,41 +331,145 @@ def show_given_parameters( output_filename ):
 
 
 def print_v( s ):
-	if args.verbose:
-		print( s  )
+	coursemap.print_v( args, s )
 
 
-def make_gif_mp( base_name, fig ):
-	dir_name	= "temp_3d_" + base_name + "/"
-	file_name	= dir_name + base_name
-	subprocess.call( "mkdir " + dir_name, shell=True)
-	fig.set_size_inches( 13, 11 )
+def make_animation( base_name, scene ):
+	import	animation
+	
+	file_name	= base_name + animation.FORMATS[ args.anm_format ]
+	size		= [ int( v ) for v in args.anm_size.lower().split( "x" ) ]
 
-	n	= 720
-	for i in range( n ):
-		print( "plotting rotating image {:3}/{}".format( i, n ) )
-		elv		= (np.cos( 1 * (i / n) * 2 * np.pi) ) * 0.5 + 0.5
-		
-		plt.gca().view_init( azim = i - 90, elev = 84 * elv + 5 )
-		plt.savefig( file_name + ("%03d" % i) + ".png" )
+	def progress( count, frames ):
+		if not args.quiet and (args.verbose or count % 60 == 0 or count == frames):
+			print( "  rendering rotating image {:3}/{}".format( count, frames ) )
+
+	# figure is built in each worker process from the scene. verbose messages are not needed there
+	scene	= scene._replace( options = scene.options.replace( verbose = False, quiet = True ) )
 	
-	if not args.quiet: print( "  converting GIF files into an animation file" )
-	cmd = "convert -delay 4 -layers Optimize " + dir_name + base_name+ "*.png " + base_name + ".gif" # using "ImageMagick" command
-	subprocess.call( cmd, shell = True ) 
-	subprocess.call( "rm -rf " + dir_name, shell=True )
+	animation.render( file_name, coursemap.figure, ( scene, ), frames = args.frames, fps = args.fps, size = size, fmt = args.anm_format, jobs = args.anm_jobs, progress = progress )
 	
+	if not args.quiet: print( "  animation saved: \"{}\"".format( file_name ) )
+
 
-def smooth( d, w ):
-	return np.convolve( d, w, mode = 'same' )[ len( w )// 2 : -len( w ) // 2 ]
+def input_files( patterns ):
+	#####
+	##### file names, directories (.fit/.gpx files in it) and wildcards to list of files
+	#####
+	files	= []
+	for p in patterns:
+		if os.path.isdir( p ):
+			files.extend( sorted( f for f in glob.glob( os.path.join( p, "*" ) ) if os.path.splitext( f )[ 1 ].lower() in [ ".fit", ".gpx" ] ) )
+		elif glob.has_magic( p ):
+			files.extend( sorted( glob.glob( p ) ) )
+		else:
+			files.append( p )
+	
+	return list( dict.fromkeys( files ) )
 
 
-def marker_index( data, marker_list ):
-	d	= np.array( data )
-	idx	= [ np.argmin( np.abs( d - v ) ) for v in marker_list ]
-	return dict( zip( marker_list, idx ) )
+def batch( files ):
+	#####
+	##### renders files in worker processes. a failure of a file doesn't stop others
+	#####
+	jobs	= min( args.jobs if args.jobs else os.cpu_count() or 1, len( files ) )
+	argv	= batch_argv( sys.argv[ 1: ] )
+	names	= [ os.path.basename( f ) for f in files ]
+	count	= collections.Counter( names )
+	
+	# same file name in different directories: directory is included in the name to avoid overwriting output
+	names	= [ n if count[ n ] == 1 else os.path.normpath( f ).lstrip( os.sep ).replace( os.sep, "_" ) for n, f in zip( names, files ) ]
+	tasks	= [ ( f, [ os.path.basename( sys.argv[ 0 ] ), n ] + argv ) for f, n in zip( files, names ) ]
+	results	= []
+	
+	if not args.quiet: print( "batch: {} files by {} worker processes".format( len( files ), jobs ) )
 	
+	start	= time.perf_counter()
+	with multiprocessing.Pool( jobs, initializer = batch_init ) as pool:
+		for r in pool.imap_unordered( batch_render, tasks ):
+			results.append( r )
+			if not args.quiet:
+				print( "  [{:{}}/{}] {:6} {:8.2f}s  {}{}".format( len( results ), len( str( len( files ) ) ), len( files ), r[ "status" ], r[ "seconds" ], r[ "file" ], "  (" + r[ "error" ] + ")" if r[ "error" ] else "" ) )
+			if args.verbose:
+				print( r[ "log" ] )
+
+	failed	= [ r for r in results if r[ "status" ] != "ok" ]
+	if not args.quiet: print( "batch done: {} succeeded, {} failed in {:.2f}s".format( len( results ) - len( failed ), len( failed ), time.perf_counter() - start ) )
+	
+	if args.report:
+		with open( args.report, "w", newline = "" ) as f:
+			w	= csv.DictWriter( f, fieldnames = [ "file", "status", "seconds", "error" ], extrasaction = "ignore" )
+			w.writeheader()
+			w.writerows( sorted( results, key = lambda r: files.index( r[ "file" ] ) ) )
+	
+	return len( failed )
+
+
+def batch_argv( argv ):
+	#####
+	##### arguments for each file: input files and batch only options ("-j", "--jobs", "--report" with values) are removed
+	#####
+	BATCH_ONLY	= [ "-j", "--jobs", "--report" ]
+	result		= []
+	skip		= False
+	
+	for a in argv:
+		if skip:
+			skip	= False
+		elif a in BATCH_ONLY:
+			skip	= True		# value is next argument
+		elif a.split( "=", 1 )[ 0 ] in BATCH_ONLY or ( a.startswith( "-j" ) and a[ 2: ].isdigit() ):
+			pass
+		elif a not in args.input_file:
+			result.append( a )
+	
+	return result
+
+
+def batch_init():
+	import	matplotlib
+	matplotlib.use( "Agg" )		# no screen in batch
+
+
+def batch_render( task ):
+	#####
+	##### renders a file in worker with options given for batch.
+	##### sys.argv is replaced to make output file name as same as single file run
+	#####
+	global args
+	
+	file_name, argv	= task
+	start	= time.perf_counter()
+	log		= io.StringIO()
+	error	= ""
+	
+	try:
+		with contextlib.redirect_stdout( log ):
+			sys.argv	= argv
+			args		= command_line_handling()
+			args.input_file		= file_name
+			args.screen_off		= True
+			args.anm_jobs		= 1		# no process pool in worker
+			if not ( args.pickle_output or args.gifanm ):
+				args.output_to_file	= True
+			
+			main()
+	except Exception as e:
+		error	= "{}: {}".format( type( e ).__name__, e )
+	finally:
+		if "matplotlib.pyplot" in sys.modules:
+			sys.modules[ "matplotlib.pyplot" ].close( "all" )
+	
+	return { "file": file_name, "status": "failed" if error else "ok", "seconds": round( time.perf_counter() - start, 3 ), "error": error, "log": log.getvalue() }
+
 
 if __name__ == "__main__":
 	args	= command_line_handling()
+	files	= input_files( args.input_file )
+	
+	if 1 < len( files ) or files != args.input_file:
+		sys.exit( 1 if batch( files ) else 0 )
+	
+	args.input_file	= files[ 0 ]
 	main()
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# processing time of each stage
+#
+#	stages are marked in code by "with stagetiming.stage( name ):".
+#	time is recorded only while a Recorder is active in the context (thread/task local),
+#	so the marking costs nearly nothing when timing is not asked.
+#
+#	usage:
+#		with stagetiming.Recorder() as rec:
+#			with stagetiming.stage( "parse" ):
+#				...
+#		print( "\n".join( rec.report() ) )
+#		rec.dump( "timings.json" )
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	contextlib
+import	contextvars
+import	datetime
+import	json
+import	time
+
+_recorder	= contextvars.ContextVar( "stagetiming_recorder", default = None )
+
+
+class Recorder:
+	def __init__( self ):
+		self.stages	= {}	# path ("outer/inner"): { "name", "ms", "calls", "depth" } in order of first start
+		self.stack	= []
+		self.info	= {}	# additional information for JSON output
+		self.total	= None
+
+	def __enter__( self ):
+		self.token	= _recorder.set( self )
+		self.start	= time.perf_counter()
+		return self
+
+	def __exit__( self, *exc ):
+		self.total	= (time.perf_counter() - self.start) * 1000
+		_recorder.reset( self.token )
+
+	def enter( self, name ):
+		# same name in different outer stages is recorded separately
+		path	= self.stack[ -1 ] + "/" + name if self.stack else name
+		if path not in self.stages:
+			self.stages[ path ]	= { "name": name, "ms": 0.0, "calls": 0, "depth": len( self.stack ) }
+		self.stack.append( path )
+
+	def leave( self, name, ms ):
+		path	= self.stack.pop()
+		self.stages[ path ][ "ms" ]		+= ms
+		self.stages[ path ][ "calls" ]	+= 1
+
+	def report( self ):
+		# lines of text. nested stages are indented
+		lines	= [ "stage timings [ms]:" ]
+		for s in self.stages.values():
+			lines.append( "  {:10.1f}  {}{}{}".format( s[ "ms" ], "  " * s[ "depth" ], s[ "name" ], " (x{})".format( s[ "calls" ] ) if 1 < s[ "calls" ] else "" ) )
+		if self.total is not None:
+			lines.append( "  {:10.1f}  total".format( self.total ) )
+		return lines
+
+	def as_dict( self ):
+		return dict( self.info,
+			date	= datetime.datetime.now().isoformat( timespec = "seconds" ),
+			total_ms	= None if self.total is None else round( self.total, 3 ),
+			stages	= [ dict( stage = path, ms = round( s[ "ms" ], 3 ), calls = s[ "calls" ], depth = s[ "depth" ] ) for path, s in self.stages.items() ],
+		)
+
+	def dump( self, file_name ):
+		with open( file_name, "w" ) as f:
+			json.dump( self.as_dict(), f, indent = "\t" )
+
+
+def note( **info ):
+	# additional information (i.e. number of data points) for JSON output
+	r	= _recorder.get()
+	if r is not None:
+		r.info.update( info )
+
+
+@contextlib.contextmanager
+def stage( name ):
+	r	= _recorder.get()
+	if r is None:
+		yield
+		return
+
+	r.enter( name )
+	t	= time.perf_counter()
+	try:
+		yield
+	finally:
+		r.leave( name, (time.perf_counter() - t) * 1000 )
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# import time profiler for startup latency
+#
+#	builtins.__import__ is hooked to measure time of first time imports written in modules of this project
+#	(time of a module includes its dependencies). report is printed to stderr at exit and can be appended
+#	to a JSON lines file to keep history of startup time.
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	atexit
+import	builtins
+import	datetime
+import	json
+import	os
+import	sys
+import	time
+
+_original_import	= builtins.__import__
+_start		= None
+_records	= []	# ( start, elapsed, module, importer, level ) in ms
+_marks		= []	# ( name, time ) in ms
+_output		= [ None ]
+
+
+def now():
+	return (time.perf_counter() - _start) * 1000
+
+
+def install( root = None ):
+	#####
+	##### "root" is directory of this project (directory of main script if None)
+	#####
+	global _start
+
+	if _start is not None:
+		return
+
+	_start	= time.perf_counter()
+	root	= root if root else os.path.dirname( os.path.abspath( sys.argv[ 0 ] ) )
+	nest	= [ 0 ]
+
+	def timed_import( name, globals = None, locals = None, fromlist = (), level = 0 ):
+		importer	= (globals or {}).get( "__file__" )
+
+		if level or name in sys.modules or not importer or os.path.dirname( os.path.abspath( importer ) ) != root:
+			return _original_import( name, globals, locals, fromlist, level )
+
+		start		= now()
+		nest[ 0 ]	+= 1
+		try:
+			return _original_import( name, globals, locals, fromlist, level )
+		finally:
+			nest[ 0 ]	-= 1
+			_records.append( ( start, now() - start, name, globals.get( "__name__" ), nest[ 0 ] ) )
+
+	builtins.__import__	= timed_import
+	atexit.register( report )
+
+
+def mark( name ):
+	# time of a point in processing (i.e. "main started")
+	if _start is not None:
+		_marks.append( ( name, now() ) )
+
+
+def set_output( file_name ):
+	# JSON lines file to append the report ( None or "-" for stderr only )
+	_output[ 0 ]	= None if file_name in [ None, "-" ] else file_name
+
+
+def report():
+	mark( "exit" )
+	builtins.__import__	= _original_import
+
+	print( "startup profile:", file = sys.stderr )
+	print( "  imports (start, time taken) [ms]:", file = sys.stderr )
+	for start, elapsed, name, importer, level in sorted( _records ):
+		print( "  {:8.1f} {:8.1f}  {}{} ({})".format( start, elapsed, "  " * level, name, importer ), file = sys.stderr )
+
+	print( "  processing points [ms]:", file = sys.stderr )
+	for name, t in _marks:
+		print( "  {:8.1f}  {}".format( t, name ), file = sys.stderr )
+
+	if _output[ 0 ]:
+		r	= {
+			"date":		datetime.datetime.now().isoformat( timespec = "seconds" ),
+			"argv":		sys.argv,
+			"python":	sys.version.split()[ 0 ],
+			"imports":	[ { "module": n, "importer": i, "start_ms": round( s, 2 ), "ms": round( e, 2 ), "level": l } for s, e, n, i, l in sorted( _records ) ],
+			"marks":	{ n: round( t, 2 ) for n, t in _marks },
+		}
+		with open( _output[ 0 ], "a" ) as f:
+			f.write( json.dumps( r ) + "\n" )
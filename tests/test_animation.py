@@ -0,0 +1,92 @@
+# animated GIF / APNG writers splice single frame files into valid animation
+
+import	io
+import	shutil
+
+import	numpy as np
+import	pytest
+
+import	animation
+
+Image	= pytest.importorskip( "PIL.Image" )
+
+SIZE	= ( 64, 48 )
+
+
+def frames( n ):
+	# distinct solid color frames
+	return [ np.full( ( SIZE[ 1 ], SIZE[ 0 ], 3 ), ( 40 * i, 255 - 40 * i, 100 ), dtype = np.uint8 ) for i in range( n ) ]
+
+
+def encoded( rgb, fmt ):
+	buf	= io.BytesIO()
+	if fmt == "gif":
+		Image.fromarray( rgb ).quantize( 256 ).save( buf, "GIF" )
+	else:
+		Image.fromarray( rgb ).save( buf, "PNG" )
+	return buf.getvalue()
+
+
+def read_frames( file_name ):
+	with Image.open( file_name ) as im:
+		result	= []
+		for i in range( im.n_frames ):
+			im.seek( i )
+			result.append( np.asarray( im.convert( "RGB" ) ) )
+		return im.size, result
+
+
+@pytest.mark.parametrize( "fmt", [ "gif", "apng" ] )
+def test_writer( tmp_path, fmt ):
+	name	= str( tmp_path / ("a" + animation.FORMATS[ fmt ]) )
+	src		= frames( 4 )
+
+	with open( name, "wb" ) as fp:
+		writer	= animation.GifWriter( fp, SIZE, 25 ) if fmt == "gif" else animation.ApngWriter( fp, SIZE, 25, len( src ) )
+		for rgb in src:
+			writer.write( encoded( rgb, fmt ) )
+		writer.close()
+
+	size, result	= read_frames( name )
+
+	assert size == SIZE
+	assert len( result ) == len( src )
+	for a, b in zip( result, src ):
+		np.testing.assert_array_equal( a, b )
+
+
+def build():
+	import	matplotlib.pyplot as plt
+
+	fig	= plt.figure()
+	ax	= fig.add_subplot( projection = "3d" )
+	t	= np.linspace( 0, 4 * np.pi, 50 )
+	ax.plot( np.cos( t ), np.sin( t ), t )
+	return fig, ax
+
+
+@pytest.mark.parametrize( "fmt", [ "gif", "apng", "mp4" ] )
+def test_render( tmp_path, fmt ):
+	if fmt == "mp4" and shutil.which( "ffmpeg" ) is None:
+		pytest.skip( "ffmpeg not found" )
+
+	single	= str( tmp_path / ("single" + animation.FORMATS[ fmt ]) )
+	pool	= str( tmp_path / ("pool" + animation.FORMATS[ fmt ]) )
+	counts	= []
+
+	animation.render( single, build, (), frames = 3, size = ( 120, 100 ), fmt = fmt, jobs = 1, progress = lambda c, n: counts.append( ( c, n ) ) )
+	animation.render( pool, build, (), frames = 3, size = ( 120, 100 ), fmt = fmt, jobs = 2 )
+
+	assert counts == [ ( 1, 3 ), ( 2, 3 ), ( 3, 3 ) ]
+
+	if fmt == "mp4":
+		return
+
+	size, a	= read_frames( single )
+	_, b	= read_frames( pool )
+
+	assert size == ( 120, 100 )
+	assert len( a ) == len( b ) == 3
+	assert not np.array_equal( a[ 0 ], a[ 1 ] )		# view angle changes
+	for x, y in zip( a, b ):
+		np.testing.assert_array_equal( x, y )
@@ -0,0 +1,22 @@
+# option choices listed in coursemap (to avoid imports at startup) are same as the modules'
+
+import	pytest
+
+import	coursemap
+
+
+def test_reader_choices():
+	import	fitpandas
+	import	gpxpandas
+	assert coursemap.FIT_DECODERS == fitpandas.DECODERS
+	assert coursemap.GPX_READERS == gpxpandas.READERS
+
+
+def test_animation_formats():
+	import	animation
+	assert coursemap.ANIMATION_FORMATS == list( animation.FORMATS )
+
+
+def test_tile_providers():
+	staticmaps	= pytest.importorskip( "staticmaps" )
+	assert coursemap.TILE_PROVIDERS == list( staticmaps.default_tile_providers )
@@ -0,0 +1,102 @@
+# tests of on-disk activity cache (coursecache.py)
+
+import	multiprocessing
+import	os
+
+import	numpy as np
+import	pandas as pd
+import	pytest
+
+import	coursecache
+
+
+def reader( file_name, columns ):
+	n		= 10000
+	data	= pd.DataFrame( { "distance": np.arange( n ) / 1000.0, "altitude": np.full( n, 10.0 ), "heart_rate": np.full( n, 120.0 ),
+		"timestamp": pd.to_datetime( 1600000000 + np.arange( n ), unit = "s", utc = True ) } )
+	if columns is not None:
+		data	= data[ [ c for c in data.columns if c in columns ] ]
+	return data, { "sport": "running" }, {}
+
+
+def load_in_process( args ):
+	cache_dir, file_name, columns	= args
+	try:
+		data	= coursecache.load( file_name, reader, columns, cache = coursecache.ActivityCache( cache_dir ) )[ 0 ]
+		return list( data.columns ), len( data )
+	except Exception as e:
+		return repr( e )
+
+
+@pytest.fixture
+def activity( tmp_path ):
+	file_name	= tmp_path / "a.fit"
+	file_name.write_bytes( b"activity" )
+	return str( file_name )
+
+
+def test_hit_after_miss( tmp_path, activity ):
+	cache	= coursecache.ActivityCache( str( tmp_path / "cache" ) )
+	assert coursecache.load( activity, reader, [ "distance" ], cache = cache )[ 3 ] is False
+	data, session, units, hit	= coursecache.load( activity, reader, [ "distance" ], cache = cache )
+	assert hit and list( data.columns ) == [ "distance" ] and len( data ) == 10000
+
+
+def test_concurrent_cold_miss( tmp_path, activity ):
+	# processes storing same entry at once all succeed
+	cache_dir	= str( tmp_path / "cache" )
+	with multiprocessing.get_context( "fork" ).Pool( 8 ) as pool:
+		results	= pool.map( load_in_process, [ ( cache_dir, activity, [ "distance", "altitude" ] ) ] * 8 )
+
+	assert results == [ ( [ "distance", "altitude" ], 10000 ) ] * 8
+	assert coursecache.ActivityCache( cache_dir ).get( coursecache.ActivityCache( cache_dir ).key( activity ), [ "distance" ] ) is not None
+
+
+def test_widening_keeps_live_generation( tmp_path, activity ):
+	cache	= coursecache.ActivityCache( str( tmp_path / "cache" ) )
+	key		= cache.key( activity )
+	coursecache.load( activity, reader, [ "distance" ], cache = cache )
+	old_path	= cache.latest( key )[ 0 ]
+
+	data	= coursecache.load( activity, reader, [ "heart_rate" ], cache = cache )[ 0 ]
+	assert list( data.columns ) == [ "distance", "heart_rate" ]		# columns used before are kept
+	assert cache.generations( key ) == [ 1, 2 ]
+	assert os.path.isdir( old_path )								# not removed while it can be in use
+	assert cache.get( key, [ "distance", "heart_rate" ] ) is not None
+
+
+def test_stale_generation_removed( tmp_path, activity, monkeypatch ):
+	cache	= coursecache.ActivityCache( str( tmp_path / "cache" ) )
+	key		= cache.key( activity )
+	coursecache.load( activity, reader, [ "distance" ], cache = cache )
+	monkeypatch.setattr( coursecache, "STALE_SECONDS", -1 )
+	coursecache.load( activity, reader, [ "altitude" ], cache = cache )
+	assert cache.generations( key ) == [ 2 ]
+
+
+def test_failed_put_returns_data( tmp_path, activity, monkeypatch ):
+	cache	= coursecache.ActivityCache( str( tmp_path / "cache" ) )
+
+	def put( *args, **kwargs ):
+		raise OSError( "disk full" )
+
+	monkeypatch.setattr( cache, "put", put )
+	data, session, units, hit	= coursecache.load( activity, reader, [ "distance" ], cache = cache )
+	assert not hit and len( data ) == 10000
+
+
+def test_seek_reads_row_groups( tmp_path, activity ):
+	cache	= coursecache.ActivityCache( str( tmp_path / "cache" ) )
+	coursecache.load( activity, reader, [ "distance" ], cache = cache )
+	data	= coursecache.load( activity, reader, [ "distance" ], cache = cache, seek = ( "distance", 5.0, 5.5 ) )[ 0 ]
+	assert len( data ) < 10000
+	assert data[ "distance" ].min() <= 5.0 and 5.5 <= data[ "distance" ].max()
+
+
+def test_seek_by_timestamp( tmp_path, activity ):
+	cache	= coursecache.ActivityCache( str( tmp_path / "cache" ) )
+	coursecache.load( activity, reader, [ "distance", "timestamp" ], cache = cache )
+	low, high	= pd.Timestamp( 1600000000 + 9000, unit = "s", tz = "UTC" ), pd.Timestamp( 1600000000 + 9100, unit = "s", tz = "UTC" )
+	data	= coursecache.load( activity, reader, [ "distance", "timestamp" ], cache = cache, seek = ( "timestamp", low, high ) )[ 0 ]
+	assert len( data ) < 10000
+	assert data[ "timestamp" ].min() <= low and high <= data[ "timestamp" ].max()
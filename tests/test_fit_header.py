@@ -0,0 +1,37 @@
+# numpy .fit decoder rejects files which are not .fit, as fitparse does
+
+import	os
+
+import	pytest
+
+import	fitpandas
+
+FIT_FILE	= os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ), "plot_test.fit" )
+
+
+def write( tmp_path, data ):
+	name	= str( tmp_path / "bad.fit" )
+	with open( name, "wb" ) as f:
+		f.write( data )
+	return name
+
+
+@pytest.mark.parametrize( "data", [ b"", b"hello", b"not a fit file, but long enough" ] )
+def test_not_fit( tmp_path, data ):
+	with pytest.raises( ValueError, match = "invalid .fit file header" ):
+		fitpandas.get_workout( write( tmp_path, data ) )
+
+
+def test_truncated( tmp_path ):
+	with open( FIT_FILE, "rb" ) as f:
+		data	= f.read()
+
+	with pytest.raises( ValueError, match = "invalid .fit file size" ):
+		fitpandas.get_workout( write( tmp_path, data[ : len( data ) // 2 ] ) )
+
+
+def test_valid():
+	df, session, units	= fitpandas.get_workout( FIT_FILE )
+
+	assert len( df ) > 0
+	assert "position_lat" in df.columns
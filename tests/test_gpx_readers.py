@@ -0,0 +1,80 @@
+# streaming .gpx reader (gpxstream) gives same result as gpxpy reader
+
+import	os
+import	time
+
+import	numpy as np
+import	pandas as pd
+import	pytest
+
+import	gpxpandas
+
+pytest.importorskip( "gpxpy" )
+
+GPX	= """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1"
+ xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">
+<metadata><time>2021-02-27T00:00:00Z</time></metadata>
+<trk><name>t</name>
+<trkseg>
+<trkpt lat="35.0000" lon="139.0000"><ele>10.0</ele><time>2021-02-27T01:00:00Z</time>
+ <extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>120</gpxtpx:hr><gpxtpx:cad>80</gpxtpx:cad></gpxtpx:TrackPointExtension></extensions></trkpt>
+<trkpt lat="35.0010" lon="139.0010"><ele>11.5</ele><time>2021-02-27T01:00:05Z</time>
+ <extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>125</gpxtpx:hr></gpxtpx:TrackPointExtension></extensions></trkpt>
+<trkpt lat="35.0020" lon="139.0015"><time>2021-02-27T10:00:10+09:00</time></trkpt>
+</trkseg>
+<trkseg>
+<trkpt lat="35.0100" lon="139.0100"><ele>20.0</ele><time>2021-02-27T01:10:00</time></trkpt>
+<trkpt lat="35.0110" lon="139.0105"><ele>21.0</ele><time>2021-02-27T01:10:04</time></trkpt>
+<trkpt lat="35.0120" lon="139.0110"><ele>22.0</ele></trkpt>
+</trkseg>
+</trk>
+</gpx>
+"""
+
+
+@pytest.fixture
+def gpx_file( tmp_path ):
+	file_name	= tmp_path / "t.gpx"
+	file_name.write_text( GPX )
+	return str( file_name )
+
+
+@pytest.fixture
+def local_timezone():
+	# naive times must not be read in local time
+	saved	= os.environ.get( "TZ" )
+	os.environ[ "TZ" ]	= "Asia/Tokyo"
+	time.tzset()
+	yield
+	if saved is None:
+		del os.environ[ "TZ" ]
+	else:
+		os.environ[ "TZ" ]	= saved
+	time.tzset()
+
+
+@pytest.mark.parametrize( "columns", [ None, [ "position_lat", "position_long", "altitude", "distance", "heart_rate" ] ] )
+def test_readers_match( gpx_file, local_timezone, columns ):
+	df_s, session_s, units_s	= gpxpandas.get_course( gpx_file, reader = "stream", columns = columns )
+	df_g, session_g, units_g	= gpxpandas.get_course( gpx_file, reader = "gpxpy",  columns = columns )
+
+	pd.testing.assert_frame_equal( df_s, df_g )
+	assert session_s.keys() == session_g.keys()
+	for k in session_s:
+		assert session_s[ k ] == session_g[ k ] or (session_s[ k ] != session_s[ k ] and session_g[ k ] != session_g[ k ])
+
+
+def test_naive_time_is_utc( gpx_file, local_timezone ):
+	for reader in gpxpandas.READERS:
+		df	= gpxpandas.get_course( gpx_file, reader = reader )[ 0 ]
+		assert df[ "timestamp" ].iloc[ 3 ] == pd.Timestamp( "2021-02-27T01:10:00Z" )
+		assert df[ "timestamp" ].iloc[ 2 ] == pd.Timestamp( "2021-02-27T01:00:10Z" )
+
+
+def test_segments( gpx_file ):
+	df	= gpxpandas.get_course( gpx_file )[ 0 ]
+	assert len( df ) == 6
+	assert df[ "distance" ].iloc[ 3 ] == df[ "distance" ].iloc[ 2 ]		# no distance between segments
+	assert np.isnan( df[ "altitude" ].iloc[ 2 ] )
+	assert df[ "heart_rate" ].iloc[ 1 ] == 125 and np.isnan( df[ "heart_rate" ].iloc[ 2 ] )
@@ -0,0 +1,37 @@
+# lap boundaries are found by lap end time on record timestamps
+
+import	datetime
+
+import	numpy as np
+import	pandas as pd
+
+import	coursemap
+
+
+def test_lap_end_by_time():
+	n		= 600
+	t0		= datetime.datetime( 2021, 2, 27, 1, 0, 0 )
+	ts		= pd.Series( pd.to_datetime( [ t0 + datetime.timedelta( seconds = s ) for s in range( n ) ] ) )
+	ds		= list( np.arange( n ) * 0.003 )			# 3m/s in km
+	alt		= np.sin( np.arange( n ) / 50.0 ) * 10
+	
+	# "total_distance" of laps is shorter than recorded distance (i.e. GPS corrected), ends are at 200s and 400s
+	laps	= [ { "start_time": t0 + datetime.timedelta( seconds = s ), "timestamp": t0 + datetime.timedelta( seconds = s + 200 ),
+				"total_distance": 500.0, "total_timer_time": 200.0, "lap_trigger": "manual" } for s in [ 0, 200, 400 ] ]
+	
+	markers	= dict( ( label, i ) for i, label in coursemap.lap_markers( ds, ts, alt, laps, "laps" ) )
+	assert markers == { "lap 1 3:20": 200, "lap 2 3:20": 400 }
+	
+	by_distance	= dict( ( label, i ) for i, label in coursemap.lap_markers( ds, None, alt, laps, "laps" ) )
+	assert by_distance[ "lap 1 3:20" ] == 167			# 0.5km: drifted when times are not used
+
+
+def test_summit_in_each_lap():
+	n		= 300
+	t0		= datetime.datetime( 2021, 2, 27, 1, 0, 0 )
+	ts		= pd.Series( pd.to_datetime( [ t0 + datetime.timedelta( seconds = s ) for s in range( n ) ] ) )
+	alt		= np.zeros( n )
+	alt[ 50 ], alt[ 250 ]	= 100.0, 200.0
+	laps	= [ { "start_time": t0, "timestamp": t0 + datetime.timedelta( seconds = 150 ) }, { "start_time": t0 + datetime.timedelta( seconds = 150 ), "timestamp": t0 + datetime.timedelta( seconds = 299 ) } ]
+	
+	assert [ ( int( i ), label ) for i, label in coursemap.lap_markers( list( np.arange( n ) * 0.001 ), ts, alt, laps, "summits" ) ] == [ ( 50, "▲100m" ), ( 250, "▲200m" ) ]
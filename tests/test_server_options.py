@@ -0,0 +1,25 @@
+# tests of request parameter checking of render server (coursemap_server.py)
+
+import	pytest
+
+import	coursemap_server as server
+
+
+def changes( query ):
+	return server.option_changes( query )[ 0 ]
+
+
+def test_numbers_clamped():
+	assert changes( "am_size=100000000&olr=999999" ) == { "am_size": server.LIMITS[ "am_size" ][ 1 ], "olr": server.LIMITS[ "olr" ][ 1 ] }
+	assert changes( "thining_factor=0&fin=inf" ) == { "thining_factor": 1, "fin": float( "inf" ) }
+
+
+@pytest.mark.parametrize( "query", [ "azimuth=nan", "am_size=inf", "fit_decoder=evil", "gpx_reader=x", "alt_filt=x", "curtain=x", "lap_markers=x", "tile_provider=x", "colorbar=nnnnnnnn", "cache_dir=/tmp" ] )
+def test_rejected( query ):
+	with pytest.raises( server.RequestError ) as e:
+		changes( query )
+	assert e.value.status == 400
+
+
+def test_fmt_and_dpi():
+	assert server.option_changes( "fmt=svg&dpi=150&lap_markers=both" ) == ( { "lap_markers": "both" }, "svg", 150.0 )
@@ -0,0 +1,55 @@
+# "auto" method choice and chunked filtering give same result as whole data filtering
+
+import	numpy as np
+import	pytest
+
+import	smoothing
+
+
+@pytest.fixture
+def data():
+	rng	= np.random.default_rng( 0 )
+	return np.cumsum( rng.normal( size = 5000 ) )
+
+
+@pytest.mark.parametrize( "length", [ 3, 120, smoothing.DIRECT_MAX, smoothing.DIRECT_MAX + 1, 2000 ] )
+def test_methods( data, length ):
+	direct	= smoothing.smooth( data, length, method = "direct" )
+
+	assert len( direct ) == len( data )
+	np.testing.assert_allclose( smoothing.smooth( data, length, method = "fft" ), direct, rtol = 0, atol = 1e-9 )
+	np.testing.assert_allclose( smoothing.smooth( data, length, method = "cumsum" ), direct, rtol = 0, atol = 1e-6 )
+	np.testing.assert_allclose( smoothing.smooth( data, length ), direct, rtol = 0, atol = 1e-9 )
+
+
+def test_auto_choice( data, monkeypatch ):
+	used	= []
+	convolve	= np.convolve
+	monkeypatch.setattr( smoothing.np, "convolve", lambda *a, **k: used.append( "direct" ) or convolve( *a, **k ) )
+
+	smoothing.smooth( data, smoothing.DIRECT_MAX )
+	smoothing.smooth( data, smoothing.DIRECT_MAX + 1 )
+
+	assert used == [ "direct" ]
+
+
+def test_fast_length():
+	for n in [ 1, 2, 7, 11, 97, 1000, 1023, 1025, 123457 ]:
+		m	= smoothing.fast_length( n )
+		assert n <= m < 2 * n
+		r	= m
+		for p in ( 2, 3, 5 ):
+			while r % p == 0:
+				r	//= p
+		assert r == 1
+
+
+@pytest.mark.parametrize( "pad", [ "reflect", "edge" ] )
+@pytest.mark.parametrize( "length", [ 1, 5, 120, 1000 ] )
+@pytest.mark.parametrize( "chunk", [ 1, 7, 333, 10000 ] )
+def test_chunks( data, pad, length, chunk ):
+	whole	= smoothing.smooth( data, length, pad = pad )
+	chunks	= [ data[ i : i + chunk ] for i in range( 0, len( data ), chunk ) ]
+	joined	= np.concatenate( list( smoothing.smooth_chunks( chunks, length, pad = pad ) ) )
+
+	np.testing.assert_allclose( joined, whole, rtol = 0, atol = 1e-9 )
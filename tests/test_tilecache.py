@@ -0,0 +1,72 @@
+# tests of map tile cache (tilecache.py) with local directory as tile server
+
+import	multiprocessing
+import	os
+import	time
+
+import	pytest
+
+staticmaps	= pytest.importorskip( "staticmaps" )
+import	tilecache
+
+
+class FileServer( tilecache.DirectorySource ):
+	# local tiles taken as online source, so they are cached. slow as network to make fetches overlap
+	offline	= False
+
+	def get( self, provider, z, x, y ):
+		time.sleep( 0.05 )
+		return super().get( provider, z, x, y )
+
+
+def tile( x ):
+	# large enough for writes by processes to overlap
+	return "tile {}".format( x ).encode() * (1 << 18)
+
+
+@pytest.fixture
+def server( tmp_path ):
+	for x in range( 4 ):
+		path	= tmp_path / "server" / "10" / str( x )
+		path.mkdir( parents = True )
+		( path / "5.png" ).write_bytes( tile( x ) )
+	return FileServer( str( tmp_path / "server" ) )
+
+
+def fetch_in_process( args ):
+	source, cache_dir, x	= args
+	try:
+		return tilecache.CachedTileDownloader( source, cache_dir ).get( staticmaps.tile_provider_OSM, None, 10, x, 5 )
+	except Exception as e:
+		return repr( e )
+
+
+def test_directory_source( server ):
+	assert server.get( staticmaps.tile_provider_OSM, 10, 1, 5 ) == tile( 1 )
+	assert server.get( staticmaps.tile_provider_OSM, 10, 9, 5 ) is None
+
+
+def test_cache_hit( server, tmp_path ):
+	d	= tilecache.CachedTileDownloader( server, str( tmp_path / "cache" ) )
+	assert d.get( staticmaps.tile_provider_OSM, None, 10, 0, 5 ) == tile( 0 )
+	assert d.get( staticmaps.tile_provider_OSM, None, 10, 0, 5 ) == tile( 0 )
+	assert ( d.hit, d.miss ) == ( 1, 1 )
+
+
+def test_concurrent_fetch_same_tile( server, tmp_path ):
+	cache_dir	= str( tmp_path / "cache" )
+	with multiprocessing.get_context( "fork" ).Pool( 8 ) as pool:
+		results	= pool.map( fetch_in_process, [ ( server, cache_dir, 2 ) ] * 32, chunksize = 1 )
+
+	assert results == [ tile( 2 ) ] * 32
+	files	= [ f for root, dirs, fs in os.walk( cache_dir ) for f in fs ]
+	assert files == [ "5.png" ]		# no temporary file is left
+
+
+def test_evict( server, tmp_path ):
+	d	= tilecache.CachedTileDownloader( server, str( tmp_path / "cache" ), size_mb = 2.0 )
+	for x in range( 4 ):
+		d.get( staticmaps.tile_provider_OSM, None, 10, x, 5 )
+	d.evict()
+	files	= [ f for root, dirs, fs in os.walk( str( tmp_path / "cache" ) ) for f in fs ]
+	assert len( files ) == 1
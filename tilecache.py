@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# map tile cache and tile sources for staticmaps
+#
+#	tiles are kept in local directory keyed by ( provider, z, x, y )
+#	with expiration (TTL) and size limit (least recently used one is removed first).
+#	tiles can be served from local directory or MBTiles file for offline use.
+#
+#	reference: https://wiki.openstreetmap.org/wiki/Tiles
+#	reference: https://github.com/mapbox/mbtiles-spec
+#
+# Tedd OKANO, Tsukimidai Communications Syndicate 2021
+# Version 0.1 17-October-2026
+
+# Copyright (c) 2021 Tedd OKANO
+# Released under the MIT license
+# https://opensource.org/licenses/mit-license.php
+
+import	staticmaps
+import	os
+import	sqlite3
+import	tempfile
+import	time
+
+DEFAULT_DIR		= os.path.join( os.path.expanduser( "~" ), ".cache", "run_coursemap", "tiles" )
+DEFAULT_TTL_DAYS	= 30
+DEFAULT_SIZE_MB	= 200
+
+
+class HttpSource:
+	# fetching from tile server (staticmaps default)
+	offline	= False
+
+	def __init__( self ):
+		self.downloader	= staticmaps.TileDownloader()
+
+	def get( self, provider, z, x, y ):
+		return self.downloader.get( provider, None, z, x, y )
+
+
+class DirectorySource:
+	# tiles in local directory as "<path>/<z>/<x>/<y>.png"
+	offline	= True
+
+	def __init__( self, path, pattern = "{z}/{x}/{y}.png" ):
+		self.path		= path
+		self.pattern	= pattern
+
+	def get( self, provider, z, x, y ):
+		file_name	= os.path.join( self.path, self.pattern.format( z = z, x = x, y = y ) )
+		if not os.path.isfile( file_name ):
+			return None
+		with open( file_name, "rb" ) as f:
+			return f.read()
+
+
+class MBTilesSource:
+	# tiles in MBTiles (SQLite) file. rows are in TMS order (y is flipped)
+	offline	= True
+
+	def __init__( self, file_name ):
+		self.db	= sqlite3.connect( "file:{}?mode=ro".format( file_name ), uri = True, check_same_thread = False )
+
+	def get( self, provider, z, x, y ):
+		row	= self.db.execute( "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", ( z, x, (1 << z) - 1 - y ) ).fetchone()
+		return bytes( row[ 0 ] ) if row else None
+
+
+def tile_source( tiles ):
+	#####
+	##### "online", path to directory or .mbtiles file
+	#####
+	if tiles in [ None, "online" ]:
+		return HttpSource()
+	if os.path.isdir( tiles ):
+		return DirectorySource( tiles )
+	if os.path.isfile( tiles ):
+		return MBTilesSource( tiles )
+	raise ValueError( "tile source \"{}\" not found".format( tiles ) )
+
+
+class CachedTileDownloader( staticmaps.TileDownloader ):
+	#####
+	##### tile downloader for staticmaps.Context.set_tile_downloader()
+	##### file modified time is the time of fetching (for TTL), accessed time is the time of last use (for LRU)
+	#####
+	def __init__( self, source = None, cache_dir = None, ttl_days = None, size_mb = None ):
+		# None for default values
+		super().__init__()
+		self.source		= source if source else HttpSource()
+		self.cache_dir	= None if self.source.offline else cache_dir or DEFAULT_DIR	# local tiles need no cache
+		self.ttl		= (DEFAULT_TTL_DAYS if ttl_days is None else ttl_days) * 24 * 3600
+		self.max_bytes	= (DEFAULT_SIZE_MB if size_mb is None else size_mb) * 2 ** 20
+		self.hit		= 0
+		self.miss		= 0
+
+	def cache_file_name( self, provider, cache_dir, zoom, x, y ):
+		return os.path.join( cache_dir, self.sanitized_name( provider.name() ), str( zoom ), str( x ), "{}.png".format( y ) )
+
+	def get( self, provider, cache_dir, zoom, x, y ):
+		# "cache_dir" given by staticmaps.Context is ignored. self.cache_dir is used instead
+
+		if self.cache_dir is None:
+			return self.source.get( provider, zoom, x, y )
+
+		file_name	= self.cache_file_name( provider, self.cache_dir, zoom, x, y )
+		now			= time.time()
+		cached		= None
+
+		try:
+			with open( file_name, "rb" ) as f:
+				cached	= f.read()
+			mtime	= os.path.getmtime( file_name )
+			os.utime( file_name, ( now, mtime ) )
+
+			if now - mtime < self.ttl:
+				self.hit	+= 1
+				return cached
+		except OSError:		# not cached or removed by other process
+			pass
+
+		self.miss	+= 1
+
+		try:
+			data	= self.source.get( provider, zoom, x, y )
+		except Exception:
+			if cached is not None:	# expired one is better than nothing
+				return cached
+			raise
+
+		if data is not None:
+			self.store( file_name, data )
+
+		return data
+
+	def store( self, file_name, data ):
+		#####
+		##### tile is written in temporary file unique to the process and renamed.
+		##### same tile can be stored by other processes at same time. failure is ignored (cache is just for speed)
+		#####
+		tmp	= None
+		try:
+			os.makedirs( os.path.dirname( file_name ), exist_ok = True )
+			fd, tmp	= tempfile.mkstemp( dir = os.path.dirname( file_name ), prefix = os.path.basename( file_name ) + ".", suffix = ".tmp" )
+			with os.fdopen( fd, "wb" ) as f:
+				f.write( data )
+			os.replace( tmp, file_name )
+		except OSError:
+			if tmp and os.path.exists( tmp ):
+				os.remove( tmp )
+
+	def evict( self ):
+		#####
+		##### removing least recently used tiles until total size gets under the limit
+		#####
+		if self.cache_dir is None or not os.path.isdir( self.cache_dir ):
+			return
+
+		tiles	= []
+		for root, dirs, files in os.walk( self.cache_dir ):
+			for f in files:
+				try:
+					st	= os.stat( os.path.join( root, f ) )
+				except OSError:		# removed by other process
+					continue
+				tiles.append( ( st.st_atime, st.st_size, os.path.join( root, f ) ) )
+
+		tiles.sort()
+		total	= sum( size for t, size, f in tiles )
+
+		for t, size, f in tiles:
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove( f )
+			except OSError:
+				pass
+			total	-= size